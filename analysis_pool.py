@@ -0,0 +1,131 @@
+import atexit
+import concurrent.futures
+from concurrent.futures.process import BrokenProcessPool
+import multiprocessing
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Pose graph owned by the current worker process, built once by _init_worker
+_worker_pose = None
+# Queue shared with the parent process for (job_id, processed, total) updates
+_worker_progress_queue = None
+# Landmark cache shared by all workers, or None when caching is disabled
+_worker_cache = None
+
+def _init_worker(progress_queue, cache_dir, cache_max_bytes):
+    """Import cv2/mediapipe and build the Pose graph once per worker process"""
+    global _worker_pose, _worker_progress_queue, _worker_cache
+    import model
+    _worker_pose = model.create_pose()
+    _worker_progress_queue = progress_queue
+    if cache_dir:
+        _worker_cache = model.LandmarkCache(cache_dir, cache_max_bytes)
+
+def _ping():
+    return True
+
+def _run_analysis(video_path, job_id=None, options=None, upload=None):
+    import model
+    progress = None
+    if job_id is not None:
+        def progress(processed, total):
+            _worker_progress_queue.put((job_id, processed, total))
+    return model.analyze_video(video_path, _worker_pose, voice=False, progress=progress,
+                               headless=True, landmark_cache=_worker_cache, upload=upload,
+                               **(options or {}))
+
+class AnalysisPool:
+    """Process pool whose workers keep a warm Pose graph between requests.
+
+    Each worker pays the interpreter, cv2/mediapipe import and Pose graph
+    start-up cost once, instead of once per analyzed video.
+    """
+
+    def __init__(self, max_workers, on_progress=None, analysis_options=None,
+                 cache_dir=None, cache_max_bytes=0):
+        self.max_workers = max(1, int(max_workers))
+        self.on_progress = on_progress
+        # Extra keyword arguments for model.analyze_video (stride, target fps, ...)
+        self.analysis_options = analysis_options or {}
+        # Pose landmarks are cached on disk when cache_dir is set
+        self.cache_dir = cache_dir if cache_max_bytes > 0 else None
+        self.cache_max_bytes = cache_max_bytes
+        # Use spawn so workers never inherit the Flask server's threads
+        ctx = multiprocessing.get_context('spawn')
+        self._ctx = ctx
+        self._progress_queue = ctx.Queue()
+        self._executor = self._create_executor()
+        # Serializes replacing a broken executor between request threads
+        self._executor_lock = threading.Lock()
+        self._progress_thread = threading.Thread(target=self._drain_progress, daemon=True)
+        self._progress_thread.start()
+        # Registered after multiprocessing's own exit handler, so it runs first
+        atexit.register(self.shutdown, wait=False)
+        logger.info(f"Analysis pool created with {self.max_workers} workers")
+
+    def _create_executor(self):
+        return concurrent.futures.ProcessPoolExecutor(
+            max_workers=self.max_workers,
+            mp_context=self._ctx,
+            initializer=_init_worker,
+            initargs=(self._progress_queue, self.cache_dir, self.cache_max_bytes)
+        )
+
+    def _drain_progress(self):
+        while True:
+            try:
+                update = self._progress_queue.get()
+            except (EOFError, OSError):
+                # The queue was torn down (e.g. at interpreter exit)
+                break
+            if update is None:
+                break
+            if self.on_progress:
+                try:
+                    self.on_progress(*update)
+                except Exception as e:
+                    logger.error(f"Error handling analysis progress: {e}")
+
+    def warm_up(self):
+        """Start every worker now so the first uploads don't pay start-up cost"""
+        futures = [self._executor.submit(_ping) for _ in range(self.max_workers)]
+        concurrent.futures.wait(futures)
+
+    def _submit_task(self, fn, *args):
+        executor = self._executor
+        try:
+            return executor.submit(fn, *args)
+        except BrokenProcessPool:
+            # A worker died (e.g. crashed inside mediapipe); start a fresh
+            # pool, unless another thread already has
+            with self._executor_lock:
+                if self._executor is executor:
+                    logger.warning("Analysis pool is broken, restarting workers")
+                    executor.shutdown(wait=False)
+                    self._executor = self._create_executor()
+                executor = self._executor
+            return executor.submit(fn, *args)
+
+    def submit(self, video_path, job_id=None, upload=None, options=None):
+        """Queue a video for analysis; returns a Future for the result dict.
+
+        options override the pool's analysis options for this video (e.g.
+        the exercise to count). With upload (a ChunkedUpload still
+        receiving the video), the worker follows the upload and analyzes
+        frames as they arrive.
+        """
+        options = dict(self.analysis_options, **(options or {}))
+        return self._submit_task(_run_analysis, video_path, job_id, options, upload)
+
+    def analyze(self, video_path, timeout=None):
+        return self.submit(video_path).result(timeout=timeout)
+
+    def shutdown(self, wait=True):
+        # Stop the drain thread before the executor and queue go away under it
+        if self._progress_thread.is_alive():
+            self._progress_queue.put(None)
+            self._progress_thread.join()
+        self._executor.shutdown(wait=wait)
+        atexit.unregister(self.shutdown)
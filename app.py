@@ -1,20 +1,91 @@
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, Response, request, jsonify, send_from_directory, stream_with_context
 import os
 import subprocess
-import csv
 import uuid
-import glob
+import shutil
 from datetime import datetime
 import pyttsx3
 import threading
 import time
 import sys
+import json
+import signal
+import queue
 import logging # Import the logging module
+from analysis_pool import AnalysisPool
+from batch import BatchError, batch_totals, clip_result, extract_videos, is_video_name, remove_clip_dirs
+from jobs import JobQueue, QueueFullError, is_valid_id
+from history_store import HistoryStore
+from live_channel import LiveSession, SessionSummaries
+from live_worker import LiveWorker
+from upload_stream import ChunkedUpload, UploadOffsetError, UploadTooLargeError, remove_stale_uploads
+from exercises import exercise_names
+from workout_result import WorkoutResult
 
 app = Flask(__name__, static_folder='frontend', static_url_path='')
 UPLOAD_FOLDER = 'uploads'
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['MAX_CONTENT_LENGTH'] = 100 * 1024 * 1024  # 100MB max file size
+# Exercise counted when a request names none: squat, lunge, curl, pushup,
+# lateral_raise, or auto to detect it
+app.config['ANALYSIS_EXERCISE'] = os.environ.get('ANALYSIS_EXERCISE', 'squat')
+app.config['LIVE_EXERCISE'] = os.environ.get('LIVE_EXERCISE', 'squat')
+# Count reps separately for up to MAX_PEOPLE people in uploads and live
+# sessions; above 1 this needs the PoseLandmarker model bundle at POSE_LANDMARKER_MODEL
+app.config['MAX_PEOPLE'] = int(os.environ.get('MAX_PEOPLE', 1))
+app.config['POSE_LANDMARKER_MODEL'] = os.environ.get('POSE_LANDMARKER_MODEL', 'models/pose_landmarker_full.task')
+# Chunked uploads (/uploads) start analysis on the received prefix when the
+# container allows it; uploads idle for UPLOAD_IDLE_TIMEOUT seconds are dropped
+app.config['UPLOAD_STREAMING_ANALYSIS'] = os.environ.get('UPLOAD_STREAMING_ANALYSIS', '1') != '0'
+app.config['UPLOAD_IDLE_TIMEOUT'] = float(os.environ.get('UPLOAD_IDLE_TIMEOUT', 300))
+# Most videos one /analyze/batch request may hold, and the most bytes its
+# zip archives may inflate to (the request itself stays within MAX_CONTENT_LENGTH)
+app.config['BATCH_MAX_CLIPS'] = int(os.environ.get('BATCH_MAX_CLIPS', 50))
+app.config['BATCH_MAX_EXTRACTED_MB'] = int(os.environ.get('BATCH_MAX_EXTRACTED_MB', 2000))
+# Per-session directories for live workout stats, summaries and stop signals
+app.config['SESSIONS_FOLDER'] = 'sessions'
+# Number of long-lived analysis worker processes, each holding a warm Pose graph
+app.config['ANALYSIS_WORKERS'] = int(os.environ.get('ANALYSIS_WORKERS', 2))
+# Maximum analysis jobs queued or running before /analyze answers 429
+app.config['MAX_PENDING_JOBS'] = int(os.environ.get('MAX_PENDING_JOBS', 8))
+# Frame sampling for uploaded videos: infer every Nth frame, or sample at a
+# target frame rate when ANALYSIS_TARGET_FPS is set, at the given frame size
+app.config['ANALYSIS_FRAME_STRIDE'] = int(os.environ.get('ANALYSIS_FRAME_STRIDE', 1))
+app.config['ANALYSIS_TARGET_FPS'] = float(os.environ.get('ANALYSIS_TARGET_FPS', 0)) or None
+app.config['ANALYSIS_INFERENCE_SIZE'] = tuple(
+    int(v) for v in os.environ.get('ANALYSIS_INFERENCE_SIZE', '640x480').lower().split('x'))
+# Infer on a crop around the previous frame's pose instead of the whole
+# frame, in uploads and live workouts (single person only). Faster, but
+# Pose's landmarks on the crop differ, and so can the rep counts
+app.config['ANALYSIS_ROI'] = os.environ.get('ANALYSIS_ROI', '0') == '1'
+app.config['LIVE_ROI'] = os.environ.get('LIVE_ROI', '0') == '1'
+# On-disk cache of per-frame pose landmarks, evicted LRU past the size limit (0 disables)
+app.config['LANDMARK_CACHE_FOLDER'] = os.environ.get('LANDMARK_CACHE_FOLDER', 'landmark_cache')
+app.config['LANDMARK_CACHE_MB'] = int(os.environ.get('LANDMARK_CACHE_MB', 500))
+# Workout history database; rows of a legacy history.csv are imported once
+app.config['HISTORY_DB'] = os.environ.get('HISTORY_DB', 'history.db')
+app.config['HISTORY_CSV'] = 'history.csv'
+# Recording of live sessions: off, full, downscaled (by LIVE_RECORDING_SCALE)
+# or low_fps (at LIVE_RECORDING_FPS); the oldest recordings are deleted once
+# they take more than LIVE_RECORDINGS_MB
+app.config['LIVE_RECORDING'] = os.environ.get('LIVE_RECORDING', 'full')
+app.config['LIVE_RECORDING_SCALE'] = float(os.environ.get('LIVE_RECORDING_SCALE', 0.5))
+app.config['LIVE_RECORDING_FPS'] = float(os.environ.get('LIVE_RECORDING_FPS', 10))
+app.config['LIVE_RECORDING_CODEC'] = os.environ.get('LIVE_RECORDING_CODEC', 'mp4v')
+app.config['LIVE_RECORDINGS_MB'] = int(os.environ.get('LIVE_RECORDINGS_MB', 1000))
+# Keep a live worker running with a warm pose graph (and, with
+# LIVE_KEEP_CAMERA, an open camera) so sessions start without a new process
+app.config['LIVE_WARM_WORKER'] = os.environ.get('LIVE_WARM_WORKER', '1') != '0'
+app.config['LIVE_KEEP_CAMERA'] = os.environ.get('LIVE_KEEP_CAMERA', '1') != '0'
+# Seconds /start-camera waits for the warm worker to finish cleaning up the
+# previous session before refusing the new one (it never starts a second
+# worker while the warm one may hold the camera)
+app.config['LIVE_WORKER_WAIT'] = float(os.environ.get('LIVE_WORKER_WAIT', 5))
+# Longest a GET /sessions/<id>/summary request waits for a stopping workout
+app.config['LIVE_SUMMARY_MAX_WAIT'] = float(os.environ.get('LIVE_SUMMARY_MAX_WAIT', 60))
+# Default and maximum number of workouts returned by one /history request
+app.config['HISTORY_PAGE_SIZE'] = 100
+app.config['HISTORY_MAX_PAGE_SIZE'] = 1000
 
 # Configure logging
 logging.basicConfig(
@@ -46,9 +117,60 @@ def speak_async(text):
                 logger.error(f"Voice feedback error in thread: {e}")
         threading.Thread(target=run_speak).start()
 
+history_store = HistoryStore(app.config['HISTORY_DB'])
+history_store.import_csv(app.config['HISTORY_CSV'])
+
 # Global variables for live workout
 live_workout_process = None
 live_workout_start_time = None
+live_session_id = None
+# Event channels to the live workers started by this server process
+live_sessions = {}
+# Worker running each of those sessions: its own process (a Popen) or the
+# warm live_worker
+live_session_workers = {}
+# Persistent live worker, started with the server when LIVE_WARM_WORKER is on
+live_worker = None
+# Final summaries of live workouts stopped through this server process
+live_summaries = SessionSummaries()
+
+# Video analysis worker pool, created on first use
+analysis_pool = None
+analysis_pool_lock = threading.Lock()
+
+def complete_analysis_job(job, result):
+    # Runs once a worker finishes a job: give feedback and record history
+    speak_async(result['summary'])
+    update_history_with_details(result['reps'], result['calories'], result['duration'], result['summary'])
+    return dict(result, timestamp=datetime.now().isoformat())
+
+analysis_jobs = JobQueue(app.config['MAX_PENDING_JOBS'], os.path.join(UPLOAD_FOLDER, 'jobs'),
+                         on_complete=complete_analysis_job)
+
+def get_analysis_pool():
+    global analysis_pool
+    with analysis_pool_lock:
+        if analysis_pool is None:
+            analysis_pool = AnalysisPool(
+                app.config['ANALYSIS_WORKERS'],
+                analysis_options={
+                    'frame_stride': app.config['ANALYSIS_FRAME_STRIDE'],
+                    'target_fps': app.config['ANALYSIS_TARGET_FPS'],
+                    'inference_size': app.config['ANALYSIS_INFERENCE_SIZE'],
+                    'max_people': app.config['MAX_PEOPLE'],
+                    'pose_model': app.config['POSE_LANDMARKER_MODEL'],
+                    'roi': app.config['ANALYSIS_ROI']
+                },
+                cache_dir=app.config['LANDMARK_CACHE_FOLDER'],
+                cache_max_bytes=app.config['LANDMARK_CACHE_MB'] * 1024 * 1024
+            )
+            analysis_jobs.attach_pool(analysis_pool)
+        return analysis_pool
+
+def get_exercise_param(value, default):
+    """Exercise named by a request, or None if it isn't registered"""
+    exercise = value or default
+    return exercise if exercise in exercise_names() else None
 
 # Serve the homepage
 @app.route('/')
@@ -66,115 +188,431 @@ def analyze_video():
         if video.filename == '':
             return jsonify({'error': 'No selected file'}), 400
 
-        # Generate unique filename
-        unique_filename = f"{uuid.uuid4()}.mp4"
-        save_path = os.path.join(app.config['UPLOAD_FOLDER'], unique_filename)
-        
-        # Clean up old files
-        old_files = glob.glob(os.path.join(app.config['UPLOAD_FOLDER'], '*.mp4'))
-        for old_file in old_files:
-            try:
-                os.remove(old_file)
-            except Exception as e:
-                logger.error(f"Error removing old file {old_file}: {e}")
-        
-        # Save the video
+        exercise = get_exercise_param(request.form.get('exercise'), app.config['ANALYSIS_EXERCISE'])
+        if exercise is None:
+            return jsonify({'error': f"exercise must be one of: {', '.join(exercise_names())}"}), 400
+
+        # Reject early, before buffering the upload to disk
+        get_analysis_pool()
+        if not analysis_jobs.has_capacity():
+            return jsonify({'error': 'Too many videos are being analyzed, please retry shortly'}), 429
+
+        # Each job gets a private directory, so concurrent uploads never
+        # touch each other's files
+        job_id, job_dir = analysis_jobs.create_job_dir()
+        save_path = os.path.join(job_dir, "video.mp4")
         video.save(save_path)
 
-        # Run analysis model
-        result = subprocess.run(['python', 'model.py', '--video_path', save_path], 
-                              capture_output=True, text=True)
-        
-        logger.debug(f"model.py stdout:\n{result.stdout}")
-        logger.debug(f"model.py stderr:\n{result.stderr}")
-
-        if result.returncode != 0:
-            return jsonify({'error': f'Analysis failed: {result.stderr}'}), 500
-
-        # Read summary if generated
-        if os.path.exists("summary.txt"):
-            with open("summary.txt", "r") as f:
-                lines = f.readlines()
-                summary = "".join(lines)
-
-                # Parse details from summary.txt for video analysis
-                reps = 0
-                calories = 0.0
-                duration = 0.0
-                for line in lines:
-                    if "Reps:" in line:
-                        try:
-                            reps = int(line.split(":")[1].strip())
-                        except ValueError:
-                            pass # Handle cases where rep count might be missing or invalid
-                    elif "Calories:" in line:
-                        try:
-                            calories = float(line.split(":")[1].replace('s', '').strip())
-                        except ValueError:
-                            pass # Handle cases where calorie count might be missing or invalid
-                    elif "Duration:" in line:
-                        try:
-                            duration = float(line.split(":")[1].replace('s', '').strip())
-                        except ValueError:
-                            pass # Handle cases where duration might be missing or invalid
-
-            # Voice feedback for uploaded video
-            speak_async(summary)
-            
-            # Update history with parsed details
-            update_history_with_details(reps, calories, duration, summary)
-            
-            return jsonify({
-                'success': True,
-                'message': summary,
-                'timestamp': datetime.now().isoformat(),
-                'reps': reps,
-                'calories': calories,
-                'duration': duration
-            })
-        else:
-            return jsonify({
-                'success': False,
-                'error': 'No analysis results found'
-            }), 500
+        # Queue the analysis on a warm worker and return right away
+        try:
+            job = analysis_jobs.submit(save_path, job_id, options={'exercise': exercise})
+        except QueueFullError as e:
+            shutil.rmtree(job_dir, ignore_errors=True)
+            return jsonify({'error': str(e)}), 429
+
+        return jsonify({
+            'success': True,
+            'job_id': job.id,
+            'status': job.status,
+            'status_url': f'/jobs/{job.id}',
+            'result_url': f'/jobs/{job.id}/result'
+        }), 202
 
     except Exception as e:
         logger.error(f"Error processing video: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+# API: Analyze several videos in one request
+# Form fields: videos (repeated; video files and/or zip archives of videos)
+# and exercise. Streams NDJSON: a "batch" line listing the clips, a "clip"
+# line with each clip's result as soon as it finishes, then "totals"
+@app.route('/analyze/batch', methods=['POST'])
+def analyze_batch():
+    exercise = get_exercise_param(request.form.get('exercise'), app.config['ANALYSIS_EXERCISE'])
+    if exercise is None:
+        return jsonify({'error': f"exercise must be one of: {', '.join(exercise_names())}"}), 400
+    uploads = [video for video in request.files.getlist('videos') if video.filename]
+    if not uploads:
+        return jsonify({'error': 'No video files provided'}), 400
+
+    get_analysis_pool()
+    max_clips = app.config['BATCH_MAX_CLIPS']
+    # (filename, job_id, path) per clip; each clip gets its own job directory
+    clips = []
+    saved_paths = []
+
+    def make_clip_path(filename):
+        job_id, job_dir = analysis_jobs.create_job_dir()
+        path = os.path.join(job_dir, "video.mp4")
+        saved_paths.append(path)
+        return path
+
+    try:
+        for video in uploads:
+            if video.filename.lower().endswith('.zip'):
+                extracted = extract_videos(video.stream, make_clip_path, max_clips - len(clips),
+                                           app.config['BATCH_MAX_EXTRACTED_MB'] * 1024 * 1024)
+            elif is_video_name(video.filename):
+                if len(clips) >= max_clips:
+                    raise BatchError(f"A batch may hold at most {max_clips} videos")
+                path = make_clip_path(video.filename)
+                video.save(path)
+                extracted = [(video.filename, path)]
+            else:
+                raise BatchError(f"Not a video or zip file: {video.filename}")
+            clips += [(filename, os.path.basename(os.path.dirname(path)), path) for filename, path in extracted]
+        if not clips:
+            raise BatchError("No videos found in the upload")
+    except BatchError as e:
+        remove_clip_dirs(saved_paths)
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        remove_clip_dirs(saved_paths)
+        logger.error(f"Error saving batch upload: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+    logger.info(f"Analyzing a batch of {len(clips)} videos")
+
+    def generate():
+        started = time.perf_counter()
+        finished_jobs = queue.Queue()
+        pending = list(enumerate(clips))
+        # Clips submitted and not finished yet, by job id
+        running = {}
+        lines = []
+        yield json.dumps({'type': 'batch', 'clips': [{'index': index, 'filename': filename, 'job_id': job_id}
+                                                     for index, (filename, job_id, _) in pending]}) + "\n"
+        try:
+            while pending or running:
+                # Keep the warm workers busy: submit clips while the queue has room,
+                # the rest as earlier clips (ours or other clients') finish
+                while pending and analysis_jobs.has_capacity():
+                    index, (filename, job_id, path) = pending[0]
+                    try:
+                        analysis_jobs.submit(path, job_id, options={'exercise': exercise},
+                                             on_done=finished_jobs.put)
+                    except QueueFullError:
+                        break
+                    pending.pop(0)
+                    running[job_id] = (index, filename)
+                try:
+                    job = finished_jobs.get(timeout=1)
+                except queue.Empty:
+                    continue
+                index, filename = running.pop(job.id)
+                line = clip_result(index, filename, job)
+                lines.append(line)
+                yield json.dumps(line) + "\n"
+            yield json.dumps(batch_totals(lines, time.perf_counter() - started)) + "\n"
+        finally:
+            # Clips not submitted yet when the client goes away are dropped;
+            # submitted ones still finish and stay available at /jobs/<job_id>
+            remove_clip_dirs([path for _, (_, _, path) in pending])
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+# API: Analysis job status and progress
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    job = analysis_jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown job'}), 404
+    return jsonify(job.to_dict())
+
+# API: Analysis job result
+@app.route('/jobs/<job_id>/result', methods=['GET'])
+def get_job_result(job_id):
+    job = analysis_jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown job'}), 404
+    if job.status == "failed":
+        return jsonify({'success': False, 'status': job.status, 'error': f'Analysis failed: {job.error}'}), 500
+    if job.status != "completed":
+        return jsonify({'success': False, 'status': job.status}), 202
+
+    result = job.result
+    return jsonify({
+        'success': True,
+        'status': job.status,
+        'message': result['summary'],
+        'timestamp': result.get('timestamp', job.finished_at),
+        'exercise': result.get('exercise'),
+        'exercise_reps': result.get('exercise_reps'),
+        'people': result.get('people'),
+        'reps': result['reps'],
+        'calories': result['calories'],
+        'duration': result['duration'],
+        'processing_time': result['processing_time'],
+        'realtime_factor': result['realtime_factor']
+    })
+
+# Serializes starting the analysis of a chunked upload
+upload_jobs_lock = threading.Lock()
+
+def get_upload(upload_id):
+    if not is_valid_id(upload_id):
+        return None
+    upload = ChunkedUpload(analysis_jobs.job_dir(upload_id), idle_timeout=app.config['UPLOAD_IDLE_TIMEOUT'])
+    return upload if upload.exists() else None
+
+def start_upload_analysis(upload, streaming):
+    """Queue the analysis of an upload once; a streaming analysis follows
+    the upload while it is still arriving. Returns the job."""
+    with upload_jobs_lock:
+        job = analysis_jobs.get(upload.upload_id)
+        if job is None:
+            job = analysis_jobs.submit(upload.video_path, upload.upload_id, upload if streaming else None,
+                                       upload.info()['options'])
+            logger.info(f"Started {'streaming ' if streaming else ''}analysis of upload {upload.upload_id}")
+        return job
+
+def upload_response(upload, job=None):
+    response = dict(upload.info(), success=True, job_id=None)
+    if job is not None:
+        response.update({
+            'job_id': job.id,
+            'status': job.status,
+            'status_url': f'/jobs/{job.id}',
+            'result_url': f'/jobs/{job.id}/result'
+        })
+    return response
+
+# API: Start a chunked, resumable upload
+# JSON body (optional): size in bytes, filename and exercise. Send the video with
+# PUT /uploads/<upload_id>; the upload completes by itself once size bytes
+# have arrived, or with POST /uploads/<upload_id>/complete
+@app.route('/uploads', methods=['POST'])
+def create_upload():
+    try:
+        get_analysis_pool()
+        if not analysis_jobs.has_capacity():
+            return jsonify({'error': 'Too many videos are being analyzed, please retry shortly'}), 429
+
+        params = request.get_json(silent=True) or {}
+        size = params.get('size')
+        if size is not None:
+            if not isinstance(size, int) or size < 0:
+                return jsonify({'error': 'size must be a non-negative integer'}), 400
+            if size > app.config['MAX_CONTENT_LENGTH']:
+                return jsonify({'error': 'File size too large'}), 413
+        exercise = get_exercise_param(params.get('exercise'), app.config['ANALYSIS_EXERCISE'])
+        if exercise is None:
+            return jsonify({'error': f"exercise must be one of: {', '.join(exercise_names())}"}), 400
+
+        remove_stale_uploads(analysis_jobs.jobs_folder, app.config['UPLOAD_IDLE_TIMEOUT'])
+        upload_id, upload_dir = analysis_jobs.create_job_dir()
+        upload = ChunkedUpload(upload_dir, idle_timeout=app.config['UPLOAD_IDLE_TIMEOUT'])
+        upload.create(size, params.get('filename'), {'exercise': exercise})
+        return jsonify(dict(upload_response(upload), upload_url=f'/uploads/{upload_id}')), 201
+
+    except Exception as e:
+        logger.error(f"Error creating upload: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+# API: Append a chunk to an upload
+# The Upload-Offset header (or offset parameter) gives the byte the chunk
+# starts at, which must equal the bytes received so far; a mismatch
+# answers 409 with the received count to resume from
+@app.route('/uploads/<upload_id>', methods=['PUT', 'PATCH'])
+def append_upload(upload_id):
+    upload = get_upload(upload_id)
+    if upload is None:
+        return jsonify({'error': 'Unknown upload'}), 404
+    try:
+        try:
+            offset = int(request.headers.get('Upload-Offset', request.args.get('offset', 0)))
+        except ValueError:
+            return jsonify({'error': 'offset must be an integer'}), 400
+
+        try:
+            received = upload.append(offset, request.stream, app.config['MAX_CONTENT_LENGTH'])
+        except UploadOffsetError as e:
+            return jsonify({'success': False, 'error': str(e), 'received': e.received}), 409
+        except UploadTooLargeError as e:
+            upload.abort()
+            return jsonify({'success': False, 'error': str(e)}), 413
+
+        size = upload.info()['size']
+        job = None
+        if size is not None and received >= size:
+            upload.complete()
+            job = start_upload_analysis(upload, streaming=False)
+        elif app.config['UPLOAD_STREAMING_ANALYSIS'] and upload.streamable():
+            # The container can be decoded from its prefix: analyze while the rest arrives
+            job = start_upload_analysis(upload, streaming=True)
+        return jsonify(upload_response(upload, job))
+
+    except QueueFullError as e:
+        # The bytes are stored; the analysis starts with a later chunk or on completion
+        return jsonify(dict(upload_response(upload), error=str(e)))
+    except Exception as e:
+        logger.error(f"Error writing upload {upload_id}: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+# API: Upload progress, for resuming after a dropped connection
+@app.route('/uploads/<upload_id>', methods=['GET'])
+def get_upload_status(upload_id):
+    upload = get_upload(upload_id)
+    if upload is None:
+        return jsonify({'error': 'Unknown upload'}), 404
+    return jsonify(upload_response(upload, analysis_jobs.get(upload_id)))
+
+# API: Finish an upload whose size was not given up front
+@app.route('/uploads/<upload_id>/complete', methods=['POST'])
+def complete_upload(upload_id):
+    upload = get_upload(upload_id)
+    if upload is None:
+        return jsonify({'error': 'Unknown upload'}), 404
+    try:
+        if upload.aborted():
+            return jsonify({'error': 'Upload was aborted'}), 409
+        upload.complete()
+        job = start_upload_analysis(upload, streaming=False)
+        return jsonify(upload_response(upload, job)), 202
+    except QueueFullError as e:
+        return jsonify({'error': str(e)}), 429
+    except Exception as e:
+        logger.error(f"Error completing upload {upload_id}: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+# API: Cancel an upload; an analysis already following it fails
+@app.route('/uploads/<upload_id>', methods=['DELETE'])
+def delete_upload(upload_id):
+    upload = get_upload(upload_id)
+    if upload is None:
+        return jsonify({'error': 'Unknown upload'}), 404
+    upload.abort()
+    if analysis_jobs.get(upload_id) is None:
+        shutil.rmtree(upload.upload_dir, ignore_errors=True)
+    return jsonify({'success': True})
+
+def get_session_dir(session_id):
+    """Directory holding a live session's stats, summary and pid files"""
+    if not is_valid_id(session_id):
+        return None
+    return os.path.join(app.config['SESSIONS_FOLDER'], session_id)
+
+def read_session_summary(session_dir):
+    """Latest WorkoutResult written by a live session's worker, or None"""
+    return WorkoutResult.read(os.path.join(session_dir, "summary.json"))
+
+def signal_session_worker(session_dir):
+    """Ask a live worker started by another server process to stop"""
+    with open(os.path.join(session_dir, "worker.pid"), "r") as f:
+        os.kill(int(f.read().strip()), signal.SIGTERM)
+
+def live_worker_args():
+    """model_live.py options shared by every live session"""
+    worker_args = ['python', 'model_live.py',
+                   '--record', app.config['LIVE_RECORDING'],
+                   '--record_scale', str(app.config['LIVE_RECORDING_SCALE']),
+                   '--record_fps', str(app.config['LIVE_RECORDING_FPS']),
+                   '--record_codec', app.config['LIVE_RECORDING_CODEC'],
+                   '--recordings_quota_mb', str(app.config['LIVE_RECORDINGS_MB']),
+                   '--max_people', str(app.config['MAX_PEOPLE']),
+                   '--pose_model', app.config['POSE_LANDMARKER_MODEL']]
+    if app.config['LIVE_ROI']:
+        worker_args.append('--roi')
+    return worker_args
+
+def start_live_worker():
+    global live_worker
+    if app.config['LIVE_WARM_WORKER'] and live_worker is None:
+        worker_args = live_worker_args() + ['--serve']
+        if not app.config['LIVE_KEEP_CAMERA']:
+            worker_args.append('--release_camera')
+        live_worker = LiveWorker(worker_args)
+        live_worker.start()
+
+def live_workout_running(session_id):
+    """Whether a live workout started by this server process is still running"""
+    worker = live_session_workers.get(session_id)
+    if worker is None:
+        return False
+    if worker is live_worker:
+        return live_worker.running(session_id)
+    return worker.poll() is None
+
+def reap_live_worker(process, session_dir=None):
+    # The worker still speaks its goodbye after reporting; don't make the client wait for it
+    if process is None:
+        # The warm worker cleans up the session and stays running
+        live_worker.wait_idle(timeout=20)
+    else:
+        try:
+            process.wait(timeout=20)
+        except subprocess.TimeoutExpired:
+            logger.warning("Live worker didn't exit after stopping, forcing kill...")
+            process.kill()
+            process.wait()
+    if session_dir is not None:
+        shutil.rmtree(session_dir, ignore_errors=True)
+
 # API: Start real-time camera workout
 @app.route('/start-camera', methods=['GET'])
 def start_camera():
-    # Clear summary and live stats files at startup, and stop signal file
-    if os.path.exists("summary.txt"):
-        os.remove("summary.txt")
-    if os.path.exists("live_workout_stats.txt"):
-        os.remove("live_workout_stats.txt")
-    if os.path.exists("stop_signal.txt"):
-        os.remove("stop_signal.txt")
-
-    global live_workout_process, live_workout_start_time
+    global live_workout_process, live_workout_start_time, live_session_id
     logger.debug("start_camera endpoint hit")
 
     try:
-        if live_workout_process is not None and live_workout_process.poll() is None: # Check if process is still running
+        if live_session_id is not None and live_workout_running(live_session_id): # Check if a workout is still running
             return jsonify({
                 'success': False,
                 'error': 'A workout is already in progress'
             }), 400
 
-        # Start the live workout process in a non-blocking way
-        logger.debug("Starting model_live.py subprocess...")
-        live_workout_process = subprocess.Popen(['python', 'model_live.py'],
-                                              stdout=sys.stdout, # Redirect to parent's stdout
-                                              stderr=sys.stderr) # Redirect to parent's stderr
+        exercise = get_exercise_param(request.args.get('exercise'), app.config['LIVE_EXERCISE'])
+        if exercise is None:
+            return jsonify({
+                'success': False,
+                'error': f"exercise must be one of: {', '.join(exercise_names())}"
+            }), 400
+
+        # Give the session its own directory instead of shared files in the CWD
+        session_id = str(uuid.uuid4())
+        session_dir = get_session_dir(session_id)
+        os.makedirs(session_dir)
+
+        # The worker pushes its stats to us over a localhost channel
+        live_session = LiveSession(session_id)
+
+        # Run the session on the warm worker, once it has finished with the
+        # previous one; without it, start a worker process in a non-blocking way
+        warm = live_worker is not None
+        if warm:
+            if not (live_worker.wait_idle(timeout=app.config['LIVE_WORKER_WAIT']) and
+                    live_worker.start_session(live_session, session_dir, exercise)):
+                # Still busy or restarting, and holding (or about to open) the
+                # camera: a second worker could not use it
+                live_session.close()
+                shutil.rmtree(session_dir, ignore_errors=True)
+                return jsonify({
+                    'success': False,
+                    'error': 'The live worker is busy or starting, please retry shortly'
+                }), 503
+            live_workout_process = None
+            live_session_workers[session_id] = live_worker
+        else:
+            logger.debug("Starting model_live.py subprocess...")
+            worker_args = live_worker_args() + ['--session_dir', session_dir,
+                                                '--control_port', str(live_session.port),
+                                                '--exercise', exercise]
+            live_workout_process = subprocess.Popen(worker_args,
+                                                  env=live_session.worker_env(),
+                                                  stdout=sys.stdout, # Redirect to parent's stdout
+                                                  stderr=sys.stderr) # Redirect to parent's stderr
+            live_session_workers[session_id] = live_workout_process
         
+        live_sessions[session_id] = live_session
+        live_session_id = session_id
         live_workout_start_time = datetime.now()
-        logger.info("Live workout started successfully.")
+        logger.info(f"Live workout {session_id} started successfully{' on the warm worker' if warm else ''}.")
         
         return jsonify({
             'success': True,
-            'message': 'Live workout started'
+            'message': 'Live workout started',
+            'session_id': session_id,
+            'warm': warm
         })
 
     except Exception as e:
@@ -184,106 +622,124 @@ def start_camera():
             'error': str(e)
         }), 500
 
+def live_summary_response(result):
+    """Final summary of a live workout, as returned to clients"""
+    return dict(result.to_dict(), success=True, message=result.summary_text())
+
+def finish_live_session(session_id, session_dir, worker, live_session):
+    """Stop a live workout, save it to history and publish its summary.
+
+    Runs in the background so /stop-workout returns right away; worker is
+    the session's process or the warm live_worker, and None for sessions
+    owned by another server process.
+    """
+    global live_workout_process, live_workout_start_time, live_session_id
+    owns_session = worker is not None
+    process = None if worker is live_worker else worker
+    finished = None
+    result = None
+    reaping = False
+    try:
+        if live_session is not None and live_session.send_command("stop"):
+            # The worker stops at its next frame and reports its final stats
+            logger.info(f"Sent stop command to live session {session_id}")
+            finished = live_session.wait_finished(timeout=10)
+
+        if finished is not None:
+            result = WorkoutResult.from_dict(finished)
+            if owns_session:
+                # The session directory goes once the worker has finished with it
+                threading.Thread(target=reap_live_worker, args=(process, session_dir), daemon=True).start()
+                reaping = True
+        else:
+            # No channel to the worker: stop it with SIGTERM and read its summary file
+            if owns_session and process is not None:
+                process.terminate()
+                reap_live_worker(process)
+            else:
+                signal_session_worker(session_dir)
+            logger.info(f"Sent stop signal to live session {session_id}")
+
+            # Another process's worker only reports through its summary file
+            wait_attempts = 6 if owns_session else 46 # 3 seconds, or 23 seconds when another process owns the session
+            for i in range(wait_attempts):
+                result = read_session_summary(session_dir)
+                if result is not None and not result.in_progress:
+                    logger.debug(f"Final summary found after {i*0.5} seconds.")
+                    break
+                time.sleep(0.5)
+
+        if result is None:
+            logger.error("Summary file not found after waiting")
+            live_summaries.publish(session_id, {'success': False, 'error': 'Failed to get workout summary'})
+            return
+
+        summary = live_summary_response(result)
+        logger.debug(f"Summary content: {summary['message']}")
+        # Only update history if workout completed successfully; the summary
+        # is published once it is saved, so /history already includes it
+        if result.completed:
+            update_history_with_details(result.reps, result.calories, result.duration, summary['message'])
+        else:
+            logger.warning(f"Not updating history due to workout status: {result.status}")
+        live_summaries.publish(session_id, summary)
+        logger.info(f"Live workout {session_id} stopped: {result.status}")
+    except Exception as e:
+        logger.error(f"Error stopping workout: {str(e)}")
+        live_summaries.publish(session_id, {'success': False, 'error': str(e)})
+    finally:
+        if not reaping:
+            shutil.rmtree(session_dir, ignore_errors=True)
+        live_session = live_sessions.pop(session_id, None)
+        if live_session is not None:
+            live_session.close()
+        live_session_workers.pop(session_id, None)
+        if owns_session and session_id == live_session_id:
+            live_workout_process = None
+            live_workout_start_time = None
+            live_session_id = None
+
 # API: Stop real-time camera workout
+# Returns 202 right away; the final summary follows on GET
+# /sessions/<session_id>/summary and as the end event of /live-stream
 @app.route('/stop-workout', methods=['GET'])
 def stop_workout():
-    global live_workout_process, live_workout_start_time
-    
     logger.debug("stop_workout endpoint hit")
 
+    session_id = request.args.get('session_id', live_session_id)
+    response = {
+        'success': True,
+        'message': 'Stopping workout',
+        'session_id': session_id,
+        'summary_url': f"/sessions/{session_id}/summary"
+    }
     try:
-        if live_workout_process is None or live_workout_process.poll() is not None:
+        if session_id in live_summaries:
+            # Already stopping or stopped
+            return jsonify(response), 202
+
+        # Only the server process that started the session holds its process
+        # handle (or runs it on its warm worker)
+        owns_session = session_id in live_session_workers
+        session_dir = get_session_dir(session_id)
+        if session_dir is None or not os.path.isdir(session_dir) or \
+                (owns_session and not live_workout_running(session_id)):
             logger.warning("No workout in progress or workout already stopped.")
+            if owns_session:
+                # The worker ended on its own (e.g. 'q' in the camera window)
+                live_session_workers.pop(session_id, None)
             return jsonify({
                 'success': False,
                 'error': 'No workout in progress or workout already stopped'
             }), 400
 
-        logger.debug("Stopping workout process...")
-        
-        # Signal model_live.py to stop by creating a file
-        with open("stop_signal.txt", "w") as f:
-            f.write("STOP")
-        logger.info("Sent stop signal to model_live.py")
-
-        # Wait for process to finish with a longer timeout
-        try:
-            live_workout_process.wait(timeout=20)
-        except subprocess.TimeoutExpired:
-            logger.warning("Process didn't terminate gracefully after signal, forcing kill...")
-            live_workout_process.kill()
-            live_workout_process.wait()
-        
-        # Clean up the stop signal file
-        if os.path.exists("stop_signal.txt"):
-            os.remove("stop_signal.txt")
-            logger.info("Cleaned up stop_signal.txt")
-        
-        logger.debug("Process terminated, waiting for summary file...")
-        
-        # Wait for the summary file to be written, with a timeout
-        summary_file_path = "summary.txt"
-        wait_attempts = 6 # Total wait time 6 * 0.5 = 3 seconds
-        file_found = False
-        for i in range(wait_attempts):
-            if os.path.exists(summary_file_path):
-                logger.debug(f"Summary file found after {i*0.5} seconds.")
-                file_found = True
-                break
-            time.sleep(0.5)
-        
-        summary = ""
-        reps = 0
-        calories = 0.0
-        duration = 0.0
-        status = "unknown"
-        
-        if file_found:
-            logger.debug("Found summary.txt, reading contents...")
-            with open("summary.txt", "r") as f:
-                lines = f.readlines()
-                summary = "".join(lines)
-                logger.debug(f"Summary content: {summary}")
-                
-                # Check first line for status
-                if lines and "Workout" in lines[0]:
-                    status = lines[0].strip()
-                
-                for line in lines:
-                    if "Reps:" in line:
-                        reps = int(line.split(":")[1].strip())
-                    elif "Calories:" in line:
-                        calories = float(line.split(":")[1].replace('s', '').strip())
-                    elif "Duration:" in line:
-                        duration = float(line.split(":")[1].replace('s', '').strip())
-            
-            logger.debug(f"Parsed values - Status: {status}, Reps: {reps}, Calories: {calories}, Duration: {duration}")
-            
-            # Only update history if workout completed successfully
-            if "completed" in status.lower():
-                try:
-                    update_history_with_details(reps, calories, duration, summary)
-                    logger.info("History updated successfully")
-                except Exception as e:
-                    logger.error(f"Failed to update history: {str(e)}")
-                    # Continue even if history update fails
-            else:
-                logger.warning(f"Not updating history due to workout status: {status}")
-            
-            return jsonify({
-                'success': True,
-                'message': summary,
-                'status': status,
-                'reps': reps,
-                'calories': calories,
-                'duration': duration
-            })
-        else:
-            logger.error("Summary file not found after waiting")
-            return jsonify({
-                'success': False,
-                'error': 'Failed to get workout summary'
-            }), 500
+        if live_summaries.add(session_id):
+            logger.debug("Stopping workout process...")
+            threading.Thread(target=finish_live_session,
+                             args=(session_id, session_dir, live_session_workers.get(session_id),
+                                   live_sessions.get(session_id)),
+                             daemon=True).start()
+        return jsonify(response), 202
 
     except Exception as e:
         logger.error(f"Error stopping workout: {str(e)}")
@@ -291,30 +747,111 @@ def stop_workout():
             'success': False,
             'error': str(e)
         }), 500
-    finally:
-        live_workout_process = None
-        live_workout_start_time = None
+
+# API: Final summary of a stopped live workout
+# Query parameter: timeout (seconds to wait for the summary, default 30);
+# returns 202 while the workout is still stopping
+@app.route('/sessions/<session_id>/summary', methods=['GET'])
+def get_session_summary(session_id):
+    if session_id not in live_summaries:
+        return jsonify({'success': False, 'error': 'Workout not stopped or unknown session'}), 404
+    try:
+        timeout = min(max(float(request.args.get('timeout', 30)), 0.0), app.config['LIVE_SUMMARY_MAX_WAIT'])
+    except ValueError:
+        return jsonify({'success': False, 'error': 'timeout must be a number'}), 400
+    summary = live_summaries.wait(session_id, timeout)
+    if summary is None:
+        return jsonify({'success': True, 'status': 'stopping', 'session_id': session_id}), 202
+    return jsonify(summary), 200 if summary['success'] else 500
 
 # API: Get real-time live workout stats
 @app.route('/live-stats', methods=['GET'])
 def get_live_stats():
     stats = {'reps': 0, 'calories': 0.0, 'duration': 0.0}
     try:
-        if os.path.exists("live_workout_stats.txt"):
-            with open("live_workout_stats.txt", "r") as f:
-                lines = f.readlines()
-                for line in lines:
-                    if "Reps:" in line:
-                        stats['reps'] = int(line.split(":")[1].strip())
-                    elif "Calories:" in line:
-                        stats['calories'] = float(line.split(":")[1].strip())
-                    elif "Duration:" in line:
-                        stats['duration'] = float(line.split(":")[1].strip().replace('s',''))
+        session_id = request.args.get('session_id', live_session_id)
+        # Sessions started by this process push their stats over their event
+        # channel; the worker is only asked (and waited for) before its first push
+        live_session = live_sessions.get(session_id)
+        if live_session is not None:
+            if live_session.has_stats():
+                return jsonify(live_session.latest_stats())
+            return jsonify(live_session.request_stats(timeout=0.5))
+
+        # Other processes' sessions: the worker's latest summary file
+        session_dir = get_session_dir(session_id)
+        result = read_session_summary(session_dir) if session_dir else None
+        if result is not None:
+            stats = result.to_dict()
         return jsonify(stats)
     except Exception as e:
         logger.error(f"Error reading live stats: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+def set_live_paused(paused):
+    live_session = live_sessions.get(request.args.get('session_id', live_session_id))
+    if live_session is None or not live_session.send_command("pause" if paused else "resume"):
+        return jsonify({'success': False, 'error': 'No live workout in progress'}), 400
+    # The worker acknowledges at its next frame
+    stats = live_session.wait_for_stats(lambda stats: stats['paused'] == paused, timeout=1.0)
+    return jsonify({'success': True, 'stats': stats})
+
+# API: Pause a live workout; reps and duration stop counting until it is resumed
+@app.route('/pause-workout', methods=['GET'])
+def pause_workout():
+    return set_live_paused(True)
+
+# API: Resume a paused live workout
+@app.route('/resume-workout', methods=['GET'])
+def resume_workout():
+    return set_live_paused(False)
+
+# API: Per-stage FPS, utilization and queue depth of a live worker's pipeline
+@app.route('/live-metrics', methods=['GET'])
+def get_live_metrics():
+    live_session = live_sessions.get(request.args.get('session_id', live_session_id))
+    if live_session is None:
+        return jsonify({'success': False, 'error': 'No live workout with this session id'}), 404
+    return jsonify({'success': True, 'pipeline': live_session.metrics,
+                    'startup_seconds': live_session.startup_seconds})
+
+# API: Warm live worker status and start-up timings
+@app.route('/live-worker', methods=['GET'])
+def get_live_worker():
+    if live_worker is None:
+        return jsonify({'success': True, 'enabled': False})
+    return jsonify(dict(live_worker.status(), success=True, enabled=True))
+
+# API: Stream live workout stats as Server-Sent Events
+# "rep" events are sent as soon as a rep is counted; "stats" events carry
+# the latest reps/calories/duration, coalesced while the client catches up;
+# "end" is sent when the workout finishes, with the final summary once it
+# was stopped through /stop-workout. /live-stats remains for polling.
+@app.route('/live-stream', methods=['GET'])
+def live_stream():
+    live_session = live_sessions.get(request.args.get('session_id', live_session_id))
+    if live_session is None:
+        return jsonify({'success': False, 'error': 'No live workout with this session id'}), 404
+
+    def generate():
+        seq = 0
+        while True:
+            seq, rep_events, stats, closed = live_session.wait_for_update(seq, timeout=15)
+            for event in rep_events:
+                yield f"event: rep\ndata: {json.dumps(event)}\n\n"
+            if stats is not None:
+                yield f"event: stats\ndata: {json.dumps(stats)}\n\n"
+            if closed:
+                # The end event carries the final summary of a stopped workout
+                summary = live_summaries.wait(live_session.session_id, timeout=app.config['LIVE_SUMMARY_MAX_WAIT'])
+                yield f"event: end\ndata: {json.dumps(summary or live_session.finished or {})}\n\n"
+                return
+            if not rep_events and stats is None:
+                yield ": keep-alive\n\n"
+
+    return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
 def update_history(summary):
     # This function is now deprecated, use update_history_with_details instead
     pass
@@ -323,61 +860,57 @@ def update_history_with_details(reps, calories, duration, summary_text):
     try:
         timestamp = datetime.now().isoformat()
         logger.debug(f"update_history_with_details - Timestamp: {timestamp}, Reps: {reps}, Calories: {calories}, Duration: {duration}, Summary: {summary_text[:50]}...")
-        # Add to history.csv
-        with open("history.csv", "a", newline='') as csvfile:
-            writer = csv.writer(csvfile)
-            writer.writerow([
-                timestamp,
-                reps,
-                calories,
-                duration,
-                summary_text.strip() # Store the full summary text
-            ])
-        logger.info("Successfully wrote to history.csv")
+        history_store.add(timestamp, reps, calories, duration, summary_text.strip())
+        logger.info("Successfully saved workout to history")
     except Exception as e:
         logger.error(f"Error updating history: {str(e)}")
 
-# API: Return workout history
+# API: Return workout history, newest first
+# Query parameters: limit (page size), before and since (ISO timestamps),
+# before_id; pass the last timestamp and id of a page as before and
+# before_id to fetch the next one
 @app.route('/history')
 def get_history():
     try:
-        history = []
-        if os.path.exists("history.csv"):
-            with open("history.csv", "r") as csvfile:
-                reader = csv.reader(csvfile)
-                # Attempt to skip header only if file is not empty
-                try:
-                    first_line = next(csvfile)
-                    if not first_line.strip().startswith("timestamp"): # Adjust if your header is different
-                        csvfile.seek(0) # Go back to beginning if it's not a header
-                except StopIteration:
-                    csvfile.seek(0) # Empty file, seek to beginning
-
-                # Reset reader after potential seek
-                csvfile.seek(0) # Ensure we read from the beginning after header check
-                reader = csv.reader(csvfile)
-                
-                # Skip header if it exists (assuming the first row is header)
-                header_skipped = False
-                for row in reader:
-                    if not header_skipped and row and row[0] == 'timestamp': # Simple check for header
-                        header_skipped = True
-                        continue
-
-                    if len(row) >= 5: # Changed from 4 to 5 to include summary text
-                        history.append({
-                            'timestamp': row[0],
-                            'reps': int(row[1]),
-                            'calories': float(row[2]),
-                            'duration': float(row[3]),
-                            'summary': row[4] # Add summary text
-                        })
-        logger.debug(f"get_history - Returning {len(history)} entries: {history}")
+        try:
+            limit = int(request.args.get('limit', app.config['HISTORY_PAGE_SIZE']))
+            before_id = request.args.get('before_id')
+            before_id = int(before_id) if before_id is not None else None
+        except ValueError:
+            return jsonify({'error': 'limit and before_id must be integers'}), 400
+        limit = max(1, min(limit, app.config['HISTORY_MAX_PAGE_SIZE']))
+        history = history_store.query(limit=limit,
+                                      before=request.args.get('before'),
+                                      since=request.args.get('since'),
+                                      before_id=before_id)
+        logger.debug(f"get_history - Returning {len(history)} entries")
         return jsonify(history)
     except Exception as e:
         logger.error(f"Error reading history: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+# API: Workout totals per day, week and month, streaks and personal bests
+# Query parameter: limit (number of most recent days/weeks/months, default 30)
+@app.route('/history/stats')
+def get_history_stats():
+    try:
+        try:
+            limit = int(request.args.get('limit', 30))
+        except ValueError:
+            return jsonify({'error': 'limit must be an integer'}), 400
+        limit = max(1, min(limit, app.config['HISTORY_MAX_PAGE_SIZE']))
+        return jsonify({
+            'totals': history_store.totals(),
+            'daily': history_store.rollups('day', limit),
+            'weekly': history_store.rollups('week', limit),
+            'monthly': history_store.rollups('month', limit),
+            'streaks': history_store.streaks(),
+            'personal_bests': history_store.personal_bests()
+        })
+    except Exception as e:
+        logger.error(f"Error reading history stats: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
 # Serve static frontend files
 @app.route('/<path:path>')
 def static_proxy(path):
@@ -388,6 +921,11 @@ if __name__ == '__main__':
     if not os.path.exists(UPLOAD_FOLDER):
         os.makedirs(UPLOAD_FOLDER)
  
+    # Pay the worker start-up cost once, before the first upload
+    get_analysis_pool().warm_up()
+    # ... and before the first live workout
+    start_live_worker()
+
     port = int(os.environ.get("PORT", 5000))
     app.run(host='0.0.0.0', port=port)
 
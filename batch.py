@@ -0,0 +1,98 @@
+import os
+import shutil
+import zipfile
+
+# Members of an uploaded zip that are analyzed; anything else is skipped
+VIDEO_EXTENSIONS = ('.mp4', '.mov', '.m4v', '.avi', '.mkv', '.webm')
+
+class BatchError(Exception):
+    """Raised when a batch upload can't be accepted as a whole"""
+    pass
+
+def is_video_name(filename):
+    return os.path.splitext(filename)[1].lower() in VIDEO_EXTENSIONS
+
+def extract_videos(archive, make_path, max_clips, max_bytes):
+    """Copy the videos of a zip file to make_path(filename) each.
+
+    Returns (filename, path) pairs in archive order. Sizes are counted as
+    they are copied, not taken from the archive's own directory, so a zip
+    that inflates past max_bytes (or holds more than max_clips videos) is
+    refused instead of filling the disk.
+    """
+    try:
+        zf = zipfile.ZipFile(archive)
+    except zipfile.BadZipFile as e:
+        raise BatchError(f"Not a valid zip file: {e}")
+
+    clips = []
+    total = 0
+    with zf:
+        for info in zf.infolist():
+            # Only the base name is used, so member paths can't escape the job directory
+            filename = os.path.basename(info.filename)
+            if info.is_dir() or not filename or filename.startswith('.') or not is_video_name(filename):
+                continue
+            if len(clips) >= max_clips:
+                raise BatchError(f"A batch may hold at most {max_clips} videos")
+            path = make_path(filename)
+            clips.append((filename, path))
+            with zf.open(info) as src, open(path, "wb") as dst:
+                while True:
+                    block = src.read(1024 * 1024)
+                    if not block:
+                        break
+                    total += len(block)
+                    if total > max_bytes:
+                        raise BatchError(f"Videos in the zip exceed {max_bytes // (1024 * 1024)}MB")
+                    dst.write(block)
+    return clips
+
+def clip_result(index, filename, job):
+    """One NDJSON line of a batch: a finished clip's result or error"""
+    line = {'type': 'clip', 'index': index, 'filename': filename, 'job_id': job.id, 'status': job.status}
+    if job.status != "completed":
+        line.update(success=False, error=f'Analysis failed: {job.error}')
+        return line
+    result = job.result
+    line.update(success=True,
+                message=result['summary'],
+                exercise=result.get('exercise'),
+                exercise_reps=result.get('exercise_reps'),
+                people=result.get('people'),
+                reps=result['reps'],
+                calories=result['calories'],
+                duration=result['duration'],
+                processing_time=result['processing_time'],
+                realtime_factor=result['realtime_factor'])
+    return line
+
+def batch_totals(lines, wall_time):
+    """Final NDJSON line of a batch: totals over its finished clips.
+
+    realtime_factor compares the video time analyzed to the batch's wall
+    time, so it shows what analyzing the clips side by side gained over
+    their own per-clip factors.
+    """
+    completed = [line for line in lines if line['success']]
+    duration = sum(line['duration'] for line in completed)
+    reps_by_exercise = {}
+    for line in completed:
+        reps_by_exercise[line['exercise']] = reps_by_exercise.get(line['exercise'], 0) + line['reps']
+    return {
+        'type': 'totals',
+        'clips': len(lines),
+        'completed': len(completed),
+        'failed': len(lines) - len(completed),
+        'reps': sum(line['reps'] for line in completed),
+        'exercise_reps': reps_by_exercise,
+        'calories': round(sum(line['calories'] for line in completed), 1),
+        'duration': round(duration, 1),
+        'processing_time': round(wall_time, 2),
+        'realtime_factor': round(duration / wall_time, 2) if wall_time > 0 else 0.0
+    }
+
+def remove_clip_dirs(paths):
+    """Delete the job directories of clips that were never submitted"""
+    for path in paths:
+        shutil.rmtree(os.path.dirname(path), ignore_errors=True)
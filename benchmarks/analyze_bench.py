@@ -0,0 +1,102 @@
+import argparse
+import io
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Recorded clip used when no video is given
+DEFAULT_CLIP = os.path.join("uploads", "live_workout_20250618_173745.mp4")
+# How often clients poll for their result
+POLL_INTERVAL = 0.02
+
+def load_app(landmark_cache=False):
+    """Import app.py against a throwaway history database, so benchmark
+    runs don't show up as workouts; the landmark cache is off unless
+    asked for, as every request uploads the same clip"""
+    os.environ['HISTORY_DB'] = os.path.join(tempfile.mkdtemp(prefix="analyze_bench_"), "history.db")
+    if not landmark_cache:
+        os.environ['LANDMARK_CACHE_MB'] = '0'
+    os.chdir(ROOT)
+    import app
+    app.get_analysis_pool().warm_up()
+    return app
+
+def analyze_once(client, video_bytes):
+    """POST /analyze and poll until the result is ready; returns (seconds, result)"""
+    start_time = time.perf_counter()
+    response = client.post('/analyze', data={'video': (io.BytesIO(video_bytes), 'clip.mp4')})
+    if response.status_code != 202:
+        return time.perf_counter() - start_time, None
+    result_url = response.get_json()['result_url']
+    while True:
+        response = client.get(result_url)
+        if response.status_code != 202:
+            break
+        time.sleep(POLL_INTERVAL)
+    result = response.get_json() if response.status_code == 200 else None
+    return time.perf_counter() - start_time, result
+
+def bench_analyze(app, video_path=DEFAULT_CLIP, clients=1, requests_per_client=2):
+    """End-to-end /analyze latency and throughput with clients uploading
+    at once, each through its own Flask test client"""
+    with open(video_path, "rb") as f:
+        video_bytes = f.read()
+    latencies = []
+    video_seconds = []
+    failed = []
+    lock = threading.Lock()
+
+    def run_client():
+        client = app.app.test_client()
+        for _ in range(requests_per_client):
+            seconds, result = analyze_once(client, video_bytes)
+            with lock:
+                if result is None:
+                    failed.append(seconds)
+                else:
+                    latencies.append(seconds)
+                    video_seconds.append(result['duration'])
+
+    threads = [threading.Thread(target=run_client) for _ in range(clients)]
+    start_time = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall_time = time.perf_counter() - start_time
+
+    latencies = np.array(latencies) if latencies else np.zeros(1)
+    return {
+        'benchmark': 'analyze_end_to_end',
+        'clients': clients,
+        'requests': clients * requests_per_client,
+        'failed': len(failed),
+        'mean_s': round(float(latencies.mean()), 3),
+        'p50_s': round(float(np.percentile(latencies, 50)), 3),
+        'p95_s': round(float(np.percentile(latencies, 95)), 3),
+        'seconds': round(wall_time, 3),
+        'videos_per_minute': round(len(video_seconds) * 60 / wall_time, 2) if wall_time > 0 else 0.0,
+        # Seconds of video analyzed per second of wall time, over every client
+        'realtime_factor': round(sum(video_seconds) / wall_time, 2) if wall_time > 0 else 0.0
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Measure /analyze latency and throughput under concurrent clients.')
+    parser.add_argument('video_path', type=str, nargs='?', default=DEFAULT_CLIP, help='Video every client uploads.')
+    parser.add_argument('--clients', type=int, nargs='+', default=[1, 2], help='Concurrent clients to run.')
+    parser.add_argument('--requests', type=int, default=2, help='Videos each client analyzes in turn.')
+    parser.add_argument('--landmark_cache', action='store_true',
+                        help='Keep the landmark cache on (repeated uploads are then served from it).')
+    args = parser.parse_args()
+
+    app = load_app(args.landmark_cache)
+    for clients in args.clients:
+        print(json.dumps(bench_analyze(app, args.video_path, clients, args.requests)))
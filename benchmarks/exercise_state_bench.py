@@ -0,0 +1,46 @@
+import argparse
+import json
+import math
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from exercise_state import ExerciseState
+
+def squat_angles(frames, fps=30.0, rep_seconds=2.0):
+    """Knee angles of a steady squat, swinging between about 70 and 170 degrees"""
+    return [120.0 + 50.0 * math.cos(2 * math.pi * i / (fps * rep_seconds)) for i in range(frames)]
+
+def bench_updates(states=1, frames=100000, repeat=5, fps=30.0):
+    """Best-of-repeat ExerciseState.update_rep throughput over states interleaved streams"""
+    angles = squat_angles(frames, fps)
+    timestamps = [i / fps for i in range(frames)]
+    best = float('inf')
+    for _ in range(repeat):
+        exercise_states = [ExerciseState() for _ in range(states)]
+        start_time = time.perf_counter()
+        for angle, timestamp in zip(angles, timestamps):
+            for exercise_state in exercise_states:
+                exercise_state.update_rep(angle, timestamp)
+        best = min(best, time.perf_counter() - start_time)
+    updates = frames * states
+    return {
+        'benchmark': 'exercise_state_update',
+        'states': states,
+        'updates': updates,
+        'seconds': round(best, 4),
+        'updates_per_second': round(updates / best),
+        'reps': exercise_states[0].counter
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Measure ExerciseState updates per second.')
+    parser.add_argument('--frames', type=int, default=100000, help='Updates per state.')
+    parser.add_argument('--states', type=int, nargs='+', default=[1, 8], help='Concurrent states to update.')
+    parser.add_argument('--repeat', type=int, default=5, help='Runs per case; the fastest is reported.')
+    args = parser.parse_args()
+
+    for states in args.states:
+        print(json.dumps(bench_updates(states, args.frames, args.repeat)))
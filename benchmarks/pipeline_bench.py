@@ -0,0 +1,103 @@
+import argparse
+import json
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import model
+from exercises import DEFAULT_EXERCISE, get_exercise, landmarks_to_array
+
+# Recorded clip used when no video is given
+DEFAULT_CLIP = "uploads/live_workout_20250618_173745.mp4"
+STAGES = ('decode', 'resize', 'color_convert', 'pose_process', 'angle', 'update_rep')
+
+def stage_row(stage, seconds):
+    milliseconds = np.array(seconds) * 1000
+    return {
+        'benchmark': 'pipeline_stage',
+        'stage': stage,
+        'calls': len(milliseconds),
+        'mean_ms': round(float(milliseconds.mean()), 4) if len(milliseconds) else None,
+        'p50_ms': round(float(np.percentile(milliseconds, 50)), 4) if len(milliseconds) else None,
+        'p95_ms': round(float(np.percentile(milliseconds, 95)), 4) if len(milliseconds) else None
+    }
+
+def bench_stages(video_path=DEFAULT_CLIP, inference_size=model.DEFAULT_INFERENCE_SIZE, max_frames=None,
+                 exercise=DEFAULT_EXERCISE):
+    """Per-frame time of each step model.py takes for a video: decode,
+    resize, BGR to RGB conversion, pose.process, the joint angle and
+    ExerciseState.update_rep, each timed on its own"""
+    timings = {stage: [] for stage in STAGES}
+    counted = get_exercise(exercise)
+    exercise_state = counted.new_state()
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise FileNotFoundError(f"Could not open video {video_path}")
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    frames = 0
+    start_time = time.perf_counter()
+    try:
+        with model.create_pose() as pose:
+            while max_frames is None or frames < max_frames:
+                t0 = time.perf_counter()
+                ret, frame = cap.read()
+                t1 = time.perf_counter()
+                if not ret:
+                    break
+                timings['decode'].append(t1 - t0)
+                timestamp = model.get_media_time(cap, frames, fps)
+                frames += 1
+
+                t0 = time.perf_counter()
+                resized = cv2.resize(frame, inference_size)
+                t1 = time.perf_counter()
+                image = cv2.cvtColor(resized, cv2.COLOR_BGR2RGB)
+                t2 = time.perf_counter()
+                image.flags.writeable = False
+                results = pose.process(image)
+                t3 = time.perf_counter()
+                timings['resize'].append(t1 - t0)
+                timings['color_convert'].append(t2 - t1)
+                timings['pose_process'].append(t3 - t2)
+                if not results.pose_landmarks:
+                    continue
+
+                landmarks = landmarks_to_array(results.pose_landmarks)
+                t0 = time.perf_counter()
+                angle = counted.angle(landmarks)
+                t1 = time.perf_counter()
+                exercise_state.update_rep(angle, timestamp)
+                t2 = time.perf_counter()
+                timings['angle'].append(t1 - t0)
+                timings['update_rep'].append(t2 - t1)
+    finally:
+        cap.release()
+    wall_time = time.perf_counter() - start_time
+
+    rows = [stage_row(stage, timings[stage]) for stage in STAGES]
+    rows.append({
+        'benchmark': 'pipeline_total',
+        'frames': frames,
+        'detected_frames': len(timings['angle']),
+        'reps': exercise_state.counter,
+        'seconds': round(wall_time, 3),
+        'frames_per_second': round(frames / wall_time, 2) if wall_time > 0 else 0.0
+    })
+    return rows
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Time each step of model.py\'s per-frame pipeline.')
+    parser.add_argument('video_path', type=str, nargs='?', default=DEFAULT_CLIP, help='Video to analyze.')
+    parser.add_argument('--frames', type=int, default=None, help='Only use the first N frames.')
+    parser.add_argument('--inference_size', type=model.parse_frame_size, default=model.DEFAULT_INFERENCE_SIZE,
+                        help='Frame size used for pose inference, as WIDTHxHEIGHT (default 640x480).')
+    parser.add_argument('--exercise', type=str, default=DEFAULT_EXERCISE, help='Exercise whose angle is counted.')
+    args = parser.parse_args()
+
+    for row in bench_stages(args.video_path, args.inference_size, args.frames, args.exercise):
+        print(json.dumps(row))
@@ -0,0 +1,78 @@
+import argparse
+import json
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import model
+from roi import RoiTracker
+
+def read_frames(video_path, max_frames=None):
+    """Decode a video up front so only inference is timed"""
+    cap = cv2.VideoCapture(video_path)
+    frames = []
+    try:
+        while max_frames is None or len(frames) < max_frames:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            frames.append(frame)
+    finally:
+        cap.release()
+    return frames
+
+def bench_inference(frames, roi=False, inference_size=model.DEFAULT_INFERENCE_SIZE, fps=30.0):
+    """Per-frame model.infer_pose latency over decoded frames, whole frame or
+    ROI, and the squats counted from the landmarks (ROI can change them)"""
+    latencies = []
+    landmarks = []
+    roi_tracker = RoiTracker() if roi else None
+    crops = 0
+    with model.create_pose() as pose:
+        for frame in frames:
+            cropped = roi_tracker is not None and roi_tracker.box is not None
+            start_time = time.perf_counter()
+            _, results = model.infer_pose(pose, frame, inference_size, roi_tracker)
+            latencies.append(time.perf_counter() - start_time)
+            crops += cropped
+            landmarks.append(model.landmarks_to_array(results.pose_landmarks) if results.pose_landmarks
+                             else np.full((model.NUM_LANDMARKS, 4), np.nan, dtype=np.float32))
+    latencies_ms = np.array(latencies) * 1000
+    rep_times, _ = model.count_reps_batch(np.arange(len(frames)) / fps, np.stack(landmarks))
+    return {
+        'benchmark': 'pose_inference_roi' if roi else 'pose_inference_full_frame',
+        'frames': len(frames),
+        'cropped_frames': int(crops),
+        'mean_ms': round(float(latencies_ms.mean()), 2),
+        'p50_ms': round(float(np.percentile(latencies_ms, 50)), 2),
+        'p95_ms': round(float(np.percentile(latencies_ms, 95)), 2),
+        'detected_frames': int(sum(not np.isnan(lm).any() for lm in landmarks)),
+        'reps': len(rep_times)
+    }, np.stack(landmarks)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Compare pose inference latency per frame with and without ROI cropping.')
+    parser.add_argument('video_path', type=str, help='Video to run pose inference on.')
+    parser.add_argument('--frames', type=int, default=None, help='Only use the first N frames.')
+    parser.add_argument('--inference_size', type=model.parse_frame_size, default=model.DEFAULT_INFERENCE_SIZE,
+                        help='Frame size of whole-frame inference, as WIDTHxHEIGHT (default 640x480).')
+    args = parser.parse_args()
+
+    frames = read_frames(args.video_path, args.frames)
+    cap = cv2.VideoCapture(args.video_path)
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    cap.release()
+    full, full_landmarks = bench_inference(frames, False, args.inference_size, fps)
+    cropped, roi_landmarks = bench_inference(frames, True, args.inference_size, fps)
+    # How far ROI landmarks land from whole-frame ones, in frame widths/heights
+    both = ~np.isnan(full_landmarks[:, :, 0]) & ~np.isnan(roi_landmarks[:, :, 0])
+    offsets = np.abs(full_landmarks[:, :, :2] - roi_landmarks[:, :, :2])[both]
+    cropped['speedup'] = round(full['mean_ms'] / cropped['mean_ms'], 2) if cropped['mean_ms'] > 0 else 0.0
+    cropped['mean_landmark_offset'] = round(float(offsets.mean()), 4) if len(offsets) else None
+    for row in (full, cropped):
+        print(json.dumps(row))
@@ -0,0 +1,125 @@
+import argparse
+import json
+import os
+import platform
+import sys
+from datetime import datetime
+
+import cv2
+import mediapipe as mp
+import numpy as np
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCH_DIR)
+
+from analyze_bench import bench_analyze, load_app
+from exercise_state_bench import bench_updates
+from pipeline_bench import DEFAULT_CLIP, bench_stages
+from roi_bench import bench_inference, read_frames
+
+DEFAULT_BASELINE = os.path.join(BENCH_DIR, "baseline.json")
+# Fields that tell apart rows of the same benchmark
+KEY_FIELDS = ('benchmark', 'stage', 'states', 'clients')
+# Metrics compared against the baseline, by the direction that is better
+LOWER_IS_BETTER = ('mean_ms', 'p50_ms', 'p95_ms', 'mean_s', 'p50_s', 'p95_s')
+HIGHER_IS_BETTER = ('updates_per_second', 'frames_per_second', 'videos_per_minute', 'realtime_factor')
+# Relative change beyond which a metric counts as a regression
+DEFAULT_TOLERANCE = 0.2
+
+def machine_info():
+    """What the numbers depend on, recorded next to them"""
+    return {
+        'platform': platform.platform(),
+        'processor': platform.processor() or platform.machine(),
+        'cpu_count': os.cpu_count(),
+        'python': platform.python_version(),
+        'opencv': cv2.__version__,
+        'mediapipe': mp.__version__,
+        'numpy': np.__version__
+    }
+
+def row_key(row):
+    return tuple((field, row[field]) for field in KEY_FIELDS if field in row)
+
+def compare(results, baseline, tolerance=DEFAULT_TOLERANCE):
+    """Metrics that got worse than the baseline by more than tolerance,
+    as one dict per metric"""
+    baseline_rows = {row_key(row): row for row in baseline['results']}
+    regressions = []
+    for row in results:
+        base = baseline_rows.get(row_key(row))
+        if base is None:
+            continue
+        for metric in LOWER_IS_BETTER + HIGHER_IS_BETTER:
+            value, base_value = row.get(metric), base.get(metric)
+            if value is None or not base_value:
+                continue
+            change = (value - base_value) / base_value
+            if metric in LOWER_IS_BETTER and change > tolerance or \
+                    metric in HIGHER_IS_BETTER and change < -tolerance:
+                regressions.append({'key': dict(row_key(row)), 'metric': metric, 'baseline': base_value,
+                                    'value': value, 'change': round(change, 3)})
+    return regressions
+
+def run_suite(video_path=DEFAULT_CLIP, clients=(1, 2), requests_per_client=2, analyze=True):
+    results = bench_stages(video_path)
+    results += [bench_updates(states) for states in (1, 8)]
+    cap = cv2.VideoCapture(video_path)
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    cap.release()
+    frames = read_frames(video_path)
+    results += [bench_inference(frames, roi, fps=fps)[0] for roi in (False, True)]
+    if analyze:
+        app = load_app()
+        try:
+            results += [bench_analyze(app, video_path, count, requests_per_client) for count in clients]
+        finally:
+            app.get_analysis_pool().shutdown()
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Run the benchmark suite and compare it against a baseline.')
+    parser.add_argument('video_path', type=str, nargs='?', default=DEFAULT_CLIP, help='Recorded clip to benchmark on.')
+    parser.add_argument('--clients', type=int, nargs='+', default=[1, 2], help='Concurrent /analyze clients to run.')
+    parser.add_argument('--requests', type=int, default=2, help='Videos each /analyze client analyzes in turn.')
+    parser.add_argument('--skip_analyze', action='store_true', help='Skip the end-to-end /analyze benchmark.')
+    parser.add_argument('--output', type=str, default=None, help='Also write the report to this JSON file.')
+    parser.add_argument('--baseline', type=str, default=DEFAULT_BASELINE, help='Baseline report to compare against.')
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help='Relative slowdown that counts as a regression (default 0.2).')
+    parser.add_argument('--save_baseline', action='store_true', help='Store this run as the new baseline.')
+    parser.add_argument('--note', type=str, default=None,
+                        help='Note kept in the report, e.g. what the machine is (not) representative of.')
+    args = parser.parse_args()
+
+    report = {
+        'created_at': datetime.now().isoformat(),
+        'video': args.video_path,
+        'machine': machine_info(),
+        'note': args.note,
+        'results': run_suite(args.video_path, args.clients, args.requests, not args.skip_analyze)
+    }
+
+    regressions = []
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=2)
+    elif os.path.exists(args.baseline):
+        with open(args.baseline, "r") as f:
+            baseline = json.load(f)
+        if baseline.get('machine') != report['machine']:
+            print(f"Warning: baseline was recorded on another machine: {baseline.get('machine')}", file=sys.stderr)
+        if baseline.get('note'):
+            print(f"Baseline note: {baseline['note']}", file=sys.stderr)
+        regressions = compare(report['results'], baseline, args.tolerance)
+        report['baseline'] = args.baseline
+        report['regressions'] = regressions
+    else:
+        print(f"No baseline at {args.baseline}; run with --save_baseline to record one", file=sys.stderr)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    print(json.dumps(report, indent=2))
+    # Non-zero exit status so CI fails on a regression
+    sys.exit(1 if regressions else 0)
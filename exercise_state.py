@@ -0,0 +1,91 @@
+import time
+from collections import deque
+
+import numpy as np
+
+def calculate_angle(a, b, c):
+    """Calculate the angle between three points"""
+    a = np.array(a)
+    b = np.array(b)
+    c = np.array(c)
+
+    radians = np.arctan2(c[1]-b[1], c[0]-b[0]) - np.arctan2(a[1]-b[1], a[0]-b[0])
+    angle = np.abs(radians*180.0/np.pi)
+
+    if angle > 180.0:
+        angle = 360-angle
+    return angle
+
+def calculate_angles(a, b, c):
+    """Vectorized calculate_angle over (n, 2) arrays of points"""
+    radians = np.arctan2(c[:, 1]-b[:, 1], c[:, 0]-b[:, 0]) - np.arctan2(a[:, 1]-b[:, 1], a[:, 0]-b[:, 0])
+    angles = np.abs(radians*180.0/np.pi)
+    return np.where(angles > 180.0, 360-angles, angles)
+
+class ExerciseState:
+    """Rep counting state machine for one tracked person.
+
+    The last history_size angles are kept in a fixed-size ring buffer (a
+    deque with maxlen), so an update does a constant amount of work and
+    never grows or shifts a list. The window is summed oldest first, like
+    the batch counter in model.py, so both give identical smoothed angles.
+    __slots__ keeps each instance small when many people or streams are
+    tracked in one process.
+    """
+
+    __slots__ = ('stage', 'counter', 'last_rep_time', 'min_rep_duration', 'max_rep_duration',
+                 'down_threshold', 'up_threshold', 'rep_start_time', 'history_size',
+                 '_history', 'last_angle', 'angle_direction', 'start_time', 'last_spoken_time', 'speak_delay')
+
+    def __init__(self, history_size=3, down_threshold=90, up_threshold=130):
+        self.stage = None
+        self.counter = 0
+        self.last_rep_time = None
+        self.min_rep_duration = 0.2
+        self.max_rep_duration = 15.0
+        self.down_threshold = down_threshold
+        self.up_threshold = up_threshold
+        self.rep_start_time = 0
+        self.history_size = history_size
+        self._history = deque(maxlen=history_size)
+        self.last_angle = None
+        self.angle_direction = None
+        self.start_time = time.time()
+        self.last_spoken_time = 0
+        self.speak_delay = 0.5
+
+    def get_smoothed_angle(self, current_angle):
+        history = self._history
+        history.append(current_angle)
+        return sum(history) / len(history)
+
+    def update_rep(self, angle, current_time):
+        smoothed_angle = self.get_smoothed_angle(angle)
+
+        if self.last_angle is not None:
+            if smoothed_angle > self.last_angle + 2:
+                self.angle_direction = "up"
+            elif smoothed_angle < self.last_angle - 2:
+                self.angle_direction = "down"
+        self.last_angle = smoothed_angle
+
+        if self.stage is None:
+            if smoothed_angle < self.down_threshold and self.angle_direction == "down":
+                self.stage = "down"
+                self.rep_start_time = current_time
+        elif self.stage == "down":
+            if smoothed_angle > self.up_threshold and self.angle_direction == "up":
+                self.stage = "up"
+        elif self.stage == "up":
+            if smoothed_angle < self.down_threshold and self.angle_direction == "down":
+                rep_duration = current_time - self.rep_start_time
+                if ((self.last_rep_time is None or
+                     current_time - self.last_rep_time >= self.min_rep_duration) and
+                        rep_duration <= self.max_rep_duration):
+                    self.counter += 1
+                    self.last_rep_time = current_time
+                    return self.stage, self.counter, True
+                self.stage = "down"
+                self.rep_start_time = current_time
+
+        return self.stage, self.counter, False
@@ -0,0 +1,231 @@
+import time
+
+import numpy as np
+
+from exercise_state import ExerciseState, calculate_angle, calculate_angles
+
+# MediaPipe PoseLandmark indices, kept here so the server can validate
+# exercise names without importing mediapipe
+LANDMARKS = {
+    'LEFT_SHOULDER': 11, 'RIGHT_SHOULDER': 12,
+    'LEFT_ELBOW': 13, 'RIGHT_ELBOW': 14,
+    'LEFT_WRIST': 15, 'RIGHT_WRIST': 16,
+    'LEFT_HIP': 23, 'RIGHT_HIP': 24,
+    'LEFT_KNEE': 25, 'RIGHT_KNEE': 26,
+    'LEFT_ANKLE': 27, 'RIGHT_ANKLE': 28
+}
+
+# Exercise name that counts every registered exercise and reports the one being done
+AUTO = "auto"
+DEFAULT_EXERCISE = "squat"
+# Ankles further apart horizontally than this share of the torso length
+# count as a split (lunge) stance
+SPLIT_STANCE_RATIO = 0.5
+# Knee angle above which a leg counts as straight
+STRAIGHT_KNEE_ANGLE = 150
+# Hip, knee and ankle must be at least this visible for the legs' posture
+# to count; Pose extrapolates legs that are out of frame as straight
+LEG_MIN_VISIBILITY = 0.5
+# Share of the frames with a pose an exercise's posture must hold for
+# auto-detection to pick it over the default exercise
+AUTO_MIN_POSTURE_SHARE = 0.5
+
+def landmarks_to_array(pose_landmarks):
+    """Pack a Pose result into a (33, 4) float32 array of x, y, z, visibility"""
+    return np.array([(lm.x, lm.y, lm.z, lm.visibility) for lm in pose_landmarks.landmark],
+                    dtype=np.float32)
+
+def _joints(*names):
+    return tuple(LANDMARKS[name] for name in names)
+
+# Postures: per-frame bool masks over (n, 33, 4) landmark arrays
+
+def _torso(landmarks):
+    """Vector from the hips' midpoint to the shoulders' midpoint"""
+    shoulders = (landmarks[:, LANDMARKS['LEFT_SHOULDER'], :2] + landmarks[:, LANDMARKS['RIGHT_SHOULDER'], :2]) / 2
+    hips = (landmarks[:, LANDMARKS['LEFT_HIP'], :2] + landmarks[:, LANDMARKS['RIGHT_HIP'], :2]) / 2
+    return shoulders - hips
+
+def upright(landmarks):
+    torso = _torso(landmarks)
+    return np.abs(torso[:, 1]) > np.abs(torso[:, 0])
+
+def horizontal(landmarks):
+    torso = _torso(landmarks)
+    return np.abs(torso[:, 1]) <= np.abs(torso[:, 0])
+
+def legs_visible(landmarks):
+    joints = [LANDMARKS[f'{side}_{name}'] for side in ('LEFT', 'RIGHT') for name in ('HIP', 'KNEE', 'ANKLE')]
+    return np.all(landmarks[:, joints, 3] >= LEG_MIN_VISIBILITY, axis=1)
+
+def split_stance(landmarks):
+    stance = np.abs(landmarks[:, LANDMARKS['LEFT_ANKLE'], 0] - landmarks[:, LANDMARKS['RIGHT_ANKLE'], 0])
+    torso = _torso(landmarks)
+    return legs_visible(landmarks) & (stance > SPLIT_STANCE_RATIO * np.hypot(torso[:, 0], torso[:, 1]))
+
+def straight_legs(landmarks):
+    hip, knee, ankle = (landmarks[:, LANDMARKS[name], :2] for name in ('LEFT_HIP', 'LEFT_KNEE', 'LEFT_ANKLE'))
+    return legs_visible(landmarks) & (calculate_angles(hip, knee, ankle) > STRAIGHT_KNEE_ANGLE)
+
+def squat_posture(landmarks):
+    return upright(landmarks) & ~split_stance(landmarks)
+
+def lunge_posture(landmarks):
+    return upright(landmarks) & split_stance(landmarks)
+
+def standing_still(landmarks):
+    """Upright with straight legs, as for arm exercises"""
+    return upright(landmarks) & straight_legs(landmarks)
+
+class Exercise:
+    """A repetition exercise counted from one joint angle.
+
+    joints is the (a, b, c) landmark triple whose angle at b is tracked.
+    A rep runs from the angle falling below down_threshold, up past
+    up_threshold and back down again. direction "up" flips that for
+    movements that start by raising the angle (e.g. lateral raises): the
+    angle is negated and so are the thresholds, so the same ExerciseState
+    and batch counter serve every exercise.
+
+    posture, if given, maps (n, 33, 4) landmark arrays to a bool per frame
+    telling whether the body is positioned for this exercise. It only
+    matters for auto-detection, which counts each exercise over the frames
+    in its posture alone, so e.g. arms swinging forward during squats are
+    not taken for lateral raises.
+    """
+
+    def __init__(self, name, joints, down_threshold, up_threshold, direction="down", posture=None):
+        self.name = name
+        self.joints = joints
+        self.down_threshold = down_threshold
+        self.up_threshold = up_threshold
+        self.direction = direction
+        self.sign = 1 if direction == "down" else -1
+        self.posture = posture
+
+    def new_state(self, history_size=3):
+        if self.sign > 0:
+            return ExerciseState(history_size, self.down_threshold, self.up_threshold)
+        return ExerciseState(history_size, -self.up_threshold, -self.down_threshold)
+
+    def angle(self, landmarks):
+        """Signed joint angle of one (33, 4) landmark array"""
+        # tolist() gives the same Python floats the Pose result holds, so the
+        # angle is identical whether it comes from a live result or stored arrays
+        a, b, c = (landmarks[index, :2].tolist() for index in self.joints)
+        return self.sign * calculate_angle(a, b, c)
+
+    def angles(self, landmarks):
+        """Vectorized angle over (n, 33, 4) landmark arrays"""
+        # float64 copies of the float32 landmarks, as angle's tolist() gives
+        a, b, c = (landmarks[:, index, :2].astype(np.float64) for index in self.joints)
+        return self.sign * calculate_angles(a, b, c)
+
+    def posture_mask(self, landmarks):
+        """Frames of (n, 33, 4) landmarks in this exercise's posture"""
+        if self.posture is None:
+            return np.ones(len(landmarks), dtype=bool)
+        return self.posture(landmarks)
+
+# Registered exercises, in the order auto-detection breaks ties
+EXERCISES = {}
+
+def register_exercise(exercise):
+    EXERCISES[exercise.name] = exercise
+    return exercise
+
+def get_exercise(name):
+    """Registered exercise by name; raises ValueError for unknown names"""
+    try:
+        return EXERCISES[name]
+    except KeyError:
+        raise ValueError(f"Unknown exercise '{name}', expected one of: {', '.join(exercise_names())}")
+
+def exercise_names():
+    """Names accepted wherever an exercise is chosen, including auto"""
+    return list(EXERCISES) + [AUTO]
+
+def choose_exercise(reps, posture_shares=None):
+    """The exercise with the most reps, ties going to the first registered.
+
+    With posture_shares (the share of frames each exercise's posture held),
+    exercises whose posture held for less than AUTO_MIN_POSTURE_SHARE are
+    passed over for the default exercise, so stray arm reps counted in
+    the moments a squatter stands still don't win.
+    """
+    candidates = [name for name in reps if name == DEFAULT_EXERCISE or posture_shares is None or
+                  posture_shares.get(name, 1.0) >= AUTO_MIN_POSTURE_SHARE]
+    return max(candidates, key=lambda name: reps[name])
+
+register_exercise(Exercise("squat", _joints('LEFT_HIP', 'LEFT_KNEE', 'LEFT_ANKLE'), 90, 130,
+                           posture=squat_posture))
+register_exercise(Exercise("lunge", _joints('LEFT_HIP', 'LEFT_KNEE', 'LEFT_ANKLE'), 100, 150,
+                           posture=lunge_posture))
+register_exercise(Exercise("curl", _joints('LEFT_SHOULDER', 'LEFT_ELBOW', 'LEFT_WRIST'), 50, 150,
+                           posture=standing_still))
+register_exercise(Exercise("pushup", _joints('LEFT_SHOULDER', 'LEFT_ELBOW', 'LEFT_WRIST'), 90, 150,
+                           posture=horizontal))
+register_exercise(Exercise("lateral_raise", _joints('LEFT_HIP', 'LEFT_SHOULDER', 'LEFT_ELBOW'), 30, 80,
+                           direction="up", posture=standing_still))
+
+class ExerciseTracker:
+    """Frame-by-frame rep counting for one exercise, or for every
+    registered exercise at once with exercise=AUTO.
+
+    Every exercise is evaluated from the same landmarks, so tracking all
+    of them costs a few angle calculations per frame and no extra pose
+    inference. In auto mode each exercise only sees the frames in its
+    posture, and the reported exercise is re-chosen after each frame with
+    choose_exercise, as the batch counter does over a video.
+    """
+
+    def __init__(self, exercise=DEFAULT_EXERCISE, history_size=3):
+        names = list(EXERCISES) if exercise == AUTO else [get_exercise(exercise).name]
+        self.auto = exercise == AUTO
+        self.exercises = [EXERCISES[name] for name in names]
+        self.states = {name: EXERCISES[name].new_state(history_size) for name in names}
+        # Frames with a pose, and those in each exercise's posture (auto mode)
+        self.frames = 0
+        self.posture_frames = {name: 0 for name in names}
+        self.exercise = names[0]
+        self.start_time = time.time()
+        self.last_spoken_time = 0
+        self.speak_delay = 0.5
+
+    @property
+    def state(self):
+        """ExerciseState of the exercise being reported"""
+        return self.states[self.exercise]
+
+    @property
+    def counter(self):
+        return self.state.counter
+
+    def reps(self):
+        return {name: state.counter for name, state in self.states.items()}
+
+    def posture_shares(self):
+        """Share of the frames so far each exercise's posture held"""
+        return {name: count / self.frames if self.frames else 0.0 for name, count in self.posture_frames.items()}
+
+    def update(self, landmarks, timestamp):
+        """Feed one frame's (33, 4) landmarks; returns (stage, counter,
+        new_rep) of the reported exercise, like ExerciseState.update_rep"""
+        new_reps = set()
+        self.frames += 1
+        # Exercises sharing a posture check it once per frame
+        postures = {}
+        for exercise in self.exercises:
+            if self.auto and exercise.posture is not None:
+                if exercise.posture not in postures:
+                    postures[exercise.posture] = bool(exercise.posture(landmarks[np.newaxis])[0])
+                if not postures[exercise.posture]:
+                    continue
+            self.posture_frames[exercise.name] += 1
+            _, _, new_rep = self.states[exercise.name].update_rep(exercise.angle(landmarks), timestamp)
+            if new_rep:
+                new_reps.add(exercise.name)
+        if self.auto:
+            self.exercise = choose_exercise(self.reps(), self.posture_shares())
+        state = self.state
+        return state.stage, state.counter, self.exercise in new_reps
@@ -1,10 +1,14 @@
 let isRecording = false;
 let startTime;
 let pollingInterval;
+let liveEventSource = null;
+let liveSessionId = null;
+let isPaused = false;
 
 // DOM Elements
 const startButton = document.getElementById('startButton');
 const stopButton = document.getElementById('stopButton');
+const pauseButton = document.getElementById('pauseButton');
 const uploadForm = document.getElementById('uploadForm');
 const uploadProgress = document.getElementById('uploadProgress');
 const uploadProgressBar = document.getElementById('uploadProgressBar');
@@ -20,6 +24,10 @@ const progressBar = document.getElementById('progressBar');
 const progressText = document.getElementById('progressText');
 
 // Event Listeners
+// Size of each chunk sent to /uploads, and retries of a failed chunk
+const UPLOAD_CHUNK_SIZE = 4 * 1024 * 1024;
+const MAX_UPLOAD_RETRIES = 3;
+
 uploadForm.addEventListener('submit', handleVideoUpload);
 document.getElementById('videoFile').addEventListener('change', handleFileSelect);
 
@@ -48,24 +56,15 @@ async function handleVideoUpload(event) {
         return;
     }
 
-    const formData = new FormData();
-    formData.append('video', videoFile);
-
     try {
         uploadProgress.style.display = 'block';
         uploadProgressBar.style.width = '0%';
         uploadProgressText.textContent = '0%';
 
-        const response = await fetch('/analyze', {
-            method: 'POST',
-            body: formData
-        });
+        // Analysis starts on the server while the rest of the file uploads
+        const job = await uploadInChunks(videoFile);
 
-        const result = await response.json();
-
-        if (!response.ok) {
-            throw new Error(result.error || 'Failed to analyze video');
-        }
+        const result = await waitForAnalysisJob(job);
 
         if (result.success) {
             uploadProgressBar.style.width = '100%';
@@ -87,6 +86,87 @@ async function handleVideoUpload(event) {
     }
 }
 
+// Send a file to /uploads in chunks, resuming from the server's byte count
+// after a failed chunk; returns the analysis job once the last chunk is in
+async function uploadInChunks(file) {
+    const response = await fetch('/uploads', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ size: file.size, filename: file.name })
+    });
+    let upload = await response.json();
+    if (!response.ok) {
+        throw new Error(upload.error || 'Failed to start upload');
+    }
+
+    const uploadUrl = upload.upload_url;
+    let failures = 0;
+    while (!upload.complete) {
+        const offset = upload.received;
+        let chunkResponse = null;
+        try {
+            chunkResponse = await fetch(uploadUrl, {
+                method: 'PUT',
+                headers: { 'Upload-Offset': String(offset), 'Content-Type': 'application/octet-stream' },
+                body: file.slice(offset, offset + UPLOAD_CHUNK_SIZE)
+            });
+            upload = await chunkResponse.json();
+        } catch (error) {
+            chunkResponse = null; // Connection dropped mid-chunk
+        }
+
+        if (chunkResponse && chunkResponse.ok) {
+            failures = 0;
+        } else {
+            // 409: the server holds a different byte count than we sent from
+            if (chunkResponse && chunkResponse.status !== 409) {
+                throw new Error(upload.error || 'Upload failed');
+            }
+            if (++failures > MAX_UPLOAD_RETRIES) {
+                throw new Error('Upload failed, please try again');
+            }
+            await new Promise(resolve => setTimeout(resolve, 1000 * failures));
+            upload = await (await fetch(uploadUrl)).json();
+        }
+
+        const percentage = Math.floor(upload.received / Math.max(file.size, 1) * 100);
+        uploadProgressBar.style.width = percentage + '%';
+        uploadProgressText.textContent = `Uploading ${percentage}%`;
+    }
+
+    if (!upload.job_id) {
+        // The analysis queue was full when the last chunk arrived
+        const completeResponse = await fetch(uploadUrl + '/complete', { method: 'POST' });
+        upload = await completeResponse.json();
+        if (!completeResponse.ok) {
+            throw new Error(upload.error || 'Failed to analyze video');
+        }
+    }
+    return upload;
+}
+
+// Poll an analysis job until it finishes, then fetch its result
+async function waitForAnalysisJob(job) {
+    while (true) {
+        await new Promise(resolve => setTimeout(resolve, 1000));
+
+        const response = await fetch(job.status_url);
+        const status = await response.json();
+        if (!response.ok) {
+            throw new Error(status.error || 'Failed to get analysis status');
+        }
+
+        const percentage = Math.floor(status.progress * 100);
+        uploadProgressBar.style.width = percentage + '%';
+        uploadProgressText.textContent = `${percentage}%`;
+
+        if (status.status === 'completed' || status.status === 'failed') {
+            const resultResponse = await fetch(job.result_url);
+            return await resultResponse.json();
+        }
+    }
+}
+
 // Start Live Workout
 async function startCamera() {
     if (isRecording) {
@@ -108,14 +188,16 @@ async function startCamera() {
         if (result.success) {
             isRecording = true;
             startTime = Date.now();
+            liveSessionId = result.session_id;
             
             // Update UI
             startButton.style.display = 'none';
             stopButton.style.display = 'block';
+            pauseButton.style.display = 'block';
             liveWorkoutStats.style.display = 'flex'; // Show live stats
             
-            // Start polling for live stats
-            startPollingLiveStats();
+            // Stream live stats, falling back to polling
+            startLiveStats();
             
             showMessage(liveMessage, 'Workout started! Look for the camera window.', 'success');
         } else {
@@ -133,17 +215,21 @@ async function stopWorkout() {
     if (!isRecording) {
         return;
     }
+    pauseButton.style.display = 'none';
 
     try {
         // Stop polling for live stats
         stopPollingLiveStats();
 
-        const response = await fetch('/stop-workout');
+        const response = await fetch(`/stop-workout?session_id=${liveSessionId}`);
         if (!response.ok) {
             throw new Error('Failed to stop workout');
         }
 
-        const result = await response.json();
+        // Stopping returns right away; wait for the final summary
+        showMessage(liveMessage, 'Stopping workout...', 'success');
+        const stopping = await response.json();
+        const result = await waitForSummary(stopping.summary_url);
         if (result.success) {
             // Explicitly set progress bar to 100% on success
             progressBar.style.width = '100%';
@@ -165,13 +251,53 @@ async function stopWorkout() {
     }
 }
 
+// Wait for a stopped workout's summary, which the server holds back
+// until the worker has reported it
+async function waitForSummary(summaryUrl) {
+    while (true) {
+        const response = await fetch(`${summaryUrl}?timeout=30`);
+        const result = await response.json();
+        if (response.status !== 202) {
+            return result;
+        }
+    }
+}
+
+// Pause or resume the live workout
+async function togglePause() {
+    if (!isRecording) {
+        return;
+    }
+
+    try {
+        const endpoint = isPaused ? '/resume-workout' : '/pause-workout';
+        const response = await fetch(`${endpoint}?session_id=${liveSessionId}`);
+        const result = await response.json();
+        if (!result.success) {
+            throw new Error(result.error || 'Failed to pause workout');
+        }
+        setPaused(result.stats.paused);
+    } catch (error) {
+        console.error('Pause error:', error);
+        showMessage(liveMessage, error.message || 'Error pausing workout.', 'error');
+    }
+}
+
+function setPaused(paused) {
+    isPaused = paused;
+    pauseButton.innerHTML = paused ? '<i class="fas fa-play"></i> Resume' : '<i class="fas fa-pause"></i> Pause';
+}
+
 // Reset workout state
 function resetWorkout() {
     isRecording = false;
+    liveSessionId = null;
+    setPaused(false);
     stopPollingLiveStats(); // Ensure polling stops
 
     startButton.style.display = 'block';
     stopButton.style.display = 'none';
+    pauseButton.style.display = 'none';
     progressContainer.style.display = 'none';
     liveWorkoutStats.style.display = 'none'; // Hide live stats
     repCountElement.textContent = '0'; // Reset stats display
@@ -179,6 +305,39 @@ function resetWorkout() {
     durationCountElement.textContent = '0.0';
 }
 
+function showLiveStats(stats) {
+    repCountElement.textContent = stats.reps;
+    calorieCountElement.textContent = stats.calories.toFixed(1);
+    durationCountElement.textContent = stats.duration.toFixed(1);
+
+    // Update progress bar based on duration
+    let progressPercentage = Math.min(100, Math.floor(stats.duration));
+    progressBar.style.width = progressPercentage + '%';
+    progressText.textContent = `${progressPercentage}%`;
+}
+
+// Live stats pushed by the server as they change
+function startLiveStats() {
+    if (!window.EventSource) {
+        startPollingLiveStats();
+        return;
+    }
+
+    liveEventSource = new EventSource(`/live-stream?session_id=${liveSessionId}`);
+    const onStats = (event) => showLiveStats(JSON.parse(event.data));
+    liveEventSource.addEventListener('rep', onStats);
+    liveEventSource.addEventListener('stats', onStats);
+    liveEventSource.addEventListener('end', () => stopPollingLiveStats());
+    liveEventSource.onerror = () => {
+        // Stream unavailable (e.g. proxy or another server process): poll instead
+        console.error('Live stats stream error, falling back to polling');
+        stopPollingLiveStats();
+        if (isRecording) {
+            startPollingLiveStats();
+        }
+    };
+}
+
 // Polling for live stats
 function startPollingLiveStats() {
     // Clear any existing polling interval
@@ -192,20 +351,12 @@ function startPollingLiveStats() {
             return;
         }
         try {
-            const response = await fetch('/live-stats');
+            const response = await fetch(`/live-stats?session_id=${liveSessionId}`);
             if (!response.ok) {
                 throw new Error('Failed to fetch live stats');
             }
             const stats = await response.json();
-
-            repCountElement.textContent = stats.reps;
-            calorieCountElement.textContent = stats.calories.toFixed(1);
-            durationCountElement.textContent = stats.duration.toFixed(1);
-
-            // Update progress bar based on duration
-            let progressPercentage = Math.min(100, Math.floor(stats.duration)); 
-            progressBar.style.width = progressPercentage + '%';
-            progressText.textContent = `${progressPercentage}%`;
+            showLiveStats(stats);
 
         } catch (error) {
             console.error('Live stats polling error:', error);
@@ -215,6 +366,10 @@ function startPollingLiveStats() {
 }
 
 function stopPollingLiveStats() {
+    if (liveEventSource) {
+        liveEventSource.close();
+        liveEventSource = null;
+    }
     if (pollingInterval) {
         clearInterval(pollingInterval);
         pollingInterval = null;
@@ -0,0 +1,244 @@
+import argparse
+import csv
+import os
+import sqlite3
+import threading
+import logging
+from datetime import date, datetime, timedelta
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS workouts (
+    id INTEGER PRIMARY KEY,
+    timestamp TEXT NOT NULL,
+    reps INTEGER NOT NULL,
+    calories REAL NOT NULL,
+    duration REAL NOT NULL,
+    summary TEXT NOT NULL DEFAULT ''
+);
+CREATE INDEX IF NOT EXISTS workouts_timestamp ON workouts (timestamp);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS rollups (
+    period TEXT NOT NULL,
+    bucket TEXT NOT NULL,
+    workouts INTEGER NOT NULL,
+    reps INTEGER NOT NULL,
+    calories REAL NOT NULL,
+    duration REAL NOT NULL,
+    PRIMARY KEY (period, bucket)
+);
+CREATE TABLE IF NOT EXISTS personal_bests (
+    metric TEXT PRIMARY KEY,
+    value REAL NOT NULL,
+    timestamp TEXT NOT NULL
+);
+"""
+
+INSERT_WORKOUT = "INSERT INTO workouts (timestamp, reps, calories, duration, summary) VALUES (?, ?, ?, ?, ?)"
+
+UPSERT_ROLLUP = """
+INSERT INTO rollups (period, bucket, workouts, reps, calories, duration) VALUES (?, ?, 1, ?, ?, ?)
+ON CONFLICT (period, bucket) DO UPDATE SET
+    workouts = workouts + 1,
+    reps = reps + excluded.reps,
+    calories = calories + excluded.calories,
+    duration = duration + excluded.duration
+"""
+
+UPSERT_BEST = """
+INSERT INTO personal_bests (metric, value, timestamp) VALUES (?, ?, ?)
+ON CONFLICT (metric) DO UPDATE SET value = excluded.value, timestamp = excluded.timestamp
+WHERE excluded.value > personal_bests.value
+"""
+
+# Rollup periods and the bucket a workout's datetime falls into
+PERIODS = {
+    'day': lambda when: when.strftime("%Y-%m-%d"),
+    'week': lambda when: "%04d-W%02d" % when.isocalendar()[:2],
+    'month': lambda when: when.strftime("%Y-%m"),
+    'all': lambda when: "all"
+}
+
+# Per-workout metrics tracked as personal bests
+BEST_METRICS = ('reps', 'calories', 'duration')
+
+class HistoryStore:
+    """Workout history in SQLite, indexed by timestamp.
+
+    The database runs in WAL mode, so readers never block the writer and
+    several server processes can record workouts into the same file.
+    Timestamps are ISO 8601 strings, which sort in time order. Each thread
+    gets its own connection.
+    """
+
+    def __init__(self, db_path, busy_timeout=10.0):
+        self.db_path = db_path
+        self.busy_timeout = busy_timeout
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+        self._ensure_rollups()
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=self.busy_timeout)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _insert(self, conn, rows):
+        """Insert (timestamp, reps, calories, duration, summary) rows and fold
+        them into the rollups and personal bests, in the caller's transaction"""
+        conn.executemany(INSERT_WORKOUT, rows)
+        for timestamp, reps, calories, duration, _ in rows:
+            self._fold(conn, timestamp, reps, calories, duration)
+
+    def _fold(self, conn, timestamp, reps, calories, duration):
+        when = datetime.fromisoformat(timestamp)
+        for period, bucket in PERIODS.items():
+            conn.execute(UPSERT_ROLLUP, (period, bucket(when), reps, calories, duration))
+        for metric, value in zip(BEST_METRICS, (reps, calories, duration)):
+            conn.execute(UPSERT_BEST, (metric, value, timestamp))
+
+    def _ensure_rollups(self):
+        # Databases written before rollups existed are aggregated once
+        conn = self._connect()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            if conn.execute("SELECT 1 FROM meta WHERE key = 'rollups'").fetchone():
+                return
+            rows = conn.execute("SELECT timestamp, reps, calories, duration FROM workouts").fetchall()
+            conn.execute("DELETE FROM rollups")
+            conn.execute("DELETE FROM personal_bests")
+            for row in rows:
+                self._fold(conn, *row)
+            conn.execute("INSERT INTO meta (key, value) VALUES ('rollups', '1')")
+
+    def add(self, timestamp, reps, calories, duration, summary=""):
+        with self._connect() as conn:
+            self._insert(conn, [(timestamp, int(reps), float(calories), float(duration), summary)])
+
+    def query(self, limit=None, before=None, since=None, before_id=None):
+        """Workouts newest first, with timestamp in [since, before).
+
+        Pass the timestamp and id of the last workout of a page as before
+        and before_id to get the next page; the id breaks ties between
+        workouts saved with the same timestamp, which before alone would
+        skip.
+        """
+        sql = "SELECT id, timestamp, reps, calories, duration, summary FROM workouts"
+        conditions = []
+        params = []
+        if before is not None and before_id is not None:
+            conditions.append("(timestamp, id) < (?, ?)")
+            params.extend((before, before_id))
+        elif before is not None:
+            conditions.append("timestamp < ?")
+            params.append(before)
+        if since is not None:
+            conditions.append("timestamp >= ?")
+            params.append(since)
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += " ORDER BY timestamp DESC, id DESC"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        return [dict(row) for row in self._connect().execute(sql, params)]
+
+    def count(self):
+        return self._connect().execute("SELECT COUNT(*) FROM workouts").fetchone()[0]
+
+    def rollups(self, period, limit=None):
+        """Totals per day, week or month, most recent bucket first"""
+        sql = ("SELECT bucket, workouts, reps, ROUND(calories, 1) AS calories, "
+               "ROUND(duration, 1) AS duration FROM rollups "
+               "WHERE period = ? ORDER BY bucket DESC")
+        params = [period]
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        return [dict(row) for row in self._connect().execute(sql, params)]
+
+    def totals(self):
+        row = self._connect().execute(
+            "SELECT workouts, reps, ROUND(calories, 1) AS calories, ROUND(duration, 1) AS duration "
+            "FROM rollups WHERE period = 'all'").fetchone()
+        return dict(row) if row else {'workouts': 0, 'reps': 0, 'calories': 0.0, 'duration': 0.0}
+
+    def personal_bests(self):
+        # Reps are whole numbers; the table stores every metric as REAL
+        return {row['metric']: {'value': int(row['value']) if row['metric'] == 'reps' else row['value'],
+                                'timestamp': row['timestamp']}
+                for row in self._connect().execute("SELECT metric, value, timestamp FROM personal_bests")}
+
+    def streaks(self, today=None):
+        """Current and longest runs of consecutive days with a workout.
+
+        The current streak is still alive if the last workout was yesterday.
+        Reads only the daily rollups, one row per active day.
+        """
+        today = today or date.today()
+        days = [date.fromisoformat(row['bucket']) for row in self._connect().execute(
+            "SELECT bucket FROM rollups WHERE period = 'day' ORDER BY bucket")]
+        longest = run = 0
+        previous = None
+        for day in days:
+            run = run + 1 if previous is not None and day - previous == timedelta(days=1) else 1
+            longest = max(longest, run)
+            previous = day
+        current = run if previous is not None and today - previous <= timedelta(days=1) else 0
+        return {'current': current, 'longest': longest}
+
+    def import_csv(self, csv_path):
+        """Copy the rows of a legacy history.csv into the store, once.
+
+        The import is recorded in the database, so calling this again for
+        the same file does nothing. Returns the number of imported rows.
+        """
+        marker = f"imported:{os.path.abspath(csv_path)}"
+        if not os.path.exists(csv_path):
+            return 0
+        conn = self._connect()
+        if conn.execute("SELECT 1 FROM meta WHERE key = ?", (marker,)).fetchone():
+            return 0
+
+        rows = []
+        with open(csv_path, "r", newline='') as csvfile:
+            for row in csv.reader(csvfile):
+                if len(row) < 5 or row[0] == 'timestamp':
+                    continue
+                try:
+                    # Parsed here so a bad timestamp skips its row instead
+                    # of failing the whole import when it is folded in
+                    datetime.fromisoformat(row[0])
+                    rows.append((row[0], int(row[1]), float(row[2]), float(row[3]), row[4]))
+                except ValueError:
+                    logger.warning(f"Skipping malformed history row: {row[:4]}")
+
+        with conn:
+            # Re-check inside the write transaction in case another process
+            # imported the file meanwhile
+            conn.execute("BEGIN IMMEDIATE")
+            if conn.execute("SELECT 1 FROM meta WHERE key = ?", (marker,)).fetchone():
+                return 0
+            self._insert(conn, rows)
+            conn.execute("INSERT INTO meta (key, value) VALUES (?, ?)", (marker, str(len(rows))))
+        logger.info(f"Imported {len(rows)} workouts from {csv_path}")
+        return len(rows)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Import a history.csv file into the workout history database.')
+    parser.add_argument('csv_path', help='Legacy history.csv file.')
+    parser.add_argument('--db', default='history.db', help='History database file.')
+    args = parser.parse_args()
+
+    store = HistoryStore(args.db)
+    print(f"Imported {store.import_csv(args.csv_path)} workouts, {store.count()} in {args.db}")
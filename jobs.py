@@ -0,0 +1,213 @@
+import concurrent.futures
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+import logging
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+# Name of the status/result file kept in each job directory
+JOB_FILE = "job.json"
+
+class QueueFullError(Exception):
+    """Raised when the analysis queue has no room for another job"""
+    pass
+
+def is_valid_id(job_id):
+    try:
+        return str(uuid.UUID(job_id)) == job_id
+    except (ValueError, TypeError):
+        return False
+
+class Job:
+    def __init__(self, video_path, job_id=None):
+        self.id = job_id or str(uuid.uuid4())
+        self.video_path = video_path
+        self.status = "queued"  # queued -> running -> completed | failed
+        self.frames_processed = 0
+        self.total_frames = 0
+        self.result = None
+        self.error = None
+        self.created_at = datetime.now().isoformat()
+        self.finished_at = None
+        self.finished_monotonic = None
+
+    @property
+    def done(self):
+        return self.status in ("completed", "failed")
+
+    def to_dict(self):
+        progress = 0.0
+        if self.status == "completed":
+            progress = 1.0
+        elif self.total_frames > 0:
+            progress = min(1.0, self.frames_processed / self.total_frames)
+        return {
+            'job_id': self.id,
+            'status': self.status,
+            'frames_processed': self.frames_processed,
+            'total_frames': self.total_frames,
+            'progress': round(progress, 3),
+            'created_at': self.created_at,
+            'finished_at': self.finished_at,
+            'error': self.error
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        job = cls(None, data['job_id'])
+        job.status = data['status']
+        job.frames_processed = data['frames_processed']
+        job.total_frames = data['total_frames']
+        job.created_at = data['created_at']
+        job.finished_at = data['finished_at']
+        job.error = data['error']
+        job.result = data.get('result')
+        return job
+
+class JobQueue:
+    """Bounded queue of video analysis jobs running on an AnalysisPool.
+
+    At most max_pending jobs may be queued or running at once; submit raises
+    QueueFullError beyond that so callers can apply backpressure. Finished
+    jobs are kept for job_ttl seconds so clients can fetch their results.
+
+    Every job owns a directory under jobs_folder holding its upload and a
+    job.json status file, so concurrent jobs never share files and any
+    server process can answer for a job started by another one.
+    """
+
+    def __init__(self, max_pending, jobs_folder, on_complete=None, job_ttl=3600):
+        self.max_pending = max_pending
+        self.jobs_folder = jobs_folder
+        self.on_complete = on_complete
+        self.job_ttl = job_ttl
+        self.pool = None
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def attach_pool(self, pool):
+        self.pool = pool
+        pool.on_progress = self.update_progress
+
+    def job_dir(self, job_id):
+        return os.path.join(self.jobs_folder, job_id)
+
+    def create_job_dir(self):
+        """Reserve a new job id and its private directory"""
+        job_id = str(uuid.uuid4())
+        job_dir = self.job_dir(job_id)
+        os.makedirs(job_dir)
+        return job_id, job_dir
+
+    def _pending_count(self):
+        return sum(1 for job in self._jobs.values() if not job.done)
+
+    def _prune(self):
+        cutoff = time.monotonic() - self.job_ttl
+        expired = [job_id for job_id, job in self._jobs.items()
+                   if job.done and job.finished_monotonic < cutoff]
+        for job_id in expired:
+            del self._jobs[job_id]
+            shutil.rmtree(self.job_dir(job_id), ignore_errors=True)
+
+    def _persist(self, job):
+        # Write to a temp file and rename so readers never see a partial file
+        data = dict(job.to_dict(), result=job.result)
+        path = os.path.join(self.job_dir(job.id), JOB_FILE)
+        tmp_path = f"{path}.tmp"
+        try:
+            with open(tmp_path, "w") as f:
+                json.dump(data, f)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            logger.error(f"Error saving job {job.id}: {e}")
+
+    def has_capacity(self):
+        with self._lock:
+            return self._pending_count() < self.max_pending
+
+    def submit(self, video_path, job_id, upload=None, options=None, on_done=None):
+        """Queue a job on the pool; on_done(job) is called once it has
+        completed or failed and its result is stored"""
+        with self._lock:
+            self._prune()
+            if self._pending_count() >= self.max_pending:
+                raise QueueFullError(f"Analysis queue is full ({self.max_pending} jobs pending)")
+            job = Job(video_path, job_id)
+            self._jobs[job.id] = job
+        self._persist(job)
+
+        try:
+            future = self.pool.submit(video_path, job.id, upload, options)
+        except Exception as e:
+            # Fail the job instead of leaving it pending, holding a queue slot
+            future = concurrent.futures.Future()
+            future.set_exception(e)
+        future.add_done_callback(lambda f: self._finish(job, f, on_done))
+        logger.info(f"Queued analysis job {job.id} for {video_path}")
+        return job
+
+    def get(self, job_id):
+        if not is_valid_id(job_id):
+            return None
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is not None:
+            return job
+
+        # The job may belong to another server process
+        path = os.path.join(self.job_dir(job_id), JOB_FILE)
+        try:
+            with open(path, "r") as f:
+                return Job.from_dict(json.load(f))
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def update_progress(self, job_id, processed, total):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.done:
+                return
+            started = job.status == "queued"
+            job.status = "running"
+            job.frames_processed = processed
+            job.total_frames = total
+        if started:
+            self._persist(job)
+
+    def _finish(self, job, future, on_done=None):
+        try:
+            result = future.result()
+            error = None
+        except Exception as e:
+            result = None
+            error = str(e)
+            logger.error(f"Analysis job {job.id} failed: {error}")
+
+        if result is not None and self.on_complete:
+            try:
+                result = self.on_complete(job, result)
+            except Exception as e:
+                logger.error(f"Error completing analysis job {job.id}: {e}")
+
+        with self._lock:
+            job.result = result
+            job.error = error
+            job.status = "completed" if error is None else "failed"
+            job.finished_at = datetime.now().isoformat()
+            job.finished_monotonic = time.monotonic()
+        self._persist(job)
+
+        # The upload is no longer needed once its result is stored
+        try:
+            os.remove(job.video_path)
+        except OSError as e:
+            logger.error(f"Error removing analyzed video {job.video_path}: {e}")
+        logger.info(f"Analysis job {job.id} {job.status}")
+        if on_done is not None:
+            on_done(job)
@@ -0,0 +1,105 @@
+import hashlib
+import json
+import os
+import uuid
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Bump when the stored arrays change meaning, so old entries are never reused
+CACHE_VERSION = 1
+
+def hash_file(path, chunk_size=1024 * 1024):
+    """SHA-256 of a file's contents"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+class LandmarkCache:
+    """On-disk cache of per-frame pose landmarks, keyed by video content.
+
+    Entries hold the (frame_indices, timestamps, landmarks) arrays produced by
+    model.extract_landmarks, stored as .npz files (landmarks as float32).
+    The key covers the video bytes and every setting that affects inference,
+    so re-uploads and re-analyses with different rep thresholds skip
+    pose.process entirely. The least recently used entries are deleted once
+    the cache grows past max_bytes. Several processes may share a cache
+    directory: entries are written to a temp file and renamed into place.
+    """
+
+    def __init__(self, cache_dir, max_bytes):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def make_key(self, video_path, settings):
+        settings_json = json.dumps(dict(settings, cache_version=CACHE_VERSION), sort_keys=True)
+        settings_hash = hashlib.sha256(settings_json.encode()).hexdigest()[:16]
+        return f"{hash_file(video_path)}-{settings_hash}"
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.npz")
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with np.load(path) as data:
+                entry = (data['frame_indices'], data['timestamps'], data['landmarks'])
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.error(f"Discarding unreadable landmark cache entry {path}: {e}")
+            self._remove(path)
+            return None
+
+        # Mark as recently used for LRU eviction
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return entry
+
+    def put(self, key, frame_indices, timestamps, landmarks):
+        path = self._path(key)
+        tmp_path = os.path.join(self.cache_dir, f".{uuid.uuid4().hex}.tmp.npz")
+        try:
+            np.savez(tmp_path,
+                     frame_indices=np.asarray(frame_indices, dtype=np.int32),
+                     timestamps=np.asarray(timestamps, dtype=np.float64),
+                     landmarks=np.asarray(landmarks, dtype=np.float32))
+            os.replace(tmp_path, path)
+        except Exception as e:
+            logger.error(f"Error writing landmark cache entry {path}: {e}")
+            self._remove(tmp_path)
+            return
+        self.evict()
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def evict(self):
+        """Delete least recently used entries until the cache fits in max_bytes"""
+        entries = []
+        total = 0
+        for entry in os.scandir(self.cache_dir):
+            if not entry.name.endswith(".npz") or entry.name.startswith("."):
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+            total += stat.st_size
+
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            self._remove(path)
+            total -= size
@@ -0,0 +1,228 @@
+from collections import OrderedDict, deque
+from multiprocessing.connection import Client, Listener
+import os
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Environment variable carrying the channel's auth key to the live worker
+AUTHKEY_ENV = "LIVE_AUTHKEY"
+# Rep events kept for stream clients that fall behind
+MAX_REP_EVENTS = 100
+# Final summaries of stopped sessions kept for GET /sessions/<id>/summary
+MAX_SUMMARIES = 100
+
+# Worker side: several pipeline threads send events over one connection
+_send_lock = threading.Lock()
+
+def connect(port, authkey=None):
+    """Worker side: connect to the server's channel on localhost, with the
+    auth key from our environment unless another one is given"""
+    return Client(('127.0.0.1', port), authkey=authkey or bytes.fromhex(os.environ[AUTHKEY_ENV]))
+
+def poll_command(conn):
+    """Worker side: return the next command from the server, or None without blocking"""
+    if conn is None:
+        return None
+    try:
+        if conn.poll():
+            return conn.recv().get('command')
+    except (OSError, EOFError):
+        pass
+    return None
+
+def send_event(conn, event_type, **fields):
+    """Worker side: send an event, ignoring a server that has gone away"""
+    if conn is None:
+        return
+    try:
+        with _send_lock:
+            conn.send(dict(fields, type=event_type))
+    except (OSError, EOFError) as e:
+        logger.error(f"Error sending {event_type} event to server: {e}")
+
+class LiveSession:
+    """Server side of the channel to one model_live.py worker.
+
+    The worker connects to a localhost listener (authenticated with a random
+    key passed in its environment) and sends "rep" events as soon as a rep
+    is counted, coalesced "stats" events a few times per second and a
+    "finished" event with its final stats. A reader thread keeps the latest
+    stats and recent rep events; stream clients wait on a condition for
+    anything newer than the last sequence number they saw.
+
+    The same connection carries commands to the worker ("stop", "pause",
+    "resume", "stats"), which it checks once per frame.
+    """
+
+    def __init__(self, session_id):
+        self.session_id = session_id
+        self.authkey = os.urandom(16)
+        self._listener = Listener(('127.0.0.1', 0), authkey=self.authkey)
+        self.port = self._listener.address[1]
+        self._conn = None
+        self._condition = threading.Condition()
+        self._seq = 0
+        self._stats = {'exercise': None, 'people': [], 'reps': 0, 'calories': 0.0, 'duration': 0.0, 'paused': False}
+        self._stats_seq = 0
+        self._rep_events = deque(maxlen=MAX_REP_EVENTS)
+        self._send_lock = threading.Lock()
+        # Final stats sent by the worker when its loop ends
+        self.finished = None
+        # Latest per-stage FPS and queue depths of the worker's pipeline
+        self.metrics = {}
+        # Seconds from creating the session to the worker's first processed
+        # frame, i.e. what the user waits before reps can be counted
+        self.created_at = time.perf_counter()
+        self.startup_seconds = None
+        self.closed = False
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def worker_env(self):
+        return dict(os.environ, **{AUTHKEY_ENV: self.authkey.hex()})
+
+    def _run(self):
+        try:
+            self._conn = self._listener.accept()
+            while True:
+                self._handle(self._conn.recv())
+        except (OSError, EOFError):
+            pass
+        except Exception as e:
+            logger.error(f"Error reading live session {self.session_id} events: {e}")
+        finally:
+            with self._condition:
+                self.closed = True
+                self._condition.notify_all()
+
+    def _handle(self, event):
+        if event.get('type') == 'metrics':
+            self.metrics = event.get('pipeline', {})
+            return
+        stats = {key: event[key] for key in self._stats if key in event}
+        if self.startup_seconds is None and event.get('type') in ('stats', 'rep'):
+            self.startup_seconds = round(time.perf_counter() - self.created_at, 3)
+            logger.info(f"Live session {self.session_id} processed its first frame after {self.startup_seconds}s")
+        with self._condition:
+            self._seq += 1
+            self._stats.update(stats)
+            if event.get('type') == 'rep':
+                self._rep_events.append((self._seq, dict(stats, time=time.time())))
+            else:
+                # A rep event already carries the stats it changed
+                self._stats_seq = self._seq
+            if event.get('type') == 'finished':
+                self.finished = dict(event)
+            self._condition.notify_all()
+
+    def latest_stats(self):
+        with self._condition:
+            return dict(self._stats)
+
+    def has_stats(self):
+        """Whether the worker has pushed any stats yet"""
+        with self._condition:
+            return self._stats_seq > 0
+
+    def wait_for_update(self, after_seq, timeout=None):
+        """Block until there is news after after_seq, the session closes or
+        timeout passes. Returns (seq, rep_events, stats or None, closed);
+        stats is only the latest snapshot, however many were received."""
+        with self._condition:
+            self._condition.wait_for(lambda: self._seq > after_seq or self.closed, timeout)
+            rep_events = [event for seq, event in self._rep_events if seq > after_seq]
+            stats = dict(self._stats) if self._stats_seq > after_seq else None
+            return self._seq, rep_events, stats, self.closed
+
+    def send_command(self, command):
+        """Send a command to the worker; False if it is not connected"""
+        with self._condition:
+            conn = None if self.closed else self._conn
+        if conn is None:
+            return False
+        try:
+            with self._send_lock:
+                conn.send({'command': command})
+            return True
+        except (OSError, EOFError) as e:
+            logger.error(f"Error sending {command} to live session {self.session_id}: {e}")
+            return False
+
+    def request_stats(self, timeout=1.0):
+        """Ask the worker for its current stats; falls back to the latest
+        received stats if it does not answer within timeout"""
+        with self._condition:
+            stats_seq = self._stats_seq
+        if self.send_command('stats'):
+            with self._condition:
+                self._condition.wait_for(lambda: self._stats_seq > stats_seq or self.closed, timeout)
+        return self.latest_stats()
+
+    def wait_for_stats(self, predicate, timeout=None):
+        """Block until predicate(stats) holds, e.g. the worker reports that
+        it paused; returns the latest stats either way"""
+        with self._condition:
+            self._condition.wait_for(lambda: predicate(self._stats) or self.closed, timeout)
+            return dict(self._stats)
+
+    def wait_finished(self, timeout=None):
+        """Block until the worker reports its final stats; None on timeout
+        or if the worker went away without reporting"""
+        with self._condition:
+            self._condition.wait_for(lambda: self.finished is not None or self.closed, timeout)
+            return self.finished
+
+    def close(self):
+        if self._conn is None:
+            # Wake the reader thread if the worker never connected
+            try:
+                Client(('127.0.0.1', self.port), authkey=self.authkey).close()
+            except (OSError, EOFError):
+                pass
+        for resource in (self._conn, self._listener):
+            if resource is not None:
+                try:
+                    resource.close()
+                except OSError:
+                    pass
+
+class SessionSummaries:
+    """Final summaries of stopped live sessions, for clients to wait on.
+
+    A session is added as pending when it is asked to stop and its summary
+    is published once the worker has reported it; waiters block on a
+    condition until then. Only the most recent max_sessions are kept.
+    """
+
+    def __init__(self, max_sessions=MAX_SUMMARIES):
+        self.max_sessions = max_sessions
+        self._summaries = OrderedDict()
+        self._condition = threading.Condition()
+
+    def add(self, session_id):
+        """Mark session_id as stopping; False if it already is or has stopped"""
+        with self._condition:
+            if session_id in self._summaries:
+                return False
+            self._summaries[session_id] = None
+            while len(self._summaries) > self.max_sessions:
+                self._summaries.popitem(last=False)
+            return True
+
+    def publish(self, session_id, summary):
+        with self._condition:
+            self._summaries[session_id] = summary
+            self._condition.notify_all()
+
+    def __contains__(self, session_id):
+        with self._condition:
+            return session_id in self._summaries
+
+    def wait(self, session_id, timeout=None):
+        """Block until session_id's summary is published; None if it is
+        still pending after timeout or the session is unknown"""
+        with self._condition:
+            self._condition.wait_for(lambda: self._summaries.get(session_id, False) is not None, timeout)
+            return self._summaries.get(session_id)
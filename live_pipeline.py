@@ -0,0 +1,76 @@
+from collections import deque
+import threading
+import time
+
+class DropOldestQueue:
+    """Bounded queue whose put never blocks: when full, the oldest item is
+    dropped, so consumers always work on the freshest data."""
+
+    def __init__(self, maxsize):
+        self._items = deque(maxlen=maxsize)
+        self._condition = threading.Condition()
+        self.dropped = 0
+
+    def put(self, item):
+        with self._condition:
+            if len(self._items) == self._items.maxlen:
+                self.dropped += 1
+            self._items.append(item)
+            self._condition.notify()
+
+    def get(self, timeout=None):
+        """Oldest queued item, or None if nothing arrives within timeout"""
+        with self._condition:
+            if not self._condition.wait_for(lambda: self._items, timeout):
+                return None
+            return self._items.popleft()
+
+    def qsize(self):
+        with self._condition:
+            return len(self._items)
+
+class StageMetrics:
+    """Frames handled by one pipeline stage, reported as frames per second
+    over the interval since the previous snapshot.
+
+    Time a stage spends blocked on its source (e.g. a camera read) is
+    recorded as wait rather than busy time, so a stage waiting on a
+    slow source doesn't look like the bottleneck.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self._lock = threading.Lock()
+        self._count = 0
+        self._busy = 0.0
+        self._wait = 0.0
+        self._since = time.perf_counter()
+
+    def record(self, busy_seconds, wait_seconds=0.0):
+        """Count one frame that kept the stage busy for busy_seconds, after
+        waiting wait_seconds for it"""
+        with self._lock:
+            self._count += 1
+            self._busy += busy_seconds
+            self._wait += wait_seconds
+
+    def snapshot(self):
+        now = time.perf_counter()
+        with self._lock:
+            elapsed = now - self._since
+            count, busy, wait = self._count, self._busy, self._wait
+            self._count, self._busy, self._wait, self._since = 0, 0.0, 0.0, now
+        return {
+            'fps': round(count / elapsed, 1) if elapsed > 0 else 0.0,
+            # Share of the interval spent working; near 1.0 marks the bottleneck
+            'utilization': round(min(1.0, busy / elapsed), 2) if elapsed > 0 else 0.0,
+            # Share of the interval spent waiting for the source
+            'wait': round(min(1.0, wait / elapsed), 2) if elapsed > 0 else 0.0
+        }
+
+def pipeline_metrics(stages, queues):
+    """Per-stage FPS/utilization and per-queue depth/drop counts"""
+    metrics = {stage.name: stage.snapshot() for stage in stages}
+    for name, queue in queues.items():
+        metrics[f"{name}_queue"] = {'depth': queue.qsize(), 'dropped': queue.dropped}
+    return metrics
@@ -0,0 +1,162 @@
+from multiprocessing.connection import Client, Listener
+import os
+import subprocess
+import sys
+import threading
+import time
+import logging
+
+from live_channel import AUTHKEY_ENV
+
+logger = logging.getLogger(__name__)
+
+# Seconds to wait before starting a new worker after one exited unexpectedly
+RESTART_DELAY = 5.0
+
+class LiveWorker:
+    """Server side of a long-lived model_live.py --serve process.
+
+    The worker imports cv2 and mediapipe, builds and warms up its pose
+    graph and opens the camera once, when the server starts, then reports
+    "ready" over an authenticated localhost connection. start_session
+    hands it a LiveSession to run: the worker connects to that session's
+    own channel, so stats, rep events and stop/pause commands work as for
+    a worker started per session, and reports "session_ended" once the
+    session is cleaned up. A worker that exits unexpectedly is restarted.
+    """
+
+    def __init__(self, worker_args):
+        # Command line of the worker, without --control_port
+        self.worker_args = worker_args
+        self.process = None
+        self._conn = None
+        self._condition = threading.Condition()
+        self._stopping = False
+        self.ready = False
+        # Session the worker is running, if any
+        self.session_id = None
+        # Start-up timings reported by the worker, plus the time from launch to ready
+        self.startup = {}
+        self.restarts = 0
+
+    def start(self):
+        """Launch the worker; it becomes ready in the background"""
+        authkey = os.urandom(16)
+        listener = Listener(('127.0.0.1', 0), authkey=authkey)
+        launched = time.perf_counter()
+        self.process = subprocess.Popen(
+            self.worker_args + ['--control_port', str(listener.address[1])],
+            env=dict(os.environ, **{AUTHKEY_ENV: authkey.hex()}),
+            stdout=sys.stdout, stderr=sys.stderr)
+        threading.Thread(target=self._run, args=(listener, self.process, launched), daemon=True).start()
+        threading.Thread(target=self._watch, args=(listener, authkey, self.process), daemon=True).start()
+        logger.info(f"Live worker started (pid {self.process.pid})")
+
+    def _run(self, listener, process, launched):
+        try:
+            conn = listener.accept()
+            with self._condition:
+                if process.poll() is not None:
+                    # Woken up by _watch: the worker died before connecting
+                    conn.close()
+                    return
+                self._conn = conn
+            while True:
+                event = conn.recv()
+                with self._condition:
+                    if event.get('type') == 'ready':
+                        self.ready = True
+                        self.startup = dict(event.get('startup', {}),
+                                            launch_to_ready_seconds=round(time.perf_counter() - launched, 3))
+                        logger.info(f"Live worker ready: {self.startup}")
+                    elif event.get('type') == 'session_ended':
+                        self.session_id = None
+                    self._condition.notify_all()
+        except (OSError, EOFError):
+            pass
+        except Exception as e:
+            logger.error(f"Error reading live worker events: {e}")
+
+    def _watch(self, listener, authkey, process):
+        process.wait()
+        with self._condition:
+            conn = self._conn
+            self._conn = None
+        if conn is not None:
+            conn.close()
+        else:
+            # Wake _run if the worker died before connecting
+            try:
+                Client(listener.address, authkey=authkey).close()
+            except (OSError, EOFError):
+                pass
+        listener.close()
+        with self._condition:
+            self.ready = False
+            self.session_id = None
+            self._condition.notify_all()
+            if self._stopping:
+                return
+        logger.error(f"Live worker exited with code {process.returncode}, restarting in {RESTART_DELAY}s")
+        time.sleep(RESTART_DELAY)
+        with self._condition:
+            if self._stopping:
+                return
+            self.restarts += 1
+        self.start()
+
+    @property
+    def busy(self):
+        return self.session_id is not None
+
+    def wait_idle(self, timeout=None):
+        """Block until the worker is ready and not running a session;
+        returns whether it is"""
+        with self._condition:
+            return self._condition.wait_for(lambda: self.ready and self.session_id is None, timeout)
+
+    def start_session(self, live_session, session_dir, exercise):
+        """Run a session on the warm worker; False if it is not ready or busy"""
+        with self._condition:
+            if not self.ready or self.session_id is not None or self._conn is None:
+                return False
+            try:
+                self._conn.send({'command': 'start', 'session_id': live_session.session_id,
+                                 'port': live_session.port, 'authkey': live_session.authkey.hex(),
+                                 'session_dir': session_dir, 'exercise': exercise})
+            except (OSError, EOFError) as e:
+                logger.error(f"Error starting session on live worker: {e}")
+                return False
+            self.session_id = live_session.session_id
+            return True
+
+    def running(self, session_id):
+        """Whether the worker is running session_id"""
+        with self._condition:
+            return self.session_id == session_id
+
+    def status(self):
+        with self._condition:
+            return {
+                'running': self.process is not None and self.process.poll() is None,
+                'ready': self.ready,
+                'session_id': self.session_id,
+                'restarts': self.restarts,
+                'startup': dict(self.startup)
+            }
+
+    def stop(self, timeout=5):
+        with self._condition:
+            self._stopping = True
+            conn = self._conn
+        if conn is not None:
+            try:
+                conn.send({'command': 'shutdown'})
+            except (OSError, EOFError):
+                pass
+        if self.process is not None:
+            try:
+                self.process.wait(timeout=timeout)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+                self.process.wait()
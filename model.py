@@ -8,10 +8,18 @@ import numpy as np
 import pyttsx3
 import threading
 import queue
+from collections import deque
+from landmark_cache import LandmarkCache
+from exercises import (AUTO, DEFAULT_EXERCISE, EXERCISES, ExerciseTracker, choose_exercise,
+                       exercise_names, get_exercise, landmarks_to_array)
+from multi_person import DEFAULT_POSE_MODEL, PeopleDetector, PeopleTracker, draw_person
+from roi import RoiTracker
+from workout_result import WorkoutResult
 
 # Initialize text-to-speech engine for model.py
 engine = None
 speaker_queue = queue.Queue()
+speaker_thread = None
 
 def speaker_thread_function():
     global engine
@@ -36,27 +44,36 @@ def speaker_thread_function():
                 print(f"Voice feedback error in model.py speaker thread: {e}")
         speaker_queue.task_done()
 
-speaker_thread = threading.Thread(target=speaker_thread_function, daemon=True)
-speaker_thread.start()
-
 def speak(text):
+    # Start the speaker thread on first use so that importing this module
+    # (e.g. from the analysis worker pool) does not initialize pyttsx3.
+    global speaker_thread
+    if speaker_thread is None:
+        speaker_thread = threading.Thread(target=speaker_thread_function, daemon=True)
+        speaker_thread.start()
     speaker_queue.put(text)
 
 mp_drawing = mp.solutions.drawing_utils
 mp_pose = mp.solutions.pose
 
-def calculate_angle(a, b, c):
-    """Calculate the angle between three points"""
-    a = np.array(a)
-    b = np.array(b)
-    c = np.array(c)
-    
-    radians = np.arctan2(c[1]-b[1], c[0]-b[0]) - np.arctan2(a[1]-b[1], a[0]-b[0])
-    angle = np.abs(radians*180.0/np.pi)
-    
-    if angle > 180.0:
-        angle = 360-angle
-    return angle
+# Report analysis progress every this many frames
+PROGRESS_INTERVAL = 15
+# Frame size (width, height) fed to pose inference
+DEFAULT_INFERENCE_SIZE = (640, 480)
+# Disk budget of a landmark cache opened from the command line
+DEFAULT_CACHE_BYTES = 500 * 1024 * 1024
+# Pose graph settings for video analysis
+POSE_SETTINGS = {
+    'min_detection_confidence': 0.5,
+    'min_tracking_confidence': 0.5,
+    'model_complexity': 1,
+    'static_image_mode': False
+}
+# Frames decoded past the end of a partial upload before the earlier ones
+# are trusted; the newest frames may come from a half-written packet
+PREFIX_HOLDBACK_FRAMES = 8
+# Number of landmarks in a Pose result
+NUM_LANDMARKS = 33
 
 def calculate_calories(reps, duration_seconds):
     # This is a very rough estimation. Real calorie calculation is complex.
@@ -65,187 +82,699 @@ def calculate_calories(reps, duration_seconds):
     total_calories = (reps * calories_per_rep) + (duration_seconds * base_metabolic_rate_per_sec)
     return total_calories
 
-# Corrected ExerciseState class (from model_live.py)
-class ExerciseState:
-    def __init__(self):
-        self.stage = None
-        self.counter = 0
-        self.last_rep_time = 0
-        self.min_rep_duration = 0.2
-        self.rep_angles = []
-        self.is_valid_rep = False
-        self.consecutive_valid_frames = 0
-        self.required_valid_frames = 1
-        self.last_valid_angle = None
-        self.angle_threshold = 5
-        self.down_threshold = 90   
-        self.up_threshold = 130    
-        self.rep_start_time = 0
-        self.max_rep_duration = 15.0
-        self.angle_history = []
-        self.history_size = 3
-        self.last_angle = None
-        self.angle_direction = None  
-        self.start_time = time.time()
-        self.last_spoken_time = 0 
-        self.speak_delay = 0.5 
-
-    def get_smoothed_angle(self, current_angle):
-        self.angle_history.append(current_angle)
-        if len(self.angle_history) > self.history_size:
-            self.angle_history.pop(0)
-        return sum(self.angle_history) / len(self.angle_history)
-
-    def update_rep(self, angle, current_time):
-        smoothed_angle = self.get_smoothed_angle(angle)
-        
-        if self.last_angle is not None:
-            if smoothed_angle > self.last_angle + 2:
-                self.angle_direction = "up"
-            elif smoothed_angle < self.last_angle - 2:
-                self.angle_direction = "down"
-        self.last_angle = smoothed_angle
-
-        self.rep_angles.append(smoothed_angle)
-        if len(self.rep_angles) > 5:
-            self.rep_angles.pop(0)
-
-        if self.stage is None:
-            if smoothed_angle < self.down_threshold and self.angle_direction == "down":
-                self.stage = "down"
-                self.is_valid_rep = True
-                self.rep_start_time = current_time
-        elif self.stage == "down":
-            if smoothed_angle > self.up_threshold and self.angle_direction == "up":
-                self.stage = "up"
-        elif self.stage == "up":
-            if smoothed_angle < self.down_threshold and self.angle_direction == "down":
-                rep_duration = current_time - self.rep_start_time
-                if (self.is_valid_rep and 
-                    current_time - self.last_rep_time >= self.min_rep_duration and
-                    rep_duration <= self.max_rep_duration):
-                    self.counter += 1
-                    self.last_rep_time = current_time
-                    return self.stage, self.counter, True 
-                self.stage = "down"
-                self.is_valid_rep = True
-                self.rep_start_time = current_time
-
-        return self.stage, self.counter, False
-
-def main(video_path):
+def parse_frame_size(value):
+    """Parse a WIDTHxHEIGHT string such as "320x240" into a (width, height) tuple"""
+    width, height = value.lower().split("x")
+    return int(width), int(height)
+
+def create_pose():
+    """Build the MediaPipe Pose graph used for video analysis"""
+    return mp_pose.Pose(**POSE_SETTINGS)
+
+def landmark_cache_key(landmark_cache, video_path, stride, inference_size, roi=False):
+    """Cache key covering the video bytes and every setting that affects inference"""
+    settings = dict(POSE_SETTINGS, stride=stride, inference_size=list(inference_size), mediapipe=mp.__version__)
+    if roi:
+        settings['roi'] = True
+    return landmark_cache.make_key(video_path, settings)
+
+def format_summary(result):
+    """Render an analysis result as the summary text shown to the user"""
+    return WorkoutResult.from_dict(result).summary_text()
+
+def get_media_time(cap, frame_index, fps):
+    """Presentation time in seconds of the frame just read from cap.
+
+    Uses the container timestamp when the backend reports one and falls back
+    to frame position / fps otherwise, so rep timing follows the video and
+    not how fast the machine happens to process it.
+    """
+    timestamp_ms = cap.get(cv2.CAP_PROP_POS_MSEC)
+    if timestamp_ms > 0:
+        return timestamp_ms / 1000.0
+    return frame_index / fps
+
+def get_frame_stride(fps, frame_stride=1, target_fps=None):
+    """Number of source frames per inferred frame.
+
+    target_fps, when set, takes precedence over frame_stride and picks the
+    stride that brings the video's frame rate closest to it.
+    """
+    if target_fps and fps > 0:
+        return max(1, int(round(fps / target_fps)))
+    return max(1, int(frame_stride))
+
+def get_video_info(video_path):
+    """Return (fps, total_frames) for a video file"""
+    cap = cv2.VideoCapture(video_path)
+    try:
+        if not cap.isOpened():
+            raise Exception(f"Error opening video file: {video_path}")
+        return cap.get(cv2.CAP_PROP_FPS), int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    finally:
+        cap.release()
+
+def wait_for_video_info(video_path, upload):
+    """get_video_info for a video that is still being uploaded.
+
+    Waits until enough of the file has arrived for its header to open;
+    upload is a ChunkedUpload. total_frames may be an estimate until the
+    upload completes.
+    """
+    while True:
+        complete = upload.is_complete()
+        try:
+            fps, total_frames = get_video_info(video_path)
+            if fps > 0 or complete:
+                return fps, total_frames
+        except Exception:
+            if complete:
+                raise
+        upload.wait()
+
+def infer_pose(pose, frame, inference_size, roi=None):
+    """Resize a BGR frame and run pose inference; returns (rgb_image, results).
+
+    With roi (a RoiTracker) only the region around the last pose is
+    inferred on, and the landmarks are mapped back to the whole frame;
+    rgb_image is then that crop. pose is reset when the crop moves.
+    """
+    if roi is not None:
+        height, width = frame.shape[:2]
+        frame, box = roi.crop(frame, inference_size)
+    else:
+        frame = cv2.resize(frame, inference_size)
+    image = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+    image.flags.writeable = False
+    results = pose.process(image)
+    if roi is not None and roi.update(results, box, (width, height)) and hasattr(pose, 'reset'):
+        pose.reset()
+    return image, results
+
+def extract_landmarks(video_path, pose, start_frame=0, end_frame=None, stride=1,
+                      inference_size=DEFAULT_INFERENCE_SIZE, progress=None, roi=False):
+    """Run pose inference on every stride-th frame in [start_frame, end_frame).
+
+    Frames are picked by their absolute index, so a range of a video
+    selects exactly the frames a single pass would. end_frame=None reads
+    to the end of the video. progress, if given, is called as
+    progress(frames_read, frames_in_range). roi=True infers on a crop
+    around the previous frame's pose (see RoiTracker).
+
+    Returns (frame_indices, timestamps, landmarks) arrays, where landmarks
+    has shape (n, 33, 4) and is NaN for frames without a detected pose.
+    """
+    cap = cv2.VideoCapture(video_path)
     try:
-        cap = cv2.VideoCapture(video_path)
         if not cap.isOpened():
             raise Exception(f"Error opening video file: {video_path}")
 
+        # The graph may be reused across videos, so drop any tracking state
+        # left over from the previous one.
+        if hasattr(pose, 'reset'):
+            pose.reset()
+        roi_tracker = RoiTracker() if roi else None
+
         fps = cap.get(cv2.CAP_PROP_FPS)
         total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-        duration = total_frames / fps
+        range_frames = (end_frame if end_frame is not None else total_frames) - start_frame
+        if start_frame > 0:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
+
+        frame_indices = []
+        timestamps = []
+        landmarks = []
+        no_pose = np.full((NUM_LANDMARKS, 4), np.nan, dtype=np.float32)
+        frame_index = start_frame
+
+        if progress:
+            progress(0, range_frames)
+
+        while end_frame is None or frame_index < end_frame:
+            frames_read = frame_index - start_frame
+            if progress and frames_read and frames_read % PROGRESS_INTERVAL == 0:
+                progress(frames_read, range_frames)
+
+            if frame_index % stride != 0:
+                # Advance past frames we won't infer on without decoding them
+                if not cap.grab():
+                    break
+                frame_index += 1
+                continue
 
-        exercise_state = ExerciseState()
-        frame_count = 0
-        processed_frames = 0
-        
-        speak("Analyzing video. Please wait.")
+            ret, frame = cap.read()
+            if not ret:
+                break
+
+            timestamps.append(get_media_time(cap, frame_index, fps))
+            frame_indices.append(frame_index)
+            frame_index += 1
+
+            _, results = infer_pose(pose, frame, inference_size, roi_tracker)
+            if results.pose_landmarks:
+                landmarks.append(landmarks_to_array(results.pose_landmarks))
+            else:
+                landmarks.append(no_pose)
+
+        if progress:
+            progress(frame_index - start_frame, range_frames)
+    finally:
+        cap.release()
+
+    landmarks = np.stack(landmarks) if landmarks else np.empty((0, NUM_LANDMARKS, 4), dtype=np.float32)
+    return (np.array(frame_indices, dtype=np.int64),
+            np.array(timestamps, dtype=np.float64),
+            landmarks)
+
+def extract_landmarks_growing(video_path, pose, upload, stride=1, inference_size=DEFAULT_INFERENCE_SIZE,
+                              progress=None, holdback=PREFIX_HOLDBACK_FRAMES, roi=False):
+    """extract_landmarks for a video that is still being uploaded.
+
+    Frames are inferred as their bytes arrive. Whenever decoding reaches
+    the end of the received data, the video is reopened once the upload
+    (a ChunkedUpload) has grown and reading resumes by frame index, with
+    the Pose graph's tracking state (and ROI) carried over, so the landmarks match
+    a single pass over the finished file. Until the upload completes,
+    the last holdback decoded frames are not inferred, because they may
+    come from a partially written packet; they are decoded again on the
+    next pass. Returns the same arrays as extract_landmarks.
+    """
+    if hasattr(pose, 'reset'):
+        pose.reset()
+    roi_tracker = RoiTracker() if roi else None
+
+    frame_indices = []
+    timestamps = []
+    landmarks = []
+    no_pose = np.full((NUM_LANDMARKS, 4), np.nan, dtype=np.float32)
+    # First frame not yet inferred, where the next pass starts
+    next_frame = 0
+    frame_index = 0
+    total_frames = 0
+    read_size = -1
+
+    while True:
+        complete = upload.is_complete()
+        size = upload.received()
+        if size == read_size and not complete:
+            upload.wait()
+            continue
+        read_size = size
+
+        cap = cv2.VideoCapture(video_path)
+        try:
+            if not cap.isOpened():
+                if complete:
+                    raise Exception(f"Error opening video file: {video_path}")
+                upload.wait()
+                continue
+
+            fps = cap.get(cv2.CAP_PROP_FPS)
+            total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+            if next_frame > 0:
+                cap.set(cv2.CAP_PROP_POS_FRAMES, next_frame)
+            elif progress:
+                progress(0, total_frames)
+
+            # Decoded (frame_index, timestamp, frame) not yet inferred
+            pending = deque()
+            frame_index = next_frame
+            while True:
+                if frame_index % stride != 0:
+                    if not cap.grab():
+                        break
+                    frame_index += 1
+                    continue
 
-        with mp_pose.Pose(
-            min_detection_confidence=0.5,
-            min_tracking_confidence=0.5,
-            model_complexity=1,
-            static_image_mode=False
-        ) as pose:
-            while cap.isOpened():
                 ret, frame = cap.read()
                 if not ret:
                     break
+                pending.append((frame_index, get_media_time(cap, frame_index, fps), frame))
+                frame_index += 1
+
+                # The whole file is here once complete, so nothing is held back
+                while len(pending) > (0 if complete else holdback):
+                    index, timestamp, frame = pending.popleft()
+                    _, results = infer_pose(pose, frame, inference_size, roi_tracker)
+                    frame_indices.append(index)
+                    timestamps.append(timestamp)
+                    landmarks.append(landmarks_to_array(results.pose_landmarks)
+                                     if results.pose_landmarks else no_pose)
+                    next_frame = index + 1
+                    if progress and len(frame_indices) % PROGRESS_INTERVAL == 0:
+                        progress(next_frame, total_frames)
+        finally:
+            cap.release()
+
+        if complete:
+            break
+        upload.wait()
+
+    if progress:
+        progress(frame_index, total_frames)
+
+    landmarks = np.stack(landmarks) if landmarks else np.empty((0, NUM_LANDMARKS, 4), dtype=np.float32)
+    return (np.array(frame_indices, dtype=np.int64),
+            np.array(timestamps, dtype=np.float64),
+            landmarks)
+
+def count_reps(timestamps, landmarks, exercise_state=None, exercise=DEFAULT_EXERCISE):
+    """Replay the rep state machine over extracted landmarks frame by frame"""
+    exercise = get_exercise(exercise)
+    if exercise_state is None:
+        exercise_state = exercise.new_state()
+    for timestamp, frame_landmarks in zip(timestamps.tolist(), landmarks):
+        if np.isnan(frame_landmarks[0, 0]):
+            continue
+        exercise_state.update_rep(exercise.angle(frame_landmarks), timestamp)
+    return exercise_state
+
+def smooth_angles(angles, history_size=3):
+    """Vectorized ExerciseState.get_smoothed_angle over an array of angles"""
+    sums = np.zeros_like(angles)
+    # Add the oldest angle of each window first, in the order sum() adds them
+    for lag in range(history_size - 1, -1, -1):
+        sums[lag:] += angles[:len(angles) - lag]
+    return sums / np.minimum(np.arange(1, len(angles) + 1), history_size)
+
+def angle_directions(smoothed):
+    """Per-frame angle_direction of ExerciseState: 1 up, -1 down, 0 not set yet"""
+    changes = np.zeros(len(smoothed), dtype=np.int8)
+    changes[1:][smoothed[1:] > smoothed[:-1] + 2] = 1
+    changes[1:][smoothed[1:] < smoothed[:-1] - 2] = -1
+    # A direction holds until the angle moves more than 2 degrees the other way
+    last_change = np.maximum.accumulate(np.where(changes != 0, np.arange(len(changes)), 0))
+    return changes[last_change]
+
+def detect_reps(timestamps, smoothed, directions, down_threshold=90, up_threshold=130,
+                min_rep_duration=0.2, max_rep_duration=15.0):
+    """Run the ExerciseState.update_rep state machine over whole arrays.
+
+    Only the frames where the stage can change are visited, found with
+    searchsorted over the down/up frame indices. Returns (rep_times, stage)
+    with the timestamps of counted reps and the final stage.
+    """
+    down_frames = np.flatnonzero((smoothed < down_threshold) & (directions == -1))
+    up_frames = np.flatnonzero((smoothed > up_threshold) & (directions == 1))
+    rep_times = []
+    if len(down_frames) == 0:
+        return np.array(rep_times, dtype=np.float64), None
+
+    frame = down_frames[0]
+    stage = "down"
+    rep_start_time = timestamps[frame]
+    last_rep_time = None
+    while True:
+        if stage == "down":
+            index = np.searchsorted(up_frames, frame, side='right')
+            if index == len(up_frames):
+                break
+            frame = up_frames[index]
+            stage = "up"
+        else:
+            index = np.searchsorted(down_frames, frame, side='right')
+            if index == len(down_frames):
+                break
+            frame = down_frames[index]
+            current_time = timestamps[frame]
+            if ((last_rep_time is None or current_time - last_rep_time >= min_rep_duration) and
+                    current_time - rep_start_time <= max_rep_duration):
+                # Like update_rep, a counted rep leaves the stage at "up"
+                rep_times.append(current_time)
+                last_rep_time = current_time
+            else:
+                stage = "down"
+                rep_start_time = current_time
+    return np.array(rep_times, dtype=np.float64), stage
+
+def count_reps_batch(timestamps, landmarks, exercise_state=None, exercise=DEFAULT_EXERCISE):
+    """Vectorized count_reps over extracted landmarks.
+
+    Gives the same reps as replaying ExerciseState frame by frame, using
+    the thresholds of exercise_state (the exercise's own by default).
+    Returns (rep_times, stage).
+    """
+    exercise = get_exercise(exercise)
+    if exercise_state is None:
+        exercise_state = exercise.new_state()
+    valid = ~np.isnan(landmarks[:, 0, 0])
+    smoothed = smooth_angles(exercise.angles(landmarks[valid]), exercise_state.history_size)
+    return detect_reps(np.asarray(timestamps, dtype=np.float64)[valid], smoothed,
+                       angle_directions(smoothed),
+                       exercise_state.down_threshold, exercise_state.up_threshold,
+                       exercise_state.min_rep_duration, exercise_state.max_rep_duration)
+
+def count_exercise_reps(timestamps, landmarks, exercise=DEFAULT_EXERCISE):
+    """Count the reps of an exercise over extracted landmarks.
+
+    With exercise=AUTO every registered exercise is counted from the same
+    landmarks and the one being done is picked like ExerciseTracker does.
+    Returns (exercise name, rep_times, reps per counted exercise).
+    """
+    if exercise != AUTO:
+        rep_times, _ = count_reps_batch(timestamps, landmarks, exercise=exercise)
+        return exercise, rep_times, {exercise: len(rep_times)}
+    rep_times = {}
+    posture_shares = {}
+    frames = int(np.count_nonzero(~np.isnan(landmarks[:, 0, 0])))
+    for name, candidate in EXERCISES.items():
+        # Frames out of the exercise's posture are skipped, like frames without a pose
+        in_posture = candidate.posture_mask(landmarks) & ~np.isnan(landmarks[:, 0, 0])
+        posture_shares[name] = int(np.count_nonzero(in_posture)) / frames if frames else 0.0
+        rep_times[name], _ = count_reps_batch(timestamps, np.where(in_posture[:, None, None], landmarks, np.nan),
+                                              exercise=name)
+    reps = {name: len(times) for name, times in rep_times.items()}
+    name = choose_exercise(reps, posture_shares)
+    return name, rep_times[name], reps
+
+def build_result(reps, duration, processing_time, stride, inferred_frames, exercise=DEFAULT_EXERCISE,
+                 exercise_reps=None, people=None):
+    """Assemble the analysis result returned to the server.
+
+    exercise_reps, when every exercise was counted to detect the one being
+    done, holds the reps counted for each of them. people, when several
+    people were tracked, holds each one's stats; reps is then their total.
+    """
+    final_calories = calculate_calories(reps, duration)
+    result = {
+        'status': "Workout completed!",
+        'exercise': exercise,
+        'reps': reps,
+        'calories': round(final_calories, 1),
+        'duration': round(duration, 1),
+        'processing_time': round(processing_time, 2),
+        'frame_stride': stride,
+        'inferred_frames': inferred_frames,
+        # How many times faster than real time the video was analyzed
+        'realtime_factor': round(duration / processing_time, 2) if processing_time > 0 else 0.0,
+    }
+    if exercise_reps is not None:
+        result['exercise_reps'] = exercise_reps
+    if people is not None:
+        result['people'] = people
+    result['summary'] = format_summary(result)
+    return result
+
+def analyze_video(video_path, pose, voice=True, progress=None, headless=False,
+                  frame_stride=1, target_fps=None, inference_size=DEFAULT_INFERENCE_SIZE,
+                  landmark_cache=None, upload=None, exercise=DEFAULT_EXERCISE, max_people=1,
+                  pose_model=DEFAULT_POSE_MODEL, roi=False):
+    """Count reps in a video file using an already initialized Pose graph.
+
+    progress, if given, is called as progress(processed_frames, total_frames)
+    while the video is being read. With headless=True nothing is drawn or
+    shown and frames are processed as fast as they can be decoded, instead
+    of being paced to the video's frame rate.
+
+    Only every frame_stride-th frame (or enough frames to reach target_fps)
+    is decoded and run through pose inference, after being resized to
+    inference_size; skipped frames are grabbed without decoding. Rep timing
+    uses the video's own timestamps, so it does not depend on the stride.
+    roi=True infers on a crop around the previous frame's pose instead of
+    the whole frame, going back to the whole frame when the pose is lost.
+
+    In headless mode, landmarks are looked up in and saved to landmark_cache
+    (a LandmarkCache) when one is given, so repeat analyses of the same video
+    only replay the rep logic.
+
+    exercise names the registered exercise to count, or is AUTO to count
+    them all and report the one being done.
+
+    upload, a ChunkedUpload, analyzes a video while it is still being
+    uploaded (headless mode only): frames are read as they arrive and the
+    result is returned shortly after the last chunk.
+
+    max_people above 1 tracks that many people with the PoseLandmarker
+    model at pose_model instead of pose; see analyze_people.
+
+    Returns a dict with the workout status, reps, calories, duration, the
+    summary text and the processing speed relative to real time. Raises if
+    the video cannot be opened.
+    """
+    if max_people > 1:
+        if upload is not None:
+            # Several people are only tracked over the finished video
+            while not upload.is_complete():
+                upload.wait()
+        with PeopleDetector(pose_model, max_people) as detector:
+            return analyze_people(video_path, detector, voice=voice, progress=progress, headless=headless,
+                                  frame_stride=frame_stride, target_fps=target_fps,
+                                  inference_size=inference_size, exercise=exercise)
+
+    start_time = time.perf_counter()
+    if upload is not None:
+        fps, total_frames = wait_for_video_info(video_path, upload)
+    else:
+        fps, total_frames = get_video_info(video_path)
+    duration = total_frames / fps
+    stride = get_frame_stride(fps, frame_stride, target_fps)
+
+    if voice:
+        speak("Analyzing video. Please wait.")
+
+    if headless:
+        # Extract all landmarks first, then replay the rep logic over them.
+        # Segment-parallel analysis uses the same two steps.
+        frame_data = None
+        if upload is not None:
+            # Frames are inferred as they arrive; only the finished file
+            # can be hashed for the cache
+            frame_data = extract_landmarks_growing(
+                video_path, pose, upload, stride=stride, inference_size=inference_size, progress=progress,
+                roi=roi)
+            fps, total_frames = get_video_info(video_path)
+            duration = total_frames / fps
+            if landmark_cache is not None:
+                landmark_cache.put(landmark_cache_key(landmark_cache, video_path, stride, inference_size, roi),
+                                   *frame_data)
+        elif landmark_cache is not None:
+            cache_key = landmark_cache_key(landmark_cache, video_path, stride, inference_size, roi)
+            frame_data = landmark_cache.get(cache_key)
+        cached = frame_data is not None and upload is None
+
+        if cached:
+            if progress:
+                progress(total_frames, total_frames)
+        elif frame_data is None:
+            frame_data = extract_landmarks(
+                video_path, pose, stride=stride, inference_size=inference_size, progress=progress, roi=roi)
+            if landmark_cache is not None:
+                landmark_cache.put(cache_key, *frame_data)
+
+        _, timestamps, landmarks = frame_data
+        name, rep_times, exercise_reps = count_exercise_reps(timestamps, landmarks, exercise)
+        result = build_result(len(rep_times), duration, time.perf_counter() - start_time,
+                              stride, len(timestamps), name, exercise_reps if exercise == AUTO else None)
+        result['cached'] = cached
+        return result
+
+    cap = cv2.VideoCapture(video_path)
+    try:
+        if not cap.isOpened():
+            raise Exception(f"Error opening video file: {video_path}")
+
+        if hasattr(pose, 'reset'):
+            pose.reset()
 
+        tracker = ExerciseTracker(exercise)
+        roi_tracker = RoiTracker() if roi else None
+        frame_count = 0
+        processed_frames = 0
+
+        if progress:
+            progress(0, total_frames)
+
+        while cap.isOpened():
+            if progress and frame_count and frame_count % PROGRESS_INTERVAL == 0:
+                progress(frame_count, total_frames)
+
+            if frame_count % stride != 0:
+                # Advance past frames we won't infer on without decoding them
+                if not cap.grab():
+                    break
                 frame_count += 1
-                processed_frames += 1
-
-                # Resize frame for better display
-                frame = cv2.resize(frame, (640, 480))
-                
-                image = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                image.flags.writeable = False
-                results = pose.process(image)
+                continue
+
+            ret, frame = cap.read()
+            if not ret:
+                break
+
+            timestamp = get_media_time(cap, frame_count, fps)
+            frame_count += 1
+            processed_frames += 1
+
+            image, results = infer_pose(pose, frame, inference_size, roi_tracker)
+            if roi_tracker is not None:
+                # Landmarks are in whole-frame coordinates; show the whole frame
+                image = cv2.resize(frame, inference_size)
+            else:
                 image.flags.writeable = True
                 image = cv2.cvtColor(image, cv2.COLOR_RGB2BGR)
 
-                if results.pose_landmarks:
-                    mp_drawing.draw_landmarks(image, results.pose_landmarks, mp_pose.POSE_CONNECTIONS,
-                                            mp_drawing.DrawingSpec(color=(245, 117, 66), thickness=2, circle_radius=2),
-                                            mp_drawing.DrawingSpec(color=(245, 66, 230), thickness=2, circle_radius=2))
+            if results.pose_landmarks:
+                mp_drawing.draw_landmarks(image, results.pose_landmarks, mp_pose.POSE_CONNECTIONS,
+                                        mp_drawing.DrawingSpec(color=(245, 117, 66), thickness=2, circle_radius=2),
+                                        mp_drawing.DrawingSpec(color=(245, 66, 230), thickness=2, circle_radius=2))
+
+                try:
+                    current_stage, current_counter, new_rep = tracker.update(
+                        landmarks_to_array(results.pose_landmarks), timestamp)
+
+                    if voice and new_rep and (time.time() - tracker.last_spoken_time > tracker.speak_delay):
+                        speak(f"Rep {current_counter}")
+                        tracker.last_spoken_time = time.time()
+
+                    # Display rep count and stage
+                    cv2.putText(image, f'Reps: {current_counter}', (10, 30),
+                              cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
+                    cv2.putText(image, f'Stage: {current_stage}', (10, 70),
+                              cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
+                    cv2.putText(image, f'Exercise: {tracker.exercise}', (10, 110),
+                              cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
+
+                except Exception as e:
+                    pass
+
+            # Show the frame
+            cv2.imshow('Workout Analysis', image)
+            
+            # Calculate frame delay based on video FPS
+            frame_delay = int(1000 * stride / fps)
+            if cv2.waitKey(frame_delay) & 0xFF == ord('q'):
+                break
+    finally:
+        # Ensure cap and windows are released even if an error occurs mid-process
+        cap.release()
+        cv2.destroyAllWindows()
+
+    if progress:
+        progress(frame_count, total_frames)
+
+    return build_result(tracker.counter, duration, time.perf_counter() - start_time,
+                        stride, processed_frames, tracker.exercise, tracker.reps() if tracker.auto else None)
+
+def analyze_people(video_path, detector, voice=True, progress=None, headless=False,
+                   frame_stride=1, target_fps=None, inference_size=DEFAULT_INFERENCE_SIZE,
+                   exercise=DEFAULT_EXERCISE):
+    """Count each person's reps in a video with several people in it.
+
+    detector is a PeopleDetector, which finds everyone in a frame in one
+    pass; a PeopleTracker gives each person a stable id and their own rep
+    count. Options are as for analyze_video, without the landmark cache.
+    The result's reps and calories are everyone's together, and its people
+    entry lists each person's.
+    """
+    start_time = time.perf_counter()
+    fps, total_frames = get_video_info(video_path)
+    duration = total_frames / fps
+    stride = get_frame_stride(fps, frame_stride, target_fps)
+
+    if voice:
+        speak("Analyzing video. Please wait.")
+
+    cap = cv2.VideoCapture(video_path)
+    people = PeopleTracker(exercise)
+    frame_count = 0
+    processed_frames = 0
+    try:
+        if not cap.isOpened():
+            raise Exception(f"Error opening video file: {video_path}")
+
+        if progress:
+            progress(0, total_frames)
 
-                    try:
-                        hip = [results.pose_landmarks.landmark[mp_pose.PoseLandmark.LEFT_HIP.value].x,
-                               results.pose_landmarks.landmark[mp_pose.PoseLandmark.LEFT_HIP.value].y]
-                        knee = [results.pose_landmarks.landmark[mp_pose.PoseLandmark.LEFT_KNEE.value].x,
-                                results.pose_landmarks.landmark[mp_pose.PoseLandmark.LEFT_KNEE.value].y]
-                        ankle = [results.pose_landmarks.landmark[mp_pose.PoseLandmark.LEFT_ANKLE.value].x,
-                                 results.pose_landmarks.landmark[mp_pose.PoseLandmark.LEFT_ANKLE.value].y]
+        while True:
+            if progress and frame_count and frame_count % PROGRESS_INTERVAL == 0:
+                progress(frame_count, total_frames)
 
-                        angle = calculate_angle(hip, knee, ankle)
-                        current_stage, current_counter, new_rep = exercise_state.update_rep(angle, time.time())
+            if frame_count % stride != 0:
+                if not cap.grab():
+                    break
+                frame_count += 1
+                continue
 
-                        if new_rep and (time.time() - exercise_state.last_spoken_time > exercise_state.speak_delay):
-                            speak(f"Rep {current_counter}")
-                            exercise_state.last_spoken_time = time.time()
+            ret, frame = cap.read()
+            if not ret:
+                break
 
-                        # Display rep count and stage
-                        cv2.putText(image, f'Reps: {current_counter}', (10, 30),
-                                  cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
-                        cv2.putText(image, f'Stage: {current_stage}', (10, 70),
-                                  cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
+            timestamp = get_media_time(cap, frame_count, fps)
+            frame_count += 1
+            processed_frames += 1
 
-                    except Exception as e:
-                        pass
+            image = cv2.cvtColor(cv2.resize(frame, inference_size), cv2.COLOR_BGR2RGB)
+            seen = people.update(detector.detect(image, timestamp), timestamp)
 
-                # Show the frame
+            if not headless:
+                image = cv2.cvtColor(image, cv2.COLOR_RGB2BGR)
+                for person, landmarks, new_rep in seen:
+                    draw_person(image, person, landmarks)
+                    if voice and new_rep:
+                        speak(f"Person {person.id}, rep {person.tracker.counter}")
+                cv2.putText(image, f'Reps: {people.reps()}', (10, 30),
+                            cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
                 cv2.imshow('Workout Analysis', image)
-                
-                # Calculate frame delay based on video FPS
-                frame_delay = int(1000/fps)
-                if cv2.waitKey(frame_delay) & 0xFF == ord('q'):
+                if cv2.waitKey(int(1000 * stride / fps)) & 0xFF == ord('q'):
                     break
-
+    finally:
         cap.release()
-        cv2.destroyAllWindows()
+        if not headless:
+            cv2.destroyAllWindows()
 
-        final_calories = calculate_calories(exercise_state.counter, duration)
+    if progress:
+        progress(frame_count, total_frames)
 
-        with open("summary.txt", "w") as f:
-            f.write(f"Workout completed!\n")
-            f.write(f"Reps: {exercise_state.counter}\n")
-            f.write(f"Calories: {final_calories:.1f}\n")
-            f.write(f"Duration: {duration:.1f}s\n")
+    return build_result(people.reps(), duration, time.perf_counter() - start_time, stride,
+                        processed_frames, exercise, people=people.stats(calculate_calories))
+
+def main(video_path, summary_path="summary.json", headless=False, landmark_cache_dir=None,
+         **analysis_options):
+    try:
+        if landmark_cache_dir:
+            analysis_options['landmark_cache'] = LandmarkCache(landmark_cache_dir, DEFAULT_CACHE_BYTES)
+        with create_pose() as pose:
+            result = analyze_video(video_path, pose, headless=headless, **analysis_options)
+        print(f"Analyzed {result['duration']:.1f}s of video in {result['processing_time']:.1f}s "
+              f"({result['realtime_factor']:.1f}x real time)")
+
+        WorkoutResult.from_dict(result).write(summary_path)
 
         # Give detailed voice feedback
-        speak(f"Workout analysis complete. You did {exercise_state.counter} reps.")
+        speak(f"Workout analysis complete. You did {result['reps']} reps.")
         time.sleep(1)  # Small pause between messages
-        speak(f"Estimated calories burned: {final_calories:.1f}")
+        speak(f"Estimated calories burned: {result['calories']:.1f}")
         time.sleep(1)  # Small pause between messages
-        speak(f"Workout duration: {duration:.1f} seconds")
+        speak(f"Workout duration: {result['duration']:.1f} seconds")
 
     except Exception as e:
         print(f"Error in main: {e}")
         speak("An error occurred during video analysis.")
-        with open("summary.txt", "w") as f:
-            f.write("Workout completed!\n")
-            f.write("Reps: 0\n")
-            f.write("Calories: 0.0\n")
-            f.write("Duration: 0.0s\n")
-    finally:
-        # Ensure cap and windows are released even if an error occurs mid-process
-        if 'cap' in locals() and cap.isOpened():
-            cap.release()
-        cv2.destroyAllWindows()
+        WorkoutResult("Workout failed: Analysis error").write(summary_path)
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='Run workout analysis on a video file.')
     parser.add_argument('--video_path', type=str, help='Path to the video file.')
+    parser.add_argument('--summary_path', type=str, default="summary.json",
+                        help='Where to write the workout summary, as JSON.')
+    parser.add_argument('--headless', action='store_true',
+                        help='Skip drawing and the preview window and analyze as fast as possible.')
+    parser.add_argument('--frame_stride', type=int, default=1,
+                        help='Run pose inference on every Nth frame only.')
+    parser.add_argument('--target_fps', type=float, default=None,
+                        help='Pick the frame stride that samples the video at about this rate.')
+    parser.add_argument('--inference_size', type=parse_frame_size, default=DEFAULT_INFERENCE_SIZE,
+                        help='Frame size used for pose inference, as WIDTHxHEIGHT (default 640x480).')
+    parser.add_argument('--landmark_cache', type=str, default=None,
+                        help='Directory for cached landmarks (headless mode only).')
+    parser.add_argument('--exercise', type=str, choices=exercise_names(), default=DEFAULT_EXERCISE,
+                        help='Exercise to count, or auto to detect it.')
+    parser.add_argument('--max_people', type=int, default=1,
+                        help='Track and count reps for up to this many people.')
+    parser.add_argument('--pose_model', type=str, default=DEFAULT_POSE_MODEL,
+                        help='PoseLandmarker model bundle used when --max_people is above 1.')
+    parser.add_argument('--roi', action='store_true',
+                        help='Infer on a crop around the previous frame\'s pose instead of the whole frame.')
     args = parser.parse_args()
-    main(args.video_path)
-
-    
-        
+    main(args.video_path, args.summary_path, args.headless, args.landmark_cache,
+         frame_stride=args.frame_stride, target_fps=args.target_fps,
+         inference_size=args.inference_size, exercise=args.exercise,
+         max_people=args.max_people, pose_model=args.pose_model, roi=args.roi)
@@ -11,6 +11,15 @@ import threading
 import queue
 import logging # Import the logging module
 import sys
+import signal
+from contextlib import nullcontext
+from exercises import DEFAULT_EXERCISE, ExerciseTracker, exercise_names, landmarks_to_array
+from multi_person import DEFAULT_POSE_MODEL, PeopleDetector, PeopleTracker, draw_person
+from roi import RoiTracker
+import live_channel
+from live_pipeline import DropOldestQueue, StageMetrics, pipeline_metrics
+from recording import RECORD_MODES, Recorder, enforce_quota
+from workout_result import COMPLETED, IN_PROGRESS, WorkoutResult
 
 # Configure logging for model_live
 logging.basicConfig(
@@ -69,91 +78,11 @@ pose_instance = mp_pose.Pose(
     static_image_mode=False
 )
 
-def calculate_angle(a, b, c):
-    """Calculate the angle between three points"""
-    a = np.array(a)
-    b = np.array(b)
-    c = np.array(c)
-    
-    radians = np.arctan2(c[1]-b[1], c[0]-b[0]) - np.arctan2(a[1]-b[1], a[0]-b[0])
-    angle = np.abs(radians*180.0/np.pi)
-    
-    if angle > 180.0:
-        angle = 360-angle
-    return angle
-
 def calculate_calories(reps, duration):
     """Calculate calories burned based on reps only"""
     # Calories from reps (0.5 calories per rep)
     return reps * 0.5
 
-class ExerciseState:
-    def __init__(self):
-        self.stage = None
-        self.counter = 0
-        self.last_rep_time = 0
-        self.min_rep_duration = 0.2
-        self.rep_angles = []
-        self.is_valid_rep = False
-        self.consecutive_valid_frames = 0
-        self.required_valid_frames = 1
-        self.last_valid_angle = None
-        self.angle_threshold = 5
-        self.down_threshold = 90
-        self.up_threshold = 130
-        self.rep_start_time = 0
-        self.max_rep_duration = 15.0
-        self.angle_history = []
-        self.history_size = 3
-        self.last_angle = None
-        self.angle_direction = None
-        self.start_time = time.time()
-        self.last_spoken_time = 0
-        self.speak_delay = 0.5
-
-    def get_smoothed_angle(self, current_angle):
-        self.angle_history.append(current_angle)
-        if len(self.angle_history) > self.history_size:
-            self.angle_history.pop(0)
-        return sum(self.angle_history) / len(self.angle_history)
-
-    def update_rep(self, angle, current_time):
-        smoothed_angle = self.get_smoothed_angle(angle)
-        
-        if self.last_angle is not None:
-            if smoothed_angle > self.last_angle + 2:
-                self.angle_direction = "up"
-            elif smoothed_angle < self.last_angle - 2:
-                self.angle_direction = "down"
-        self.last_angle = smoothed_angle
-
-        self.rep_angles.append(smoothed_angle)
-        if len(self.rep_angles) > 5:
-            self.rep_angles.pop(0)
-
-        if self.stage is None:
-            if smoothed_angle < self.down_threshold and self.angle_direction == "down":
-                self.stage = "down"
-                self.is_valid_rep = True
-                self.rep_start_time = current_time
-        elif self.stage == "down":
-            if smoothed_angle > self.up_threshold and self.angle_direction == "up":
-                self.stage = "up"
-        elif self.stage == "up":
-            if smoothed_angle < self.down_threshold and self.angle_direction == "down":
-                rep_duration = current_time - self.rep_start_time
-                if (self.is_valid_rep and 
-                    current_time - self.last_rep_time >= self.min_rep_duration and
-                    rep_duration <= self.max_rep_duration):
-                    self.counter += 1
-                    self.last_rep_time = current_time
-                    return self.stage, self.counter, True
-                self.stage = "down"
-                self.is_valid_rep = True
-                self.rep_start_time = current_time
-
-        return self.stage, self.counter, False
-
 def process_frame(frame):
     frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
     
@@ -162,212 +91,539 @@ def process_frame(frame):
     
     return frame
 
+# Set by SIGTERM, which a server process that does not own our channel sends to stop us
+stop_requested = False
+
+def handle_stop_signal(signum, frame):
+    global stop_requested
+    stop_requested = True
+
 # Global variables for workout summary
 final_reps = 0
 final_calories = 0.0
 final_duration = 0.0
+# Per-person stats when several people are tracked
+final_people = []
+
+# Minimum seconds between coalesced stats events; rep events are sent at once
+STATS_EVENT_INTERVAL = 0.25
+# Seconds between pipeline metrics reports
+METRICS_INTERVAL = 1.0
+# Frames buffered in front of each pipeline stage
+INFER_QUEUE_SIZE = 1
+RECORD_QUEUE_SIZE = 30
+UI_QUEUE_SIZE = 1
+# Where live sessions are recorded
+RECORDINGS_DIR = "uploads"
+# Camera settings
+CAMERA_WIDTH = 640
+CAMERA_HEIGHT = 480
+CAMERA_FPS = 30
+
+class WorkoutControl:
+    """State shared by the pipeline threads and the command loop"""
+
+    def __init__(self):
+        self.stop_event = threading.Event()
+        # Set to make the inference stage send its stats with the next frame
+        self.stats_requested = threading.Event()
+        self.paused = False
+        self.pause_started = 0.0
+        self.paused_seconds = 0.0
+        # Summary status line when a stage failed
+        self.error = None
+
+    def pause(self):
+        if not self.paused:
+            self.pause_started = time.time()
+            self.paused = True
+
+    def resume(self):
+        if self.paused:
+            self.paused_seconds += time.time() - self.pause_started
+            self.paused = False
+
+    def paused_time(self, now):
+        """Seconds spent paused so far; they don't count towards the workout"""
+        if self.paused:
+            return self.paused_seconds + now - self.pause_started
+        return self.paused_seconds
+
+def open_camera():
+    """Open the default camera; None if it can't be opened"""
+    cap = cv2.VideoCapture(0)
+    if not cap.isOpened():
+        cap.release()
+        return None
+    cap.set(cv2.CAP_PROP_FRAME_WIDTH, CAMERA_WIDTH)
+    cap.set(cv2.CAP_PROP_FRAME_HEIGHT, CAMERA_HEIGHT)
+    cap.set(cv2.CAP_PROP_FPS, CAMERA_FPS)
+    return cap
+
+def run_stage(stage, control, *args):
+    """Thread target: run a pipeline stage, stopping the whole session if it fails"""
+    try:
+        stage(*args)
+    except Exception as e:
+        logger.critical(f"Unhandled exception in {stage.__name__}: {e}", exc_info=True)
+        control.error = "Workout failed: Unexpected error"
+        control.stop_event.set()
+
+def capture_loop(cap, control, infer_queue, recorder, metrics):
+    while not control.stop_event.is_set():
+        read_start = time.perf_counter()
+        ret, frame = cap.read()
+        if not ret:
+            logger.error("Error: Could not read frame")
+            control.error = "Workout failed: Frame read error"
+            control.stop_event.set()
+            break
+        captured_at = time.time()
+        # cap.read() blocks until the camera delivers the next frame; that
+        # is counted as wait, not as capture work
+        start = time.perf_counter()
+        infer_queue.put((frame, captured_at))
+        if recorder is not None:
+            recorder.submit(frame)
+        metrics.record(time.perf_counter() - start, start - read_start)
+
+def inference_loop(pose, tracker, control, infer_queue, ui_queue, channel, metrics,
+                   summary_path, people=None, roi_tracker=None):
+    """Pose inference and rep counting for each captured frame.
+
+    With people (a PeopleTracker), pose is a PeopleDetector and every
+    person in view gets their own rep count; the reported reps and
+    calories are then everyone's together. With roi_tracker (a
+    RoiTracker) a single person is inferred on a crop around their last pose.
+    """
+    global final_reps, final_calories, final_duration, final_people
+    last_summary_write_time = time.time()
+    summary_write_interval = 1
+    last_stats_event_time = 0
+
+    while not control.stop_event.is_set():
+        item = infer_queue.get(timeout=0.1)
+        if item is None:
+            continue
+        frame, captured_at = item
+        start = time.perf_counter()
+
+        results = None
+        paused = control.paused
+        if paused:
+            # No pose inference (and so no reps) while paused; the overlay goes
+            # on a copy, the recorder has the captured frame
+            image = frame.copy()
+            cv2.putText(image, 'Paused', (10, 150),
+                        cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 255), 2, cv2.LINE_AA)
+        elif roi_tracker is not None:
+            # Infer on the region around the last pose only; the landmarks
+            # are mapped back onto the whole frame
+            height, width = frame.shape[:2]
+            crop, box = roi_tracker.crop(frame, (width, height))
+            crop = cv2.cvtColor(crop, cv2.COLOR_BGR2RGB)
+            crop.flags.writeable = False
+            results = pose.process(crop)
+            if roi_tracker.update(results, box, (width, height)):
+                # Pose's own tracking is in the old crop's coordinates
+                pose.reset()
+            # Draw on a copy, the recorder has the captured frame
+            image = frame.copy()
+        else:
+            # Recolor image to RGB
+            image = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+            image.flags.writeable = False
+
+            # Make detection
+            if people is not None:
+                seen = people.update(pose.detect(image, captured_at), captured_at)
+            else:
+                results = pose.process(image)
+
+            # Recolor back to BGR
+            image.flags.writeable = True
+            image = cv2.cvtColor(image, cv2.COLOR_RGB2BGR)
+
+        new_rep = False
+        if people is not None and not paused:
+            for person, landmarks, person_rep in seen:
+                draw_person(image, person, landmarks)
+                if person_rep:
+                    new_rep = True
+                    speak(f"Person {person.id}, rep {person.tracker.counter}")
+
+        # Draw landmarks
+        if results is not None and results.pose_landmarks:
+            mp_drawing.draw_landmarks(image, results.pose_landmarks, mp_pose.POSE_CONNECTIONS,
+                                    mp_drawing.DrawingSpec(color=(245, 117, 66), thickness=2, circle_radius=2),
+                                    mp_drawing.DrawingSpec(color=(245, 66, 230), thickness=2, circle_radius=2))
+
+            # Count reps of the chosen exercise (or of every exercise, to detect it)
+            # from this one pose result
+            try:
+                # Time the rep by when the frame was captured, not when inference finished
+                current_stage, current_counter, new_rep = tracker.update(
+                    landmarks_to_array(results.pose_landmarks), captured_at)
+
+                if new_rep and (time.time() - tracker.last_spoken_time > tracker.speak_delay):
+                    speak(f"Rep {current_counter}")
+                    tracker.last_spoken_time = time.time()
+
+            except Exception as e:
+                logger.error(f"Error processing landmarks: {e}")
+                pass
+
+        now = time.time()
+        current_duration = now - tracker.start_time - control.paused_time(now)
+        if people is not None:
+            reps = people.reps()
+            people_stats = people.stats(calculate_calories)
+            current_calories = sum(person['calories'] for person in people_stats)
+        else:
+            reps = tracker.counter
+            people_stats = []
+            current_calories = calculate_calories(reps, current_duration)
+
+        # Update global variables for final summary
+        final_reps = reps
+        final_people = people_stats
+        final_calories = current_calories
+        final_duration = current_duration
+
+        # Push a rep to the server right away, other changes at most every STATS_EVENT_INTERVAL
+        # (and at once when the server asks for stats or the pause state changed)
+        stats_requested = control.stats_requested.is_set()
+        if new_rep or stats_requested or now - last_stats_event_time >= STATS_EVENT_INTERVAL:
+            control.stats_requested.clear()
+            live_channel.send_event(channel, 'rep' if new_rep else 'stats',
+                                    exercise=tracker.exercise,
+                                    reps=reps,
+                                    people=people_stats,
+                                    calories=round(current_calories, 1),
+                                    duration=round(current_duration, 1),
+                                    paused=paused)
+            last_stats_event_time = now
+
+        # Display stats on frame
+        cv2.putText(image, f'Reps: {reps}', (10, 30),
+                    cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2, cv2.LINE_AA)
+        cv2.putText(image, f'Calories: {current_calories:.1f}', (10, 70),
+                    cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2, cv2.LINE_AA)
+        cv2.putText(image, f'Duration: {current_duration:.1f}s', (10, 110),
+                    cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2, cv2.LINE_AA)
+        cv2.putText(image, f'Exercise: {tracker.exercise}', (10, 190),
+                    cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2, cv2.LINE_AA)
+
+        # Write live stats to file for other app.py processes
+        if time.time() - last_summary_write_time > summary_write_interval:
+            try:
+                WorkoutResult(IN_PROGRESS, tracker.exercise, reps, current_calories, current_duration,
+                              people_stats).write(summary_path)
+                last_summary_write_time = time.time()
+            except Exception as e:
+                logger.error(f"Error writing stats file: {e}")
+
+        metrics.record(time.perf_counter() - start)
+        ui_queue.put(image)
 
-def main():
-    global final_reps, final_calories, final_duration
+def main(session_dir=".", control_port=None, record_mode="full", record_scale=0.5, record_fps=10,
+         record_codec="mp4v", recordings_quota_mb=1000, exercise=DEFAULT_EXERCISE, max_people=1,
+         pose_model=DEFAULT_POSE_MODEL, roi=False, channel=None, cap=None, pose=None):
+    """Run one live workout from the camera until stopped.
+
+    The persistent worker (serve) passes the session's channel, its open
+    camera and its warm pose graph, which are left open for its next
+    session; otherwise they are created here and released at the end.
+    """
+    global final_reps, final_calories, final_duration, final_people
     logger.debug("model_live.py main function started.")
+    final_reps, final_calories, final_duration, final_people = 0, 0.0, 0.0, []
+    warm = pose is not None
+    owns_camera = cap is None
+
+    # All files exchanged with app.py live in this session's own directory
+    os.makedirs(session_dir, exist_ok=True)
+    summary_path = os.path.join(session_dir, "summary.json")
+    pid_path = os.path.join(session_dir, "worker.pid")
     
-    cap = None
-    exercise_state = None
-    video_writer = None
+    tracker = None
+    recorder = None
+    status = COMPLETED
 
     try:
-        # Create initial summary files with default values
-        with open("summary.txt", "w") as f:
-            f.write("Workout in progress...\n")
-            f.write("Reps: 0\n")
-            f.write("Calories: 0.0\n")
-            f.write("Duration: 0.0s\n")
-        with open("live_workout_stats.txt", "w") as f:
-            f.write("Reps: 0\n")
-            f.write("Calories: 0.0\n")
-            f.write("Duration: 0.0s\n")
-
-        # Initialize camera
-        cap = cv2.VideoCapture(0)
-        if not cap.isOpened():
+        # Other server processes stop this session with SIGTERM to this pid
+        signal.signal(signal.SIGTERM, handle_stop_signal)
+        with open(pid_path, "w") as f:
+            f.write(str(os.getpid()))
+
+        # Create initial summary file with default values
+        WorkoutResult(IN_PROGRESS, exercise).write(summary_path)
+
+        # Event channel to app.py, which streams our stats to the browser
+        if channel is None and control_port is not None:
+            try:
+                channel = live_channel.connect(control_port)
+            except Exception as e:
+                logger.error(f"Could not connect to server channel, stats will only be written to files: {e}")
+
+        # Initialize camera, unless the persistent worker keeps it open
+        if cap is None:
+            cap = open_camera()
+        if cap is None:
             logger.error("Error: Could not open camera")
-            # Update summary with error
-            with open("summary.txt", "w") as f:
-                f.write("Workout failed: Camera error\n")
-                f.write("Reps: 0\n")
-                f.write("Calories: 0.0\n")
-                f.write("Duration: 0.0s\n")
+            status = "Workout failed: Camera error"
             return # Exit if camera fails
 
-        # Set camera properties
-        cap.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
-        cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
-        cap.set(cv2.CAP_PROP_FPS, 30)
-
         # Get video properties
         frame_width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
         frame_height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
         fps = int(cap.get(cv2.CAP_PROP_FPS))
 
-        # Create uploads directory if it doesn't exist
-        os.makedirs("uploads", exist_ok=True)
-
-        # Create video writer
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        video_filename = f"live_workout_{timestamp}.mp4"
-        video_path = os.path.join("uploads", video_filename)
-        fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-        video_writer = cv2.VideoWriter(video_path, fourcc, fps, (frame_width, frame_height))
+        # Record the session in the background unless recording is off
+        if record_mode != "off":
+            os.makedirs(RECORDINGS_DIR, exist_ok=True)
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            video_filename = f"live_workout_{timestamp}.mp4"
+            video_path = os.path.join(RECORDINGS_DIR, video_filename)
+            recorder = Recorder(video_path, fps, (frame_width, frame_height), mode=record_mode,
+                                scale=record_scale, target_fps=record_fps, codec=record_codec,
+                                buffer_frames=RECORD_QUEUE_SIZE,
+                                quota_bytes=recordings_quota_mb * 1024 * 1024)
 
         logger.info("Camera started. Press 'q' to quit.")
 
-        exercise_state = ExerciseState()
-        last_summary_write_time = time.time()
-        summary_write_interval = 1
-
-        with pose_instance as pose:
+        tracker = ExerciseTracker(exercise)
+        control = WorkoutControl()
+        # Several people: one PoseLandmarker pass finds everyone, and each
+        # person keeps their own rep count
+        people = PeopleTracker(exercise) if max_people > 1 else None
+        # Several people are always looked for in the whole frame
+        roi_tracker = RoiTracker() if roi and people is None else None
+
+        # Capture feeds inference and recording; inference feeds the UI.
+        # Every queue drops its oldest frame when full, so a slow stage
+        # skips frames instead of delaying the ones after it.
+        infer_queue = DropOldestQueue(INFER_QUEUE_SIZE)
+        ui_queue = DropOldestQueue(UI_QUEUE_SIZE)
+        stages = {name: StageMetrics(name) for name in ("capture", "inference", "ui")}
+        queues = {'inference': infer_queue, 'ui': ui_queue}
+        if recorder is not None:
+            stages['record'] = recorder.metrics
+            queues['record'] = recorder.queue
+
+        if warm:
+            # Drop the tracking state of the previous session
+            if hasattr(pose, 'reset'):
+                pose.reset()
+            pose_context = nullcontext(pose)
+        else:
+            pose_context = PeopleDetector(pose_model, max_people) if people is not None else pose_instance
+        with pose_context as pose:
             speak("Live workout started.")
-            while True:
-                ret, frame = cap.read()
-                if not ret:
-                    logger.error("Error: Could not read frame")
-                    # Update summary with error
-                    with open("summary.txt", "w") as f:
-                        f.write("Workout failed: Frame read error\n")
-                        f.write(f"Reps: {exercise_state.counter}\n")
-                        f.write(f"Calories: {final_calories:.1f}\n")
-                        f.write(f"Duration: {final_duration:.1f}s\n")
-                    break
-
-                # Write frame to video file
-                if video_writer is not None:
-                    video_writer.write(frame)
-
-                # Recolor image to RGB
-                image = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                image.flags.writeable = False
-
-                # Make detection
-                results = pose.process(image)
+            threads = [
+                threading.Thread(target=run_stage, args=(capture_loop, control, cap, control, infer_queue,
+                                                         recorder, stages['capture'])),
+                threading.Thread(target=run_stage, args=(inference_loop, control, pose, tracker, control,
+                                                         infer_queue, ui_queue, channel, stages['inference'],
+                                                         summary_path, people, roi_tracker))
+            ]
+            for thread in threads:
+                thread.start()
 
-                # Recolor back to BGR
-                image.flags.writeable = True
-                image = cv2.cvtColor(image, cv2.COLOR_RGB2BGR)
-
-                # Draw landmarks
-                if results.pose_landmarks:
-                    mp_drawing.draw_landmarks(image, results.pose_landmarks, mp_pose.POSE_CONNECTIONS,
-                                            mp_drawing.DrawingSpec(color=(245, 117, 66), thickness=2, circle_radius=2),
-                                            mp_drawing.DrawingSpec(color=(245, 66, 230), thickness=2, circle_radius=2))
-
-                    # Extract landmarks for rep counting (example: bicep curls using left arm)
-                    try:
-                        hip = [results.pose_landmarks.landmark[mp_pose.PoseLandmark.LEFT_HIP.value].x,
-                               results.pose_landmarks.landmark[mp_pose.PoseLandmark.LEFT_HIP.value].y]
-                        knee = [results.pose_landmarks.landmark[mp_pose.PoseLandmark.LEFT_KNEE.value].x,
-                                results.pose_landmarks.landmark[mp_pose.PoseLandmark.LEFT_KNEE.value].y]
-                        ankle = [results.pose_landmarks.landmark[mp_pose.PoseLandmark.LEFT_ANKLE.value].x,
-                                 results.pose_landmarks.landmark[mp_pose.PoseLandmark.LEFT_ANKLE.value].y]
-
-                        angle = calculate_angle(hip, knee, ankle)
-                        current_stage, current_counter, new_rep = exercise_state.update_rep(angle, time.time())
-
-                        if new_rep and (time.time() - exercise_state.last_spoken_time > exercise_state.speak_delay):
-                            speak(f"Rep {current_counter}")
-                            exercise_state.last_spoken_time = time.time()
-
-                    except Exception as e:
-                        logger.error(f"Error processing landmarks: {e}")
-                        pass
-
-                current_duration = time.time() - exercise_state.start_time
-                current_calories = calculate_calories(exercise_state.counter, current_duration)
-                
-                # Update global variables for final summary
-                final_reps = exercise_state.counter
-                final_calories = current_calories
-                final_duration = current_duration
-
-                # Display stats on frame
-                cv2.putText(image, f'Reps: {exercise_state.counter}', (10, 30),
-                            cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2, cv2.LINE_AA)
-                cv2.putText(image, f'Calories: {current_calories:.1f}', (10, 70),
-                            cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2, cv2.LINE_AA)
-                cv2.putText(image, f'Duration: {current_duration:.1f}s', (10, 110),
-                            cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2, cv2.LINE_AA)
-                
-                # Write live stats to file for app.py
-                if time.time() - last_summary_write_time > summary_write_interval:
-                    try:
-                        with open("live_workout_stats.txt", "w") as f:
-                            f.write(f"Reps: {exercise_state.counter}\n")
-                            f.write(f"Calories: {current_calories:.1f}\n")
-                            f.write(f"Duration: {current_duration:.1f}s\n")
-                        # Also update summary.txt to keep it in sync
-                        with open("summary.txt", "w") as f:
-                            f.write("Workout in progress...\n")
-                            f.write(f"Reps: {exercise_state.counter}\n")
-                            f.write(f"Calories: {current_calories:.1f}\n")
-                            f.write(f"Duration: {current_duration:.1f}s\n")
-                        last_summary_write_time = time.time()
-                    except Exception as e:
-                        logger.error(f"Error writing stats files: {e}")
-
-                cv2.imshow('Live Workout', image)
-
-                if cv2.waitKey(10) & 0xFF == ord('q'):
-                    logger.info("Quit key 'q' pressed. Exiting live workout.")
-                    break
-                
-                # Check for stop signal from app.py
-                if os.path.exists("stop_signal.txt"):
-                    logger.info("Stop signal received. Exiting live workout gracefully.")
-                    break
+            try:
+                # The UI stays on the main thread, which also handles app.py's commands
+                last_metrics_time = time.time()
+                while not control.stop_event.is_set():
+                    # Commands from app.py: checked once per displayed frame, without blocking
+                    command = live_channel.poll_command(channel)
+                    if command == "stop" or stop_requested:
+                        logger.info("Stop requested. Exiting live workout gracefully.")
+                        break
+                    elif command == "pause":
+                        control.pause()
+                        logger.info("Live workout paused.")
+                    elif command == "resume":
+                        control.resume()
+                        logger.info("Live workout resumed.")
+                    if command is not None:
+                        # Answer at once with the current stats (and pause state)
+                        control.stats_requested.set()
+
+                    image = ui_queue.get(timeout=0.05)
+                    if image is not None:
+                        start = time.perf_counter()
+                        cv2.imshow('Live Workout', image)
+                        stages['ui'].record(time.perf_counter() - start)
+
+                    if cv2.waitKey(1) & 0xFF == ord('q'):
+                        logger.info("Quit key 'q' pressed. Exiting live workout.")
+                        break
+
+                    if time.time() - last_metrics_time >= METRICS_INTERVAL:
+                        metrics = pipeline_metrics(stages.values(), queues)
+                        logger.debug(f"Pipeline metrics: {metrics}")
+                        live_channel.send_event(channel, 'metrics', pipeline=metrics)
+                        last_metrics_time = time.time()
+            finally:
+                # Stop every stage before the camera and writer are released
+                control.stop_event.set()
+                for thread in threads:
+                    thread.join()
+
+        if control.error:
+            status = control.error
 
     except Exception as e:
         logger.critical(f"Unhandled exception in model_live.py main loop: {e}", exc_info=True)
-        # Update summary with error
-        try:
-            with open("summary.txt", "w") as f:
-                f.write("Workout failed: Unexpected error\n")
-                f.write(f"Reps: {final_reps}\n")
-                f.write(f"Calories: {final_calories:.1f}\n")
-                f.write(f"Duration: {final_duration:.1f}s\n")
-        except Exception as write_error:
-            logger.error(f"Failed to write error summary: {write_error}")
+        status = "Workout failed: Unexpected error"
 
     finally:
         logger.debug("Running final cleanup and summary writing.")
-        if cap:
+        result = WorkoutResult(status, tracker.exercise if tracker else exercise, final_reps,
+                               final_calories, final_duration, final_people,
+                               recorder.summary() if recorder else None)
+        # Report the final stats first so the server can answer the stop request right away
+        live_channel.send_event(channel, 'finished', **result.to_dict())
+        if channel is not None:
+            channel.close()
+        if cap and owns_camera:
             cap.release()
-        if video_writer:
-            video_writer.release()
+        if recorder:
+            # Finishes encoding the buffered frames, then keeps old recordings within the quota
+            recorder.close()
+            enforce_quota(RECORDINGS_DIR, recordings_quota_mb * 1024 * 1024, keep=[recorder.path])
+            result.recording = recorder.summary()
         cv2.destroyAllWindows()
         
         # Ensure final summary is written
         try:
-            with open("summary.txt", "w") as f:
-                f.write("Workout completed!\n")
-                f.write(f"Reps: {final_reps}\n")
-                f.write(f"Calories: {final_calories:.1f}\n")
-                f.write(f"Duration: {final_duration:.1f}s\n")
-            logger.info("Final summary.txt written.")
-
-            # Also write to live_workout_stats.txt one last time to ensure consistency
-            with open("live_workout_stats.txt", "w") as f:
-                f.write(f"Reps: {final_reps}\n")
-                f.write(f"Calories: {final_calories:.1f}\n")
-                f.write(f"Duration: {final_duration:.1f}s\n")
-            logger.info("Final live_workout_stats.txt written.")
-
+            result.write(summary_path)
+            logger.info("Final summary.json written.")
         except Exception as e:
-            logger.error(f"Error writing final summary files: {e}")
+            logger.error(f"Error writing final summary file: {e}")
         
         speak(f"Workout finished. You did {final_reps} reps.")
-        speaker_queue.join()  # Wait for the speaker queue to be empty
-        speaker_queue.put(None) # Signal the speaker thread to exit
-        speaker_thread.join() # Wait for the speaker thread to finish
+        if not warm:
+            speaker_queue.join()  # Wait for the speaker queue to be empty
+            speaker_queue.put(None) # Signal the speaker thread to exit
+            speaker_thread.join() # Wait for the speaker thread to finish
         logger.info("Cleanup complete")
 
+def warm_up_pose(pose):
+    """Run the pose graph once on a blank frame, so the first session
+    doesn't pay for its lazy initialization"""
+    blank = np.zeros((CAMERA_HEIGHT, CAMERA_WIDTH, 3), dtype=np.uint8)
+    if isinstance(pose, PeopleDetector):
+        pose.detect(blank, 0)
+    else:
+        pose.process(blank)
+        pose.reset()
+
+def serve(control_port, record_mode="full", record_scale=0.5, record_fps=10, record_codec="mp4v",
+          recordings_quota_mb=1000, max_people=1, pose_model=DEFAULT_POSE_MODEL, roi=False,
+          keep_camera=True):
+    """Persistent live worker: start up once, then run sessions on request.
+
+    The pose graph is built and warmed up (and the camera opened, with
+    keep_camera) before the worker tells the server it is ready, so a
+    session starts on a warm pipeline instead of a new process. The
+    server's control channel sends "start" commands with the session's
+    directory, exercise and channel, and "shutdown"; after each session
+    the worker reports "session_ended". It exits when the server goes away.
+    """
+    global stop_requested
+    started = time.perf_counter()
+    control = live_channel.connect(control_port)
+    signal.signal(signal.SIGTERM, handle_stop_signal)
+
+    pose = PeopleDetector(pose_model, max_people) if max_people > 1 else pose_instance
+    warm_up_pose(pose)
+    pose_seconds = time.perf_counter() - started
+    cap = open_camera() if keep_camera else None
+    if keep_camera and cap is None:
+        logger.warning("Could not open camera, it will be opened when a session starts")
+    startup = {
+        'ready_seconds': round(time.perf_counter() - started, 3),
+        'pose_seconds': round(pose_seconds, 3),
+        'camera_open': cap is not None
+    }
+    logger.info(f"Live worker ready: {startup}")
+    live_channel.send_event(control, 'ready', startup=startup)
+
+    try:
+        while True:
+            try:
+                message = control.recv()
+            except (OSError, EOFError):
+                logger.info("Server went away, live worker exiting.")
+                break
+            command = message.get('command')
+            if command == "shutdown":
+                break
+            if command != "start":
+                continue
+
+            session_id = message['session_id']
+            logger.info(f"Live worker starting session {session_id}")
+            stop_requested = False
+            if keep_camera and (cap is None or not cap.grab()):
+                # The camera was not there at start-up or stopped delivering frames
+                if cap is not None:
+                    cap.release()
+                cap = open_camera()
+            try:
+                channel = live_channel.connect(message['port'], bytes.fromhex(message['authkey']))
+            except Exception as e:
+                logger.error(f"Could not connect to session {session_id} channel: {e}")
+                channel = None
+            try:
+                main(message['session_dir'], None, record_mode, record_scale, record_fps, record_codec,
+                     recordings_quota_mb, message.get('exercise', DEFAULT_EXERCISE), max_people, pose_model,
+                     roi, channel=channel, cap=cap if keep_camera else None, pose=pose)
+            finally:
+                live_channel.send_event(control, 'session_ended', session_id=session_id)
+    finally:
+        control.close()
+        if cap is not None:
+            cap.release()
+        pose.close()
+        speaker_queue.put(None)
+        speaker_thread.join()
+
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description='Run a live workout session from the camera.')
+    parser.add_argument('--session_dir', type=str, default=".",
+                        help='Directory for this session\'s stats, summary and pid files.')
+    parser.add_argument('--control_port', type=int, default=None,
+                        help='Localhost port of the server channel for live stats events and commands.')
+    parser.add_argument('--record', type=str, choices=RECORD_MODES, default='full',
+                        help='Record the session: off, full, downscaled or low_fps.')
+    parser.add_argument('--record_scale', type=float, default=0.5,
+                        help='Frame size factor of downscaled recordings.')
+    parser.add_argument('--record_fps', type=float, default=10,
+                        help='Frame rate of low_fps recordings.')
+    parser.add_argument('--record_codec', type=str, default='mp4v',
+                        help='FourCC code of the recording codec.')
+    parser.add_argument('--recordings_quota_mb', type=int, default=1000,
+                        help='Oldest live recordings are deleted beyond this many megabytes.')
+    parser.add_argument('--exercise', type=str, choices=exercise_names(), default=DEFAULT_EXERCISE,
+                        help='Exercise to count, or auto to detect it.')
+    parser.add_argument('--max_people', type=int, default=1,
+                        help='Track and count reps for up to this many people.')
+    parser.add_argument('--pose_model', type=str, default=DEFAULT_POSE_MODEL,
+                        help='PoseLandmarker model bundle used when --max_people is above 1.')
+    parser.add_argument('--roi', action='store_true',
+                        help='Infer on a crop around the previous frame\'s pose instead of the whole frame.')
+    parser.add_argument('--serve', action='store_true',
+                        help='Stay running and start sessions on commands from --control_port.')
+    parser.add_argument('--release_camera', action='store_true',
+                        help='With --serve, open the camera per session instead of keeping it open.')
+    args = parser.parse_args()
+    if args.serve:
+        serve(args.control_port, args.record, args.record_scale, args.record_fps, args.record_codec,
+              args.recordings_quota_mb, args.max_people, args.pose_model, args.roi,
+              keep_camera=not args.release_camera)
+        sys.exit(0)
+    main(args.session_dir, args.control_port, args.record, args.record_scale, args.record_fps,
+         args.record_codec, args.recordings_quota_mb, args.exercise, args.max_people, args.pose_model,
+         args.roi)
@@ -0,0 +1,184 @@
+import os
+import logging
+
+import cv2
+import mediapipe as mp
+import numpy as np
+
+from exercises import DEFAULT_EXERCISE, ExerciseTracker
+
+logger = logging.getLogger(__name__)
+
+# PoseLandmarker model bundle used when several people are tracked; download
+# pose_landmarker_full.task from the MediaPipe pose landmarker model page
+DEFAULT_POSE_MODEL = "models/pose_landmarker_full.task"
+# Largest move of a person's centre between frames, as a share of the frame
+# size, for two detections to be taken for the same person
+MAX_TRACK_DISTANCE = 0.15
+# Frames a person may go undetected before their track is closed
+MAX_MISSED_FRAMES = 15
+# People seen for less than this many seconds without a rep are left out of
+# the summary, as they are most likely passers-by or false detections
+MIN_PERSON_SECONDS = 1.0
+# Landmarks less visible than this don't count towards a person's centre
+MIN_VISIBILITY = 0.5
+
+class PeopleDetector:
+    """Pose landmarks of up to max_people people per frame.
+
+    Uses the MediaPipe tasks PoseLandmarker in video mode: one call per
+    frame finds every person and runs the landmark model on each of them,
+    so the cost grows with the number of people in view instead of a whole
+    Pose pipeline being run per person.
+    """
+
+    def __init__(self, model_path=DEFAULT_POSE_MODEL, max_people=2, min_confidence=0.5):
+        if not os.path.exists(model_path):
+            raise FileNotFoundError(f"Pose landmarker model not found at {model_path}; download "
+                                    f"pose_landmarker_full.task from the MediaPipe models page")
+        vision = mp.tasks.vision
+        options = vision.PoseLandmarkerOptions(
+            base_options=mp.tasks.BaseOptions(model_asset_path=model_path),
+            running_mode=vision.RunningMode.VIDEO,
+            num_poses=max_people,
+            min_pose_detection_confidence=min_confidence,
+            min_pose_presence_confidence=min_confidence,
+            min_tracking_confidence=min_confidence)
+        self.landmarker = vision.PoseLandmarker.create_from_options(options)
+        self._last_timestamp_ms = -1
+
+    def detect(self, rgb_image, timestamp):
+        """List of (33, 4) landmark arrays, one per person found in an RGB
+        frame taken at timestamp seconds"""
+        # Video mode needs strictly increasing millisecond timestamps
+        timestamp_ms = max(int(timestamp * 1000), self._last_timestamp_ms + 1)
+        self._last_timestamp_ms = timestamp_ms
+        image = mp.Image(image_format=mp.ImageFormat.SRGB, data=np.ascontiguousarray(rgb_image))
+        result = self.landmarker.detect_for_video(image, timestamp_ms)
+        return [np.array([(lm.x, lm.y, lm.z, lm.visibility or 0.0) for lm in person], dtype=np.float32)
+                for person in result.pose_landmarks]
+
+    def close(self):
+        self.landmarker.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def body_centre(landmarks):
+    """Mean x, y of a person's visible landmarks (all of them if none is)"""
+    visible = landmarks[landmarks[:, 3] >= MIN_VISIBILITY]
+    if not len(visible):
+        visible = landmarks
+    return visible[:, :2].mean(axis=0)
+
+class Person:
+    """One tracked person and their rep state"""
+    __slots__ = ('id', 'tracker', 'centre', 'first_seen', 'last_seen', 'missed')
+
+    def __init__(self, person_id, tracker, centre, timestamp):
+        self.id = person_id
+        self.tracker = tracker
+        self.centre = centre
+        self.first_seen = timestamp
+        self.last_seen = timestamp
+        self.missed = 0
+
+    def stats(self, calculate_calories):
+        duration = self.last_seen - self.first_seen
+        return {
+            'id': self.id,
+            'exercise': self.tracker.exercise,
+            'reps': self.tracker.counter,
+            'calories': round(calculate_calories(self.tracker.counter, duration), 1),
+            'duration': round(duration, 1)
+        }
+
+class PeopleTracker:
+    """Stable ids and separate rep counts for several people in view.
+
+    Each frame's detections are matched to the people seen before by how
+    close their centres are, closest pairs first; a detection further than
+    max_distance from everyone starts a new person, and a person missing
+    for more than max_missed frames is closed. Every person only keeps an
+    ExerciseTracker, so following one more person costs a few angle
+    calculations per frame on top of the shared pose inference.
+    """
+
+    def __init__(self, exercise=DEFAULT_EXERCISE, max_distance=MAX_TRACK_DISTANCE,
+                 max_missed=MAX_MISSED_FRAMES):
+        self.exercise = exercise
+        self.max_distance = max_distance
+        self.max_missed = max_missed
+        self.active = {}
+        self.closed = []
+        self._next_id = 1
+
+    def update(self, detections, timestamp):
+        """Feed one frame's detections (a list of (33, 4) landmark arrays).
+
+        Returns a list of (person, landmarks, new_rep) for the people
+        detected in this frame.
+        """
+        centres = [body_centre(landmarks) for landmarks in detections]
+        pairs = sorted((float(np.hypot(*(centre - person.centre))), person.id, index)
+                       for person in self.active.values()
+                       for index, centre in enumerate(centres))
+        matches = {}
+        matched_people = set()
+        for distance, person_id, index in pairs:
+            if distance > self.max_distance:
+                break
+            if index in matches or person_id in matched_people:
+                continue
+            matches[index] = self.active[person_id]
+            matched_people.add(person_id)
+
+        for person_id in list(self.active):
+            if person_id not in matched_people:
+                person = self.active[person_id]
+                person.missed += 1
+                if person.missed > self.max_missed:
+                    self.closed.append(self.active.pop(person_id))
+
+        seen = []
+        for index, landmarks in enumerate(detections):
+            person = matches.get(index)
+            if person is None:
+                person = Person(self._next_id, ExerciseTracker(self.exercise), centres[index], timestamp)
+                self.active[person.id] = person
+                self._next_id += 1
+            person.centre = centres[index]
+            person.last_seen = timestamp
+            person.missed = 0
+            _, _, new_rep = person.tracker.update(landmarks, timestamp)
+            seen.append((person, landmarks, new_rep))
+        return seen
+
+    def people(self):
+        """Everyone worth reporting, in the order they were first seen"""
+        everyone = sorted(self.closed + list(self.active.values()), key=lambda person: person.id)
+        return [person for person in everyone
+                if person.tracker.counter or person.last_seen - person.first_seen >= MIN_PERSON_SECONDS]
+
+    def reps(self):
+        """Reps of everyone together"""
+        return sum(person.tracker.counter for person in self.people())
+
+    def stats(self, calculate_calories):
+        """Per-person reps, calories and time in view, for results and live stats"""
+        return [person.stats(calculate_calories) for person in self.people()]
+
+def draw_person(image, person, landmarks, color=(245, 117, 66)):
+    """Draw a person's skeleton and their id and reps on a BGR image"""
+    height, width = image.shape[:2]
+    points = [(int(x * width), int(y * height)) for x, y in landmarks[:, :2].tolist()]
+    for start, end in mp.solutions.pose.POSE_CONNECTIONS:
+        cv2.line(image, points[start], points[end], color, 2)
+    for point in points:
+        cv2.circle(image, point, 2, (245, 66, 230), -1)
+    x, y = points[0]
+    cv2.putText(image, f'#{person.id}: {person.tracker.counter}', (x - 20, max(20, y - 30)),
+                cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 255, 0), 2, cv2.LINE_AA)
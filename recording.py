@@ -0,0 +1,146 @@
+import glob
+import os
+import threading
+import time
+import logging
+
+import cv2
+
+from live_pipeline import DropOldestQueue, StageMetrics
+
+logger = logging.getLogger(__name__)
+
+# off: no video; full: every frame at camera size; downscaled: every frame
+# at a smaller size; low_fps: camera size at a reduced frame rate
+RECORD_MODES = ('off', 'full', 'downscaled', 'low_fps')
+# Name pattern of live session recordings, the only files the quota deletes
+RECORDING_PATTERN = "live_workout_*.mp4"
+# Seconds between quota checks while a session is recording
+QUOTA_CHECK_INTERVAL = 10
+
+def enforce_quota(recordings_dir, max_bytes, keep=()):
+    """Delete the oldest recordings until they fit in max_bytes.
+
+    Files in keep (e.g. the recording in progress) are never deleted.
+    Returns the size of the recordings left.
+    """
+    keep = {os.path.abspath(path) for path in keep}
+    recordings = []
+    for path in glob.glob(os.path.join(recordings_dir, RECORDING_PATTERN)):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        recordings.append((stat.st_mtime, stat.st_size, path))
+
+    total = sum(size for _, size, _ in recordings)
+    for _, size, path in sorted(recordings):
+        if total <= max_bytes:
+            break
+        if os.path.abspath(path) in keep:
+            continue
+        try:
+            os.remove(path)
+            total -= size
+            logger.info(f"Deleted old recording {path} to stay within the recordings quota")
+        except OSError as e:
+            logger.error(f"Error deleting old recording {path}: {e}")
+    return total
+
+class Recorder:
+    """Writes camera frames to a video file on a background thread.
+
+    Frames wait in a bounded buffer that drops the oldest frame when the
+    encoder falls behind, so recording never slows down capture. The
+    frame written before a gap is repeated in place of the dropped ones,
+    so the video keeps the session's length. In low_fps mode only every
+    stride-th frame is kept; in downscaled mode frames are resized by
+    scale before encoding.
+
+    With quota_bytes, old recordings in its directory are deleted while
+    recording, and recording stops if this one alone outgrows the quota.
+    """
+
+    def __init__(self, path, fps, frame_size, mode='full', scale=0.5, target_fps=10,
+                 codec='mp4v', buffer_frames=30, quota_bytes=None):
+        self.path = path
+        self.mode = mode
+        self.stride = max(1, round(fps / target_fps)) if mode == 'low_fps' and target_fps else 1
+        self.scale = scale if mode == 'downscaled' else 1.0
+        width, height = frame_size
+        self.frame_size = (max(1, int(width * self.scale)), max(1, int(height * self.scale)))
+        self.queue = DropOldestQueue(buffer_frames)
+        self.metrics = StageMetrics("record")
+        self.quota_bytes = quota_bytes
+        self._frames_seen = 0
+        # Frames in the file, counting repeated ones
+        self.frames_written = 0
+        self.quota_exceeded = False
+        self._stop_event = threading.Event()
+        self._writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*codec), fps / self.stride,
+                                       self.frame_size)
+        if not self._writer.isOpened():
+            logger.error(f"Could not open video writer for {path} with codec {codec}")
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    @property
+    def frames_dropped(self):
+        """Frames the buffer dropped because the encoder fell behind"""
+        return self.queue.dropped
+
+    def submit(self, frame):
+        """Queue a captured frame; never blocks"""
+        self._frames_seen += 1
+        if (self._frames_seen - 1) % self.stride == 0:
+            # Position of the frame in the recording, to spot dropped frames
+            self.queue.put((frame, (self._frames_seen - 1) // self.stride))
+
+    def _check_quota(self):
+        total = enforce_quota(os.path.dirname(self.path) or ".", self.quota_bytes, keep=[self.path])
+        if total > self.quota_bytes:
+            logger.warning(f"Recording {self.path} outgrew the recordings quota, recording stopped")
+            self.quota_exceeded = True
+
+    def _run(self):
+        # Keep writing until closed and every buffered frame is encoded
+        previous = None
+        last_quota_check = time.monotonic()
+        while True:
+            item = self.queue.get(timeout=0.1)
+            if item is None:
+                if self._stop_event.is_set():
+                    break
+                continue
+            if self.quota_exceeded:
+                continue
+            frame, index = item
+            start = time.perf_counter()
+            if self.scale != 1.0:
+                frame = cv2.resize(frame, self.frame_size, interpolation=cv2.INTER_AREA)
+            # Hold the last frame over dropped ones, so playback keeps real time
+            for _ in range(index - self.frames_written):
+                self._writer.write(previous if previous is not None else frame)
+            self._writer.write(frame)
+            self.frames_written = index + 1
+            previous = frame
+            self.metrics.record(time.perf_counter() - start)
+            if self.quota_bytes is not None and time.monotonic() - last_quota_check >= QUOTA_CHECK_INTERVAL:
+                self._check_quota()
+                last_quota_check = time.monotonic()
+
+    def close(self):
+        self._stop_event.set()
+        self._thread.join()
+        self._writer.release()
+
+    def summary(self):
+        """What ended up in the recording, for the workout summary"""
+        return {
+            'path': self.path,
+            # Known as soon as capture stops, before the buffer is encoded,
+            # unless the quota stopped the recording early
+            'frames': self.frames_written if self.quota_exceeded else -(-self._frames_seen // self.stride),
+            'dropped_frames': self.frames_dropped,
+            'quota_exceeded': self.quota_exceeded
+        }
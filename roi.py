@@ -0,0 +1,106 @@
+import cv2
+import numpy as np
+
+# Padding added on each side of the body, as a share of its longer side
+ROI_PADDING = 0.3
+# Smallest crop side, as a share of the frame's shorter side
+ROI_MIN_SIZE = 0.25
+# Only landmarks at least this visible outline the body
+ROI_MIN_VISIBILITY = 0.5
+# A crop is kept while the body stays this far (as a share of its size)
+# inside it and fills at least ROI_SHRINK_RATIO of it once padded, so the
+# crop (and with it Pose's own tracking) stays put while the person moves in it
+ROI_MARGIN = 0.1
+ROI_SHRINK_RATIO = 0.3
+
+class RoiTracker:
+    """Crops frames to the region around the last detected pose.
+
+    Pose inference then runs on a crop of the frame instead of all of it,
+    at the same pixel density the whole frame would get at inference_size.
+    The crop is a padded square around the previous pose, kept while
+    the body stays well inside it; when no pose is found in the crop the
+    next frame is inferred whole, so the person is detected again.
+
+    Pose tracks the body in the coordinates of the image it is given, so
+    its graph must be reset whenever the crop moves (update says when).
+    Resetting costs a graph restart and a fresh detection, which is why
+    the crop only moves once the body nears its edge or shrinks well
+    inside it.
+
+    Cropping is not lossless: Pose's landmarks on a crop differ from
+    those on the whole frame (most after a reset), and rep counts taken
+    from them can differ too. benchmarks/roi_bench.py reports both counts.
+    """
+
+    def __init__(self, padding=ROI_PADDING, min_size=ROI_MIN_SIZE, min_visibility=ROI_MIN_VISIBILITY):
+        self.padding = padding
+        self.min_size = min_size
+        self.min_visibility = min_visibility
+        # (x0, y0, x1, y1) in frame pixels, or None to infer on the whole frame
+        self.box = None
+
+    def reset(self):
+        self.box = None
+
+    def crop(self, frame, inference_size):
+        """Resized BGR crop of frame to infer on, and the box it was cut from"""
+        height, width = frame.shape[:2]
+        box = self.box or (0, 0, width, height)
+        x0, y0, x1, y1 = box
+        scale_x = inference_size[0] / width
+        scale_y = inference_size[1] / height
+        size = (max(1, round((x1 - x0) * scale_x)), max(1, round((y1 - y0) * scale_y)))
+        return cv2.resize(frame[y0:y1, x0:x1], size), box
+
+    def update(self, results, box, frame_size):
+        """Map a Pose result on the crop cut from box back to whole-frame
+        coordinates, in place, and pick the crop for the next frame.
+
+        Returns True when the next frame is cropped differently and Pose
+        must be reset first.
+        """
+        if not results.pose_landmarks:
+            # Pose lost the body too and detects it afresh on the whole frame
+            self.box = None
+            return False
+        width, height = frame_size
+        x0, y0, x1, y1 = box
+        crop_width = x1 - x0
+        crop_height = y1 - y0
+        for landmark in results.pose_landmarks.landmark:
+            landmark.x = (x0 + landmark.x * crop_width) / width
+            landmark.y = (y0 + landmark.y * crop_height) / height
+            # z shares x's scale
+            landmark.z = landmark.z * crop_width / width
+        previous = self.box
+        self.box = self._next_box(results.pose_landmarks.landmark, frame_size)
+        return self.box != previous
+
+    def _next_box(self, landmarks, frame_size):
+        width, height = frame_size
+        points = np.array([(lm.x * width, lm.y * height) for lm in landmarks
+                           if lm.visibility >= self.min_visibility])
+        if not len(points):
+            return None
+        left, top = points.min(axis=0)
+        right, bottom = points.max(axis=0)
+        # A square around the body: Pose looks for a square region itself,
+        # and a narrow crop would cut that region off
+        body_size = max(right - left, bottom - top)
+        half = max(body_size * (0.5 + self.padding), self.min_size * min(width, height) / 2)
+        centre_x = (left + right) / 2
+        centre_y = (top + bottom) / 2
+        box = (max(0, int(centre_x - half)), max(0, int(centre_y - half)),
+               min(width, int(np.ceil(centre_x + half))), min(height, int(np.ceil(centre_y + half))))
+
+        if self.box is not None:
+            # Keep the current crop while the body still fits well inside it
+            x0, y0, x1, y1 = self.box
+            margin = body_size * ROI_MARGIN
+            fits = (left - margin >= x0 or x0 == 0) and (top - margin >= y0 or y0 == 0) and \
+                   (right + margin <= x1 or x1 == width) and (bottom + margin <= y1 or y1 == height)
+            area = (box[2] - box[0]) * (box[3] - box[1])
+            if fits and area >= ROI_SHRINK_RATIO * (x1 - x0) * (y1 - y0):
+                return self.box
+        return box
@@ -0,0 +1,57 @@
+import argparse
+import json
+
+import model
+
+def compare_strides(video_path, strides, inference_size=model.DEFAULT_INFERENCE_SIZE):
+    """Analyze a video at each frame stride and compare against full-rate analysis"""
+    rows = []
+    with model.create_pose() as pose:
+        for stride in strides:
+            result = model.analyze_video(video_path, pose, voice=False, headless=True,
+                                         frame_stride=stride, inference_size=inference_size)
+            rows.append({
+                'video': video_path,
+                'frame_stride': stride,
+                'inference_size': f"{inference_size[0]}x{inference_size[1]}",
+                'inferred_frames': result['inferred_frames'],
+                'reps': result['reps'],
+                'processing_time': result['processing_time'],
+                'realtime_factor': result['realtime_factor']
+            })
+
+    # Stride 1 is the full-rate reference, whether or not it was requested first
+    reference = next((row for row in rows if row['frame_stride'] == 1), rows[0])
+    for row in rows:
+        row['rep_difference'] = row['reps'] - reference['reps']
+        row['speedup'] = round(reference['processing_time'] / row['processing_time'], 2) \
+            if row['processing_time'] > 0 else 0.0
+    return rows
+
+def print_report(rows):
+    print(f"{'video':<40} {'stride':>6} {'frames':>7} {'reps':>5} {'diff':>5} {'time (s)':>9} {'speedup':>8}")
+    for row in rows:
+        print(f"{row['video'][-40:]:<40} {row['frame_stride']:>6} {row['inferred_frames']:>7} "
+              f"{row['reps']:>5} {row['rep_difference']:>+5} {row['processing_time']:>9.2f} "
+              f"{row['speedup']:>7.2f}x")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description='Compare rep counts at different frame strides against full-rate analysis.')
+    parser.add_argument('video_paths', nargs='+', help='Video files to analyze.')
+    parser.add_argument('--strides', type=int, nargs='+', default=[1, 2, 3, 4, 6],
+                        help='Frame strides to compare (1 = every frame).')
+    parser.add_argument('--inference_size', type=model.parse_frame_size, default=model.DEFAULT_INFERENCE_SIZE,
+                        help='Frame size used for pose inference, as WIDTHxHEIGHT.')
+    parser.add_argument('--json', type=str, default=None, help='Also write the report to this JSON file.')
+    args = parser.parse_args()
+
+    strides = sorted(set([1] + args.strides))
+    report = []
+    for video_path in args.video_paths:
+        report.extend(compare_strides(video_path, strides, args.inference_size))
+    print_report(report)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
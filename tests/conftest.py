@@ -0,0 +1,27 @@
+import os
+import sys
+
+import pytest
+
+# The modules under test live at the top of the repository
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+@pytest.fixture(scope="session")
+def app_module(tmp_path_factory):
+    """app.py imported in a scratch directory, so its log, history database
+    and job directories stay out of the repository; the live warm worker
+    is never started"""
+    workdir = tmp_path_factory.mktemp("app")
+    os.environ['HISTORY_DB'] = str(workdir / "history.db")
+    os.environ['LIVE_WARM_WORKER'] = '0'
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        import app
+    finally:
+        os.chdir(cwd)
+    app.analysis_jobs.jobs_folder = str(workdir / "uploads" / "jobs")
+    os.makedirs(app.analysis_jobs.jobs_folder, exist_ok=True)
+    app.app.config['SESSIONS_FOLDER'] = str(workdir / "sessions")
+    return app
@@ -0,0 +1,59 @@
+import os
+
+import numpy as np
+import pytest
+
+import exercises
+import model
+from exercises import AUTO, DEFAULT_EXERCISE, choose_exercise, standing_still
+
+from test_rep_counting import body
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Recorded squats, filmed from the hips up for most of the clip
+SQUAT_CLIP = os.path.join(ROOT, "uploads", "live_workout_20250618_173745.mp4")
+
+def test_choose_exercise_most_reps():
+    assert choose_exercise({'squat': 1, 'curl': 3}) == 'curl'
+    # Ties go to the first registered exercise
+    assert choose_exercise({'squat': 2, 'curl': 2}) == 'squat'
+
+def test_choose_exercise_needs_posture_agreement():
+    reps = {'squat': 1, 'curl': 7, 'lateral_raise': 3}
+    shares = {'squat': 0.95, 'curl': 0.2, 'lateral_raise': 0.2}
+    assert choose_exercise(reps, shares) == DEFAULT_EXERCISE
+    shares['curl'] = exercises.AUTO_MIN_POSTURE_SHARE
+    assert choose_exercise(reps, shares) == 'curl'
+
+def test_default_exercise_needs_no_posture():
+    assert choose_exercise({'squat': 0, 'pushup': 0}, {'squat': 0.0, 'pushup': 0.0}) == 'squat'
+
+def test_unseen_legs_are_not_standing_still():
+    standing = body()
+    hidden = standing.copy()
+    hidden[[exercises.LANDMARKS['LEFT_KNEE'], exercises.LANDMARKS['LEFT_ANKLE']], 3] = 0.0
+    assert standing_still(np.stack([standing, hidden])).tolist() == [True, False]
+
+@pytest.fixture(scope="module")
+def squat_landmarks():
+    if not os.path.exists(SQUAT_CLIP):
+        pytest.skip("recorded squat clip not available")
+    with model.create_pose() as pose:
+        _, timestamps, landmarks = model.extract_landmarks(SQUAT_CLIP, pose)
+    return timestamps, landmarks
+
+def test_recorded_squats_detected_as_squats(squat_landmarks):
+    timestamps, landmarks = squat_landmarks
+    name, rep_times, exercise_reps = model.count_exercise_reps(timestamps, landmarks, AUTO)
+    assert name == 'squat'
+    assert len(rep_times) == exercise_reps['squat']
+    # Arm exercises need their standing posture, which this clip never shows
+    assert exercise_reps['curl'] == exercise_reps['lateral_raise'] == 0
+
+def test_recorded_squats_tracked_live_as_squats(squat_landmarks):
+    timestamps, landmarks = squat_landmarks
+    tracker = exercises.ExerciseTracker(AUTO)
+    for timestamp, frame_landmarks in zip(timestamps.tolist(), landmarks):
+        if not np.isnan(frame_landmarks[0, 0]):
+            tracker.update(frame_landmarks, timestamp)
+    assert tracker.exercise == 'squat'
@@ -0,0 +1,131 @@
+from datetime import date
+
+import pytest
+
+from history_store import HistoryStore
+
+@pytest.fixture
+def store(tmp_path):
+    return HistoryStore(str(tmp_path / "history.db"))
+
+def page_through(store, limit, since=None):
+    """Every workout, fetched limit at a time with the keyset cursor"""
+    rows = []
+    before = before_id = None
+    while True:
+        page = store.query(limit=limit, before=before, since=since, before_id=before_id)
+        rows += page
+        if len(page) < limit:
+            return rows
+        before, before_id = page[-1]['timestamp'], page[-1]['id']
+
+def test_query_newest_first(store):
+    store.add("2025-06-01T10:00:00", 5, 2.5, 30.0, "a")
+    store.add("2025-06-03T10:00:00", 7, 3.5, 40.0, "c")
+    store.add("2025-06-02T10:00:00", 6, 3.0, 35.0, "b")
+    assert [row['summary'] for row in store.query()] == ["c", "b", "a"]
+
+def test_pages_keep_workouts_sharing_a_timestamp(store):
+    # Workouts saved in the same second share a timestamp; a page boundary
+    # falling between them must not skip any
+    for i in range(7):
+        store.add("2025-06-01T10:00:00", i, 1.0, 10.0, f"same-{i}")
+    store.add("2025-06-02T10:00:00", 10, 1.0, 10.0, "later")
+    store.add("2025-05-31T10:00:00", 11, 1.0, 10.0, "earlier")
+
+    for limit in (1, 2, 3, 4):
+        rows = page_through(store, limit)
+        assert [row['id'] for row in rows] == [row['id'] for row in store.query()]
+        assert len(rows) == store.count() == 9
+
+def test_pages_respect_since(store):
+    for day in range(1, 6):
+        store.add(f"2025-06-0{day}T10:00:00", day, 1.0, 10.0)
+    rows = page_through(store, 2, since="2025-06-03")
+    assert [row['reps'] for row in rows] == [5, 4, 3]
+
+def test_before_without_id_is_exclusive(store):
+    store.add("2025-06-01T10:00:00", 1, 1.0, 10.0)
+    store.add("2025-06-02T10:00:00", 2, 1.0, 10.0)
+    assert [row['reps'] for row in store.query(before="2025-06-02T10:00:00")] == [1]
+
+def test_rollups_and_totals(store):
+    store.add("2025-06-02T08:00:00", 10, 5.0, 60.0)   # Monday
+    store.add("2025-06-02T18:00:00", 5, 2.5, 30.0)
+    store.add("2025-06-08T09:00:00", 4, 2.0, 20.0)    # Sunday, same ISO week
+    store.add("2025-07-01T09:00:00", 3, 1.5, 15.0)
+
+    daily = {row['bucket']: row for row in store.rollups('day')}
+    assert daily["2025-06-02"]['workouts'] == 2
+    assert daily["2025-06-02"]['reps'] == 15
+    weekly = {row['bucket']: row['reps'] for row in store.rollups('week')}
+    assert weekly == {"2025-W23": 19, "2025-W27": 3}
+    monthly = store.rollups('month')
+    assert [row['bucket'] for row in monthly] == ["2025-07", "2025-06"]
+    assert store.rollups('month', limit=1)[0]['reps'] == 3
+    assert store.totals() == {'workouts': 4, 'reps': 22, 'calories': 11.0, 'duration': 125.0}
+
+def test_totals_of_empty_store(store):
+    assert store.totals() == {'workouts': 0, 'reps': 0, 'calories': 0.0, 'duration': 0.0}
+    assert store.streaks(today=date(2025, 6, 1)) == {'current': 0, 'longest': 0}
+
+def test_personal_bests_keep_the_highest(store):
+    store.add("2025-06-01T10:00:00", 10, 2.0, 90.0)
+    store.add("2025-06-02T10:00:00", 8, 6.0, 30.0)
+    bests = store.personal_bests()
+    assert bests['reps'] == {'value': 10, 'timestamp': "2025-06-01T10:00:00"}
+    assert bests['calories'] == {'value': 6.0, 'timestamp': "2025-06-02T10:00:00"}
+    assert bests['duration']['value'] == 90.0
+
+def test_streaks(store):
+    for day in ("2025-06-01", "2025-06-02", "2025-06-03", "2025-06-06", "2025-06-07"):
+        store.add(f"{day}T10:00:00", 1, 1.0, 10.0)
+    assert store.streaks(today=date(2025, 6, 8)) == {'current': 2, 'longest': 3}
+    assert store.streaks(today=date(2025, 6, 9)) == {'current': 0, 'longest': 3}
+
+def test_rollups_rebuilt_for_old_database(tmp_path):
+    path = str(tmp_path / "history.db")
+    store = HistoryStore(path)
+    store.add("2025-06-01T10:00:00", 3, 1.0, 10.0)
+    conn = store._connect()
+    with conn:
+        conn.execute("DELETE FROM rollups")
+        conn.execute("DELETE FROM meta WHERE key = 'rollups'")
+    assert HistoryStore(path).totals()['reps'] == 3
+
+def write_csv(path, lines):
+    path.write_text("timestamp,reps,calories,duration,summary\n" + "".join(line + "\n" for line in lines))
+    return str(path)
+
+def test_import_csv(store, tmp_path):
+    csv_path = write_csv(tmp_path / "history.csv", [
+        '2025-06-01T10:00:00,5,2.5,30.0,"Workout completed!\nReps: 5"',
+        "2025-06-02T10:00:00,7,3.5,40.0,done",
+    ])
+    assert store.import_csv(csv_path) == 2
+    rows = store.query()
+    assert [row['reps'] for row in rows] == [7, 5]
+    assert rows[1]['summary'] == "Workout completed!\nReps: 5"
+    assert store.totals()['reps'] == 12
+
+def test_import_csv_runs_once(store, tmp_path):
+    csv_path = write_csv(tmp_path / "history.csv", ["2025-06-01T10:00:00,5,2.5,30.0,a"])
+    assert store.import_csv(csv_path) == 1
+    assert store.import_csv(csv_path) == 0
+    assert HistoryStore(store.db_path).import_csv(csv_path) == 0
+    assert store.count() == 1
+
+def test_import_csv_skips_malformed_rows(store, tmp_path):
+    csv_path = write_csv(tmp_path / "history.csv", [
+        "2025-06-01T10:00:00,5,2.5,30.0,good",
+        "not a timestamp,5,2.5,30.0,bad timestamp",
+        "2025-06-02T10:00:00,five,2.5,30.0,bad reps",
+        "2025-06-03T10:00:00,5,2.5",
+        "2025-06-04T10:00:00,6,3.0,35.0,also good",
+    ])
+    assert store.import_csv(csv_path) == 2
+    assert [row['summary'] for row in store.query()] == ["also good", "good"]
+    assert store.totals()['workouts'] == 2
+
+def test_import_missing_csv(store, tmp_path):
+    assert store.import_csv(str(tmp_path / "missing.csv")) == 0
@@ -0,0 +1,70 @@
+import os
+import time
+
+import cv2
+import numpy as np
+
+import recording
+from recording import Recorder, enforce_quota
+
+def frame_count(path):
+    cap = cv2.VideoCapture(path)
+    try:
+        return int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    finally:
+        cap.release()
+
+def noise_frames(count, size=(1280, 720)):
+    rng = np.random.default_rng(0)
+    return [rng.integers(0, 255, (size[1], size[0], 3), dtype=np.uint8) for _ in range(count)]
+
+def test_dropped_frames_keep_the_length(tmp_path):
+    path = str(tmp_path / "live_workout_1.mp4")
+    # A two frame buffer can't keep up with frames submitted back to back
+    recorder = Recorder(path, 30, (1280, 720), buffer_frames=2)
+    frames = noise_frames(5)
+    for i in range(90):
+        recorder.submit(frames[i % len(frames)])
+    recorder.close()
+    summary = recorder.summary()
+    assert summary['dropped_frames'] > 0
+    assert summary['frames'] == 90
+    assert frame_count(path) == 90
+
+def test_low_fps_keeps_every_stride_th_frame(tmp_path):
+    path = str(tmp_path / "live_workout_2.mp4")
+    recorder = Recorder(path, 30, (320, 240), mode='low_fps', target_fps=10)
+    frames = noise_frames(1, (320, 240))
+    for _ in range(31):
+        recorder.submit(frames[0])
+        time.sleep(0.001)
+    recorder.close()
+    assert recorder.summary()['frames'] == 11
+    assert frame_count(path) == 11
+
+def write_file(path, size, mtime):
+    with open(path, "wb") as f:
+        f.write(b"\0" * size)
+    os.utime(path, (mtime, mtime))
+
+def test_enforce_quota_deletes_oldest(tmp_path):
+    for i in range(4):
+        write_file(tmp_path / f"live_workout_{i}.mp4", 100, 1000 + i)
+    write_file(tmp_path / "other.mp4", 1000, 0)
+    kept = str(tmp_path / "live_workout_0.mp4")
+    assert enforce_quota(str(tmp_path), 250, keep=[kept]) == 200
+    assert sorted(os.listdir(tmp_path)) == ["live_workout_0.mp4", "live_workout_3.mp4", "other.mp4"]
+
+def test_quota_checked_while_recording(tmp_path, monkeypatch):
+    monkeypatch.setattr(recording, "QUOTA_CHECK_INTERVAL", 0)
+    old = tmp_path / "live_workout_0.mp4"
+    write_file(old, 100, 1000)
+    path = str(tmp_path / "live_workout_1.mp4")
+    recorder = Recorder(path, 30, (320, 240), quota_bytes=150)
+    frames = noise_frames(5, (320, 240))
+    for i in range(60):
+        recorder.submit(frames[i % len(frames)])
+        time.sleep(0.005)
+    recorder.close()
+    assert not old.exists()
+    assert recorder.summary()['quota_exceeded']
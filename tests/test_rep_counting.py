@@ -0,0 +1,214 @@
+import numpy as np
+import pytest
+
+import model
+from exercises import AUTO, EXERCISES, LANDMARKS, ExerciseTracker, get_exercise
+
+# Frames without a detected pose, as extract_landmarks stores them
+NO_POSE = np.full((model.NUM_LANDMARKS, 4), np.nan, dtype=np.float32)
+
+def streaming_rep_times(timestamps, landmarks, exercise):
+    """Rep timestamps and final state of ExerciseState fed frame by frame"""
+    exercise = get_exercise(exercise)
+    state = exercise.new_state()
+    rep_times = []
+    for timestamp, frame_landmarks in zip(timestamps.tolist(), landmarks):
+        if np.isnan(frame_landmarks[0, 0]):
+            continue
+        _, _, new_rep = state.update_rep(exercise.angle(frame_landmarks), timestamp)
+        if new_rep:
+            rep_times.append(timestamp)
+    return rep_times, state
+
+def landmarks_for_angles(exercise, angles, rng):
+    """(n, 33, 4) float32 landmarks whose joint angle for exercise follows angles (degrees)"""
+    landmarks = rng.uniform(0.2, 0.8, size=(len(angles), model.NUM_LANDMARKS, 4)).astype(np.float32)
+    a, b, c = get_exercise(exercise).joints
+    radians = np.radians(angles)
+    landmarks[:, b, :2] = 0.5
+    landmarks[:, a, 0] = 0.5
+    landmarks[:, a, 1] = 0.3
+    landmarks[:, c, 0] = 0.5 + 0.2 * np.sin(radians)
+    landmarks[:, c, 1] = 0.5 - 0.2 * np.cos(radians)
+    return landmarks
+
+def random_walk_landmarks(rng, frames, step=0.03, missing=0.1):
+    """Landmarks drifting at random, with a share of frames missing a pose"""
+    start = rng.uniform(0.3, 0.7, size=(1, model.NUM_LANDMARKS, 4))
+    landmarks = (start + np.cumsum(rng.normal(0, step, size=(frames, model.NUM_LANDMARKS, 4)), axis=0))
+    landmarks = landmarks.astype(np.float32)
+    landmarks[rng.random(frames) < missing] = NO_POSE
+    return landmarks
+
+def assert_same_reps(timestamps, landmarks, exercise):
+    expected_times, state = streaming_rep_times(timestamps, landmarks, exercise)
+    rep_times, stage = model.count_reps_batch(timestamps, landmarks, exercise=exercise)
+    assert rep_times.tolist() == expected_times
+    assert stage == state.stage
+    assert model.count_reps(timestamps, landmarks, exercise=exercise).counter == len(expected_times)
+    return len(expected_times)
+
+def rep_angles(exercise, reps, frames_per_rep=30):
+    """Angles that go through reps full repetitions of exercise"""
+    exercise = get_exercise(exercise)
+    low, high = exercise.down_threshold - 20, exercise.up_threshold + 20
+    if exercise.direction == "up":
+        low, high = high, low
+    phase = np.linspace(0, 2 * np.pi * reps, frames_per_rep * reps)
+    # Start at the resting angle, move through the counted angle and back
+    return high + (low - high) * (1 - np.cos(phase)) / 2
+
+def _rotate(vector, degrees):
+    radians = np.radians(degrees)
+    return np.array([vector[0] * np.cos(radians) - vector[1] * np.sin(radians),
+                     vector[0] * np.sin(radians) + vector[1] * np.cos(radians)])
+
+def _limb(joint, towards_parent, angle, length=0.15):
+    """Point length away from joint, at angle degrees from the parent bone"""
+    direction = towards_parent / np.linalg.norm(towards_parent)
+    return joint + length * _rotate(direction, angle)
+
+def body(knee=175, elbow=170, arm_raise=10, lying=False, split=False):
+    """(33, 4) landmarks of a person facing the camera, with the left knee
+    and elbow bent to the given angles and the left arm raised arm_raise
+    degrees from the torso. lying turns the body horizontal (push-ups),
+    split spreads the ankles (lunges)."""
+    points = np.full((model.NUM_LANDMARKS, 2), 0.5)
+    for side, dx in (('LEFT', -0.05), ('RIGHT', 0.05)):
+        shoulder, hip = np.array([0.5 + dx, 0.3]), np.array([0.5 + dx, 0.6])
+        knee_point = hip + np.array([0, 0.15])
+        ankle = _limb(knee_point, hip - knee_point, knee)
+        elbow_point = _limb(shoulder, hip - shoulder, -arm_raise if side == 'LEFT' else 10)
+        wrist = _limb(elbow_point, shoulder - elbow_point, elbow)
+        if split and side == 'RIGHT':
+            # Only the right foot steps out, so the counted left knee angle holds
+            ankle[0] += 0.3
+        for name, point in (('SHOULDER', shoulder), ('HIP', hip), ('KNEE', knee_point),
+                            ('ANKLE', ankle), ('ELBOW', elbow_point), ('WRIST', wrist)):
+            points[LANDMARKS[f'{side}_{name}']] = point
+    if lying:
+        points = points[:, ::-1]
+    landmarks = np.ones((model.NUM_LANDMARKS, 4), dtype=np.float32)
+    landmarks[:, :2] = points
+    return landmarks
+
+def workout(**segments):
+    """Landmarks of body() with one of its angles following rep_angles per
+    segment, e.g. workout(squat=3) for three squats"""
+    frames = []
+    for exercise, reps in segments.items():
+        angles = rep_angles(exercise, reps)
+        if exercise == "lateral_raise":
+            angles = -angles
+        pose = {'squat': lambda angle: body(knee=angle),
+                'lunge': lambda angle: body(knee=angle, split=True),
+                'curl': lambda angle: body(elbow=angle),
+                'pushup': lambda angle: body(elbow=angle, lying=True),
+                'lateral_raise': lambda angle: body(arm_raise=angle)}[exercise]
+        frames += [pose(angle) for angle in angles]
+    return np.array(frames, dtype=np.float32)
+
+@pytest.mark.parametrize("exercise", list(EXERCISES))
+def test_synthetic_reps(exercise):
+    rng = np.random.default_rng(0)
+    angles = rep_angles(exercise, 5)
+    timestamps = np.arange(len(angles)) / 30.0
+    landmarks = landmarks_for_angles(exercise, angles, rng)
+    # A rep is counted on reaching the counted angle again, so the first
+    # descent starts the count and each later one adds a rep
+    assert assert_same_reps(timestamps, landmarks, exercise) == 4
+
+@pytest.mark.parametrize("exercise", list(EXERCISES))
+def test_synthetic_reps_with_missing_pose(exercise):
+    rng = np.random.default_rng(1)
+    angles = rep_angles(exercise, 6)
+    timestamps = np.arange(len(angles)) / 30.0
+    landmarks = landmarks_for_angles(exercise, angles, rng)
+    landmarks[rng.random(len(angles)) < 0.2] = NO_POSE
+    landmarks[40:55] = NO_POSE
+    assert_same_reps(timestamps, landmarks, exercise)
+
+@pytest.mark.parametrize("exercise", list(EXERCISES))
+def test_rep_duration_limits(exercise):
+    rng = np.random.default_rng(2)
+    # Reps faster than min_rep_duration, then a pause longer than max_rep_duration
+    angles = np.concatenate([rep_angles(exercise, 4, frames_per_rep=4), rep_angles(exercise, 3)])
+    timestamps = np.arange(len(angles)) / 30.0
+    timestamps[len(angles) // 2:] += 20.0
+    landmarks = landmarks_for_angles(exercise, angles, rng)
+    assert_same_reps(timestamps, landmarks, exercise)
+
+@pytest.mark.parametrize("seed", range(20))
+def test_random_angle_steps(seed):
+    # Steps of a few degrees, around the 2 degree change that sets the direction
+    rng = np.random.default_rng(seed)
+    reps = 0
+    for exercise in EXERCISES:
+        phase = np.cumsum(rng.uniform(0, 0.03, size=1500))
+        angles = 105 + 70 * np.sin(phase) + rng.uniform(-1.0, 1.0, size=1500)
+        timestamps = np.arange(len(angles)) / 30.0
+        landmarks = landmarks_for_angles(exercise, angles, rng)
+        landmarks[rng.random(len(angles)) < 0.05] = NO_POSE
+        reps += assert_same_reps(timestamps, landmarks, exercise)
+    assert reps > 0
+
+@pytest.mark.parametrize("seed", range(20))
+def test_random_landmarks(seed):
+    rng = np.random.default_rng(seed)
+    frames = int(rng.integers(1, 600))
+    landmarks = random_walk_landmarks(rng, frames, step=float(rng.uniform(0.005, 0.08)))
+    # Irregular frame times, as with variable frame rate video
+    timestamps = np.cumsum(rng.uniform(0.005, 0.1, size=frames))
+    for exercise in EXERCISES:
+        assert_same_reps(timestamps, landmarks, exercise)
+
+def test_no_pose_at_all():
+    timestamps = np.arange(10) / 30.0
+    landmarks = np.repeat(NO_POSE[np.newaxis], 10, axis=0)
+    for exercise in EXERCISES:
+        rep_times, stage = model.count_reps_batch(timestamps, landmarks, exercise=exercise)
+        assert len(rep_times) == 0 and stage is None
+
+def tracked_reps(timestamps, landmarks):
+    """ExerciseTracker in auto mode fed frame by frame, skipping frames without a pose"""
+    tracker = ExerciseTracker(AUTO)
+    for timestamp, frame_landmarks in zip(timestamps.tolist(), landmarks):
+        if not np.isnan(frame_landmarks[0, 0]):
+            tracker.update(frame_landmarks, timestamp)
+    return tracker
+
+@pytest.mark.parametrize("exercise", list(EXERCISES))
+def test_workout_of_each_exercise(exercise):
+    landmarks = workout(**{exercise: 4})
+    timestamps = np.arange(len(landmarks)) / 30.0
+    assert assert_same_reps(timestamps, landmarks, exercise) == 3
+    name, rep_times, exercise_reps = model.count_exercise_reps(timestamps, landmarks, AUTO)
+    assert name == exercise
+    assert len(rep_times) == 3
+
+@pytest.mark.parametrize("seed", range(10))
+def test_auto_matches_tracker(seed):
+    rng = np.random.default_rng(seed)
+    order = list(EXERCISES)
+    rng.shuffle(order)
+    landmarks = workout(**{name: int(rng.integers(1, 5)) for name in order})
+    landmarks += rng.normal(0, 0.005, size=landmarks.shape).astype(np.float32)
+    landmarks[rng.random(len(landmarks)) < 0.1] = NO_POSE
+    timestamps = np.cumsum(rng.uniform(0.02, 0.05, size=len(landmarks)))
+
+    tracker = tracked_reps(timestamps, landmarks)
+    name, rep_times, exercise_reps = model.count_exercise_reps(timestamps, landmarks, AUTO)
+    assert sum(exercise_reps.values()) > 0
+    assert exercise_reps == tracker.reps()
+    assert name == tracker.exercise
+    assert len(rep_times) == tracker.counter
+
+@pytest.mark.parametrize("seed", range(5))
+def test_auto_matches_tracker_on_random_landmarks(seed):
+    rng = np.random.default_rng(seed)
+    landmarks = random_walk_landmarks(rng, 400, step=0.04)
+    timestamps = np.arange(len(landmarks)) / 30.0
+    tracker = tracked_reps(timestamps, landmarks)
+    name, _, exercise_reps = model.count_exercise_reps(timestamps, landmarks, AUTO)
+    assert exercise_reps == tracker.reps()
+    assert name == tracker.exercise
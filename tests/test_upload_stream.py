@@ -0,0 +1,201 @@
+import io
+import os
+import subprocess
+import sys
+
+import pytest
+
+from upload_stream import (LOCK_FILE, ChunkedUpload, UploadAbortedError, UploadOffsetError,
+                           UploadTooLargeError, remove_stale_uploads, sniff_streamable)
+
+@pytest.fixture
+def upload(tmp_path):
+    upload = ChunkedUpload(str(tmp_path / "upload"), idle_timeout=0.2)
+    os.makedirs(upload.upload_dir)
+    upload.create(size=10, filename="clip.mp4")
+    return upload
+
+class BrokenStream:
+    """Request stream whose connection drops after some bytes"""
+
+    def __init__(self, data):
+        self._data = io.BytesIO(data)
+
+    def read(self, size):
+        block = self._data.read(size)
+        if not block:
+            raise ConnectionResetError("client went away")
+        return block
+
+class LockHolder:
+    """Another process holding the lock of an upload until closed"""
+
+    def __init__(self, upload_dir):
+        script = ("import fcntl, os, sys\n"
+                  "fd = os.open(sys.argv[1], os.O_RDWR | os.O_CREAT)\n"
+                  "fcntl.flock(fd, fcntl.LOCK_EX)\n"
+                  "print('locked', flush=True)\n"
+                  "sys.stdin.read()\n")
+        self.process = subprocess.Popen([sys.executable, "-c", script, os.path.join(upload_dir, LOCK_FILE)],
+                                        stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+        assert self.process.stdout.readline().strip() == "locked"
+
+    def close(self):
+        self.process.stdin.close()
+        self.process.wait(timeout=10)
+
+def test_append_in_order(upload):
+    assert upload.append(0, io.BytesIO(b"abcd"), 100) == 4
+    assert upload.append(4, io.BytesIO(b"efghij"), 100) == 10
+    with open(upload.video_path, "rb") as f:
+        assert f.read() == b"abcdefghij"
+    assert upload.info()['received'] == 10
+
+@pytest.mark.parametrize("offset", [0, 2, 5])
+def test_wrong_offset_reports_received(upload, offset):
+    upload.append(0, io.BytesIO(b"abcd"), 100)
+    with pytest.raises(UploadOffsetError) as error:
+        upload.append(offset, io.BytesIO(b"xx"), 100)
+    assert error.value.received == 4
+    assert upload.received() == 4
+
+def test_resume_after_dropped_connection(upload):
+    with pytest.raises(ConnectionResetError):
+        upload.append(0, BrokenStream(b"abc"), 100)
+    # What arrived before the drop is kept, and the lock released
+    assert upload.received() == 3
+    assert upload.append(3, io.BytesIO(b"defg"), 100) == 7
+
+def test_too_large(upload):
+    with pytest.raises(UploadTooLargeError):
+        upload.append(0, io.BytesIO(b"x" * 20), 10)
+
+def test_no_data_after_complete_or_abort(upload, tmp_path):
+    upload.append(0, io.BytesIO(b"abcd"), 100)
+    upload.complete()
+    with pytest.raises(UploadOffsetError):
+        upload.append(4, io.BytesIO(b"ef"), 100)
+
+    other = ChunkedUpload(str(tmp_path / "other"))
+    os.makedirs(other.upload_dir)
+    other.create()
+    other.abort()
+    with pytest.raises(UploadOffsetError):
+        other.append(0, io.BytesIO(b"ab"), 100)
+
+def test_chunk_refused_while_another_process_writes(upload):
+    holder = LockHolder(upload.upload_dir)
+    try:
+        with pytest.raises(UploadOffsetError) as error:
+            upload.append(0, io.BytesIO(b"abcd"), 100)
+        assert error.value.received == 0
+    finally:
+        holder.close()
+    assert upload.append(0, io.BytesIO(b"abcd"), 100) == 4
+
+def test_is_complete(upload):
+    assert upload.is_complete() is False
+    upload.complete()
+    assert upload.is_complete() is True
+
+def test_is_complete_raises_when_aborted_or_stalled(upload, tmp_path):
+    upload.abort()
+    with pytest.raises(UploadAbortedError):
+        upload.is_complete()
+
+    stalled = ChunkedUpload(str(tmp_path / "stalled"), idle_timeout=0)
+    os.makedirs(stalled.upload_dir)
+    stalled.create()
+    assert stalled.is_complete() is False
+    with pytest.raises(UploadAbortedError):
+        stalled.is_complete()
+
+def test_remove_stale_uploads(tmp_path):
+    stale = ChunkedUpload(str(tmp_path / "stale"))
+    fresh = ChunkedUpload(str(tmp_path / "fresh"))
+    for upload in (stale, fresh):
+        os.makedirs(upload.upload_dir)
+        upload.create()
+    os.utime(stale.video_path, (0, 0))
+    remove_stale_uploads(str(tmp_path), 60)
+    assert not os.path.exists(stale.upload_dir)
+    assert os.path.exists(fresh.upload_dir)
+
+def box(box_type, payload=b""):
+    return (8 + len(payload)).to_bytes(4, "big") + box_type + payload
+
+@pytest.mark.parametrize("data, expected", [
+    (b"\x1a\x45\xdf\xa3" + b"\0" * 20, True),
+    (box(b"ftyp", b"isom") + box(b"moov", b"\0" * 16) + box(b"mdat", b"\0" * 8), True),
+    (box(b"ftyp", b"isom") + box(b"mdat", b"\0" * 8) + box(b"moov", b"\0" * 16), False),
+    # moov has started arriving, but not all of it
+    (box(b"ftyp", b"isom") + box(b"moov", b"\0" * 64)[:20], None),
+    (bytes([0x47]) + b"\0" * 187 + bytes([0x47]), True),
+    (b"\0" * 4, None),
+    (b"not a video at all", False),
+])
+def test_sniff_streamable(tmp_path, data, expected):
+    path = tmp_path / "video"
+    path.write_bytes(data)
+    assert sniff_streamable(str(path)) is expected
+
+@pytest.fixture
+def client(app_module, monkeypatch):
+    started = []
+    monkeypatch.setattr(app_module, "get_analysis_pool", lambda: None)
+    monkeypatch.setattr(app_module, "start_upload_analysis",
+                        lambda upload, streaming: started.append((upload.upload_id, streaming)))
+    monkeypatch.setitem(app_module.app.config, 'UPLOAD_STREAMING_ANALYSIS', False)
+    client = app_module.app.test_client()
+    client.started = started
+    return client
+
+def put_chunk(client, upload_url, offset, data):
+    return client.put(upload_url, data=data, headers={'Upload-Offset': str(offset)})
+
+def test_upload_protocol(client):
+    response = client.post('/uploads', json={'size': 10, 'filename': 'clip.mp4'})
+    assert response.status_code == 201
+    upload_url = response.get_json()['upload_url']
+
+    response = put_chunk(client, upload_url, 0, b"abcd")
+    assert response.status_code == 200
+    assert response.get_json()['received'] == 4
+
+    # A retried chunk and one that skips ahead are both refused with the count to resume from
+    for offset in (0, 8):
+        response = put_chunk(client, upload_url, offset, b"abcd")
+        assert response.status_code == 409
+        assert response.get_json()['received'] == 4
+
+    assert client.get(upload_url).get_json()['received'] == 4
+    response = put_chunk(client, upload_url, 4, b"efghij")
+    assert response.get_json()['complete'] is True
+    assert client.started == [(upload_url.rsplit('/', 1)[1], False)]
+    assert put_chunk(client, upload_url, 10, b"k").status_code == 409
+
+def test_upload_chunk_while_another_process_writes(client, app_module):
+    upload_url = client.post('/uploads', json={}).get_json()['upload_url']
+    holder = LockHolder(app_module.analysis_jobs.job_dir(upload_url.rsplit('/', 1)[1]))
+    try:
+        response = put_chunk(client, upload_url, 0, b"abcd")
+        assert response.status_code == 409
+        assert response.get_json()['received'] == 0
+    finally:
+        holder.close()
+    assert put_chunk(client, upload_url, 0, b"abcd").status_code == 200
+
+def test_upload_errors(client):
+    assert client.put('/uploads/not-an-id', data=b"x").status_code == 404
+    upload_url = client.post('/uploads', json={}).get_json()['upload_url']
+    assert client.put(upload_url, data=b"x", headers={'Upload-Offset': 'x'}).status_code == 400
+    assert client.post('/uploads', json={'size': -1}).status_code == 400
+
+    assert client.delete(upload_url).get_json()['success'] is True
+    assert put_chunk(client, upload_url, 0, b"x").status_code == 404
+
+def test_complete_without_size(client):
+    upload_url = client.post('/uploads', json={}).get_json()['upload_url']
+    put_chunk(client, upload_url, 0, b"abc")
+    assert client.post(f"{upload_url}/complete").status_code == 202
+    assert client.started == [(upload_url.rsplit('/', 1)[1], False)]
@@ -0,0 +1,223 @@
+import fcntl
+import json
+import os
+import shutil
+import struct
+import time
+import logging
+
+from jobs import JOB_FILE
+
+logger = logging.getLogger(__name__)
+
+# Files kept next to the video in an upload's directory
+UPLOAD_FILE = "upload.json"
+COMPLETE_MARKER = "upload.complete"
+ABORTED_MARKER = "upload.aborted"
+# Locked by whichever server process is appending a chunk
+LOCK_FILE = "upload.lock"
+# Bytes copied from the request stream per write
+BLOCK_SIZE = 1024 * 1024
+# First bytes of a Matroska/WebM file
+EBML_MAGIC = b"\x1a\x45\xdf\xa3"
+# MPEG-TS packets are 188 bytes long and start with this sync byte
+TS_PACKET_SIZE = 188
+TS_SYNC_BYTE = 0x47
+
+class UploadOffsetError(Exception):
+    """Raised when a chunk does not start where the upload currently ends"""
+
+    def __init__(self, message, received):
+        super().__init__(message)
+        self.received = received
+
+class UploadTooLargeError(Exception):
+    """Raised when an upload grows past its size limit"""
+    pass
+
+class UploadAbortedError(Exception):
+    """Raised to an analysis waiting on an upload that was cancelled"""
+    pass
+
+def sniff_streamable(path):
+    """Whether the video at path can be decoded before it is complete.
+
+    WebM/Matroska and MPEG-TS are written front to back, as is MP4/MOV
+    when its moov box (the frame index) precedes the media data ("fast
+    start"). MP4 files with moov at the end, as most cameras write them,
+    can't be opened until the last bytes arrive. Returns True or False,
+    or None while too few bytes have arrived to tell.
+    """
+    try:
+        with open(path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            head = f.read(TS_PACKET_SIZE + 1)
+            if len(head) < 8:
+                return None
+            if head.startswith(EBML_MAGIC):
+                return True
+            if head[4:8] == b"ftyp":
+                # Walk the top-level boxes until moov or mdat turns up
+                offset = 0
+                while offset + 8 <= size:
+                    f.seek(offset)
+                    box_size, box_type = struct.unpack(">I4s", f.read(8))
+                    if box_type == b"mdat":
+                        return False
+                    if box_size == 1:
+                        if offset + 16 > size:
+                            return None
+                        box_size = struct.unpack(">Q", f.read(8))[0]
+                    if box_size < 8:
+                        return False
+                    if box_type == b"moov":
+                        # The header can be opened once the whole box is here
+                        return True if offset + box_size <= size else None
+                    offset += box_size
+                return None
+            if head[0] == TS_SYNC_BYTE:
+                if len(head) <= TS_PACKET_SIZE:
+                    return None
+                return head[TS_PACKET_SIZE] == TS_SYNC_BYTE
+            return False
+    except OSError:
+        return None
+
+def remove_stale_uploads(uploads_folder, max_idle):
+    """Delete uploads that were abandoned before any analysis started"""
+    if not os.path.isdir(uploads_folder):
+        return
+    cutoff = time.time() - max_idle
+    for name in os.listdir(uploads_folder):
+        upload_dir = os.path.join(uploads_folder, name)
+        upload = ChunkedUpload(upload_dir)
+        if not os.path.exists(upload.info_path) or os.path.exists(os.path.join(upload_dir, JOB_FILE)):
+            continue
+        try:
+            if os.path.getmtime(upload.video_path) < cutoff:
+                shutil.rmtree(upload_dir, ignore_errors=True)
+                logger.info(f"Removed abandoned upload {name}")
+        except OSError:
+            pass
+
+class ChunkedUpload:
+    """A video uploaded in chunks straight to disk, resumable at any byte.
+
+    Each chunk is appended at the offset the client says it starts at,
+    which must be where the upload currently ends; after a dropped
+    connection the client asks for the received byte count and continues
+    from there. Nothing is held in memory beyond one block.
+
+    All state lives in the upload's directory (the video, upload.json and
+    marker files), so any server process can take the next chunk and an
+    analysis worker can follow the upload while it arrives: is_complete
+    tells it whether more bytes are coming, and raises once the upload is
+    aborted or has not grown for idle_timeout seconds. A chunk is written
+    under an flock on upload.lock, which every process and thread honours,
+    so two requests never append at once.
+    """
+
+    def __init__(self, upload_dir, video_name="video.mp4", poll_interval=0.5, idle_timeout=300):
+        self.upload_dir = upload_dir
+        self.upload_id = os.path.basename(os.path.normpath(upload_dir))
+        self.video_path = os.path.join(upload_dir, video_name)
+        self.info_path = os.path.join(upload_dir, UPLOAD_FILE)
+        self.poll_interval = poll_interval
+        self.idle_timeout = idle_timeout
+        self._last_size = -1
+        self._last_growth = time.monotonic()
+
+    def create(self, size=None, filename=None, options=None):
+        """Start an empty upload of size bytes (None if not known up front);
+        options are the analysis options to apply once analysis starts"""
+        open(self.video_path, "wb").close()
+        with open(self.info_path, "w") as f:
+            json.dump({'size': size, 'filename': filename, 'options': options or {}}, f)
+
+    def exists(self):
+        return os.path.exists(self.info_path)
+
+    def received(self):
+        try:
+            return os.path.getsize(self.video_path)
+        except OSError:
+            return 0
+
+    def finished(self):
+        return os.path.exists(os.path.join(self.upload_dir, COMPLETE_MARKER))
+
+    def aborted(self):
+        return os.path.exists(os.path.join(self.upload_dir, ABORTED_MARKER))
+
+    def info(self):
+        with open(self.info_path, "r") as f:
+            info = json.load(f)
+        return dict(info, upload_id=self.upload_id, received=self.received(),
+                    complete=self.finished(), aborted=self.aborted())
+
+    def append(self, offset, stream, max_bytes):
+        """Copy stream to the end of the upload, which must be at offset.
+
+        Bytes are written as they are read, so whatever arrived before a
+        dropped connection is kept for the client to resume after. Returns
+        the number of bytes received so far.
+        """
+        lock_fd = os.open(os.path.join(self.upload_dir, LOCK_FILE), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            try:
+                fcntl.flock(lock_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                raise UploadOffsetError("Another chunk of this upload is being written", self.received())
+            received = self.received()
+            if self.finished() or self.aborted():
+                raise UploadOffsetError("Upload is no longer accepting data", received)
+            if offset != received:
+                raise UploadOffsetError(f"Upload continues at byte {received}, not {offset}", received)
+            with open(self.video_path, "ab") as f:
+                while True:
+                    block = stream.read(BLOCK_SIZE)
+                    if not block:
+                        break
+                    if received + len(block) > max_bytes:
+                        raise UploadTooLargeError(f"Upload exceeds {max_bytes} bytes")
+                    f.write(block)
+                    # Hand each block to the OS so an analysis following
+                    # the upload sees it right away
+                    f.flush()
+                    received += len(block)
+            return received
+        finally:
+            # Closing the descriptor releases the lock
+            os.close(lock_fd)
+
+    def _mark(self, marker):
+        open(os.path.join(self.upload_dir, marker), "w").close()
+
+    def complete(self):
+        """Record that every byte has arrived"""
+        self._mark(COMPLETE_MARKER)
+
+    def abort(self):
+        """Cancel the upload; an analysis following it fails"""
+        self._mark(ABORTED_MARKER)
+
+    def streamable(self):
+        return sniff_streamable(self.video_path)
+
+    def is_complete(self):
+        """Analysis side: True once the whole video is on disk"""
+        if self.aborted():
+            raise UploadAbortedError(f"Upload {self.upload_id} was aborted")
+        if self.finished():
+            return True
+        size = self.received()
+        if size != self._last_size:
+            self._last_size = size
+            self._last_growth = time.monotonic()
+        elif time.monotonic() - self._last_growth > self.idle_timeout:
+            raise UploadAbortedError(f"Upload {self.upload_id} stalled for {self.idle_timeout}s")
+        return False
+
+    def wait(self):
+        """Analysis side: pause before looking for more data"""
+        time.sleep(self.poll_interval)
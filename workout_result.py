@@ -0,0 +1,90 @@
+import json
+import os
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Status of a live workout that is still running
+IN_PROGRESS = "Workout in progress..."
+COMPLETED = "Workout completed!"
+
+class WorkoutResult:
+    """Reps, calories and duration of a workout, as exchanged between the
+    analyzers and the server.
+
+    Written as JSON to a temp file that is then renamed over the target,
+    so a reader gets the previous result or the new one, never a partial
+    file, and reads it back with a single json.load instead of parsing
+    summary text line by line.
+    """
+
+    def __init__(self, status=IN_PROGRESS, exercise=None, reps=0, calories=0.0, duration=0.0, people=None,
+                 recording=None):
+        self.status = status
+        self.exercise = exercise
+        self.reps = reps
+        self.calories = calories
+        self.duration = duration
+        # Per-person reps, calories and time in view when several people are tracked
+        self.people = people or []
+        # Path, frames and dropped frames of the session's recording, if any
+        self.recording = recording
+
+    @property
+    def in_progress(self):
+        return self.status == IN_PROGRESS
+
+    @property
+    def completed(self):
+        return "completed" in self.status.lower()
+
+    def to_dict(self):
+        return {
+            'status': self.status,
+            'exercise': self.exercise,
+            'reps': self.reps,
+            'calories': round(self.calories, 1),
+            'duration': round(self.duration, 1),
+            'people': self.people,
+            'recording': self.recording
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        """Result from a dict such as to_dict's, a "finished" event or an
+        analysis result; other keys are ignored"""
+        return cls(status=str(data.get('status', IN_PROGRESS)),
+                   exercise=data.get('exercise'),
+                   reps=int(data.get('reps', 0)),
+                   calories=float(data.get('calories', 0.0)),
+                   duration=float(data.get('duration', 0.0)),
+                   people=list(data.get('people') or []),
+                   recording=data.get('recording'))
+
+    def summary_text(self):
+        """Human-readable summary, as shown to the user and kept in history"""
+        summary = (f"{self.status}\n"
+                   f"Reps: {self.reps}\n"
+                   f"Calories: {self.calories:.1f}\n"
+                   f"Duration: {self.duration:.1f}s\n")
+        return summary + "".join(f"Person {person['id']}: {person['reps']} reps, {person['calories']:.1f} calories\n"
+                                 for person in self.people)
+
+    def write(self, path):
+        # Write to a temp file and rename so readers never see a partial file
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.to_dict(), f)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def read(cls, path):
+        """Result written to path, or None if there is none (yet)"""
+        try:
+            with open(path, "r") as f:
+                return cls.from_dict(json.load(f))
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, TypeError) as e:
+            logger.error(f"Error reading workout result {path}: {e}")
+            return None